@@ -1,4 +1,4 @@
-﻿from flask import Flask, render_template, render_template_string, request, jsonify, session, redirect, url_for
+﻿from flask import Flask, render_template, request, jsonify, session, redirect, url_for
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime, timedelta
 import json
@@ -286,18 +286,143 @@ def reports():
 @app.route('/mobile')
 def mobile_quick_entry():
     language = get_current_language()
-    from flask import Flask, render_template_string, request, jsonify, session
+    from flask import Flask, request, jsonify, session
 from flask_sqlalchemy import SQLAlchemy
+from flask import Response, abort, g, make_response
+import click
+from sqlalchemy import column, create_engine, event, table, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from jinja2 import DictLoader, FileSystemBytecodeCache
+from markupsafe import escape
+import numpy as np
+from expiry_histogram import ExpiryHistogram
+from flow_network import MinCostFlow
+from forecasting import first_shortage, fit_smoothing, forecast, project_stock
+from metrics import MetricsRegistry
 from datetime import datetime, timedelta
+import csv
+import hashlib
+import io
+import json
+import math
 import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from functools import lru_cache, wraps
+from typing import Dict, NamedTuple
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'myanmar-blood-supply-secret-key'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///blood_supply.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///blood_supply.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['TEMPLATE_CACHE_DIR'] = os.environ.get('TEMPLATE_CACHE_DIR', os.path.join(app.instance_path, 'jinja_cache'))
+
+# Days-before-expiry at which an ExpiryAlert is raised, per product type
+app.config['EXPIRY_ALERT_THRESHOLDS'] = {
+    'Whole Blood': [7, 3],
+    'RBC': [7, 3],
+    'Platelets': [3, 1],
+    'Plasma': [30, 7]
+}
+app.config['DEFAULT_EXPIRY_ALERT_THRESHOLDS'] = [7]
+app.config['EXPIRY_SCAN_INTERVAL'] = int(os.environ.get('EXPIRY_SCAN_INTERVAL', 0))
+app.config['MAX_ALLOCATION_QUANTITY'] = int(os.environ.get('MAX_ALLOCATION_QUANTITY', 100))
+# Rebalancing: per-unit cost of a lane within a region and between regions,
+# days a unit must have left to be worth shipping, and departure lead time
+app.config['REBALANCE_LANE_COSTS'] = {'same_region': 1, 'other_region': 3}
+app.config['REBALANCE_MIN_DAYS_REMAINING'] = int(os.environ.get('REBALANCE_MIN_DAYS_REMAINING', 1))
+app.config['REBALANCE_DEPARTURE_HOURS'] = int(os.environ.get('REBALANCE_DEPARTURE_HOURS', 2))
+# Demand forecasting: days of history fitted, days projected ahead, and
+# how many projected shortages /reports lists
+app.config['FORECAST_HISTORY_DAYS'] = int(os.environ.get('FORECAST_HISTORY_DAYS', 56))
+app.config['FORECAST_HORIZON_DAYS'] = int(os.environ.get('FORECAST_HORIZON_DAYS', 28))
+app.config['REPORT_SHORTAGE_ROWS'] = 20
+# Inventory events: how far back the scanner looks for newly expired units,
+# and how many events a consumer applies per transaction
+app.config['EXPIRED_EVENT_LOOKBACK_DAYS'] = int(os.environ.get('EXPIRED_EVENT_LOOKBACK_DAYS', 30))
+app.config['EVENT_BATCH_SIZE'] = int(os.environ.get('EVENT_BATCH_SIZE', 5000))
+# Archiver: units moved to blood_inventory_archive per transaction, and how
+# long a reservation stays live before the unit counts as issued. Keep the
+# latter above FORECAST_HISTORY_DAYS, which reads reservations from the hot
+# table.
+app.config['ARCHIVE_BATCH_SIZE'] = int(os.environ.get('ARCHIVE_BATCH_SIZE', 2000))
+app.config['ARCHIVE_RESERVED_AFTER_DAYS'] = int(os.environ.get('ARCHIVE_RESERVED_AFTER_DAYS', 90))
+# Set by the production server once a worker starts shutting down
+app.config['DRAINING'] = False
+# Request metrics; with METRICS_DIR set, worker processes share snapshots there
+app.config['METRICS_ENABLED'] = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+app.config['METRICS_DIR'] = os.environ.get('METRICS_DIR')
+app.config['METRICS_FLUSH_INTERVAL'] = int(os.environ.get('METRICS_FLUSH_INTERVAL', 5))
+# Query analyzer (development/staging): N+1 suspects, slow queries, budgets
+app.config['QUERY_ANALYZER'] = os.environ.get('QUERY_ANALYZER', 'false').lower() == 'true'
+app.config['SLOW_QUERY_MS'] = float(os.environ.get('SLOW_QUERY_MS', 100))
+app.config['N_PLUS_ONE_THRESHOLD'] = int(os.environ.get('N_PLUS_ONE_THRESHOLD', 5))
+app.config['QUERY_BUDGET_STRICT'] = os.environ.get('QUERY_BUDGET_STRICT', 'false').lower() == 'true'
+# Most SQL statements a request to each endpoint may run
+app.config['QUERY_BUDGETS'] = {
+    'dashboard': 6,
+    'inventory': 4,
+    'expired_blood': 3,
+    'reports': 5,
+    'mobile_interface': 3,
+    'locations': 3,
+    'transportation': 2,
+    'expired_blood_count': 2,
+    'list_inventory': 3,
+    'demand_forecast': 3,
+    'usage_stats': 2,
+    'quick_entry': 8,
+    'add_inventory': 8,
+    'bulk_add_inventory': 8,
+    'dispose_blood': 6,
+    'dispose_expired': 8,
+    'rebalance_stock': 12
+}
+
+# SQLite engine profiles - PRAGMAs applied to every new connection. WAL lets
+# readers run alongside the single writer, and busy_timeout makes writers
+# queue for the lock instead of failing with "database is locked".
+SQLITE_PROFILES = {
+    'performance': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -64000,       # KiB, i.e. 64 MB of page cache
+        'mmap_size': 268435456,     # 256 MB
+        'temp_store': 'MEMORY',
+        'busy_timeout': 30000       # ms
+    },
+    'default': {}
+}
+app.config['SQLITE_PROFILE'] = os.environ.get('SQLITE_PROFILE', 'performance')
+if app.config['SQLITE_PROFILE'] not in SQLITE_PROFILES:
+    raise ValueError(f"Unknown SQLITE_PROFILE {app.config['SQLITE_PROFILE']!r}; "
+                     f"expected one of: {', '.join(SQLITE_PROFILES)}")
+app.config['SQLITE_PRAGMAS'] = SQLITE_PROFILES[app.config['SQLITE_PROFILE']]
+if app.config['SQLITE_PROFILE'] != 'default':
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 20)),
+        'pool_timeout': 30,
+        'connect_args': {'timeout': 30, 'check_same_thread': False}
+    }
 
 db = SQLAlchemy(app)
 
+def apply_sqlite_profile(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for pragma, value in app.config['SQLITE_PRAGMAS'].items():
+        cursor.execute(f'PRAGMA {pragma} = {value}')
+    cursor.close()
+
+with app.app_context():
+    if db.engine.dialect.name == 'sqlite':
+        event.listen(db.engine, 'connect', apply_sqlite_profile)
+
 # Translation dictionaries - FIXED: Added missing translations and fixed syntax
 BURMESE_TO_ENGLISH = {
     # Navigation
@@ -380,6 +505,8 @@ BURMESE_TO_ENGLISH = {
     'လက်ရှိတည်နေရာရွေးချယ်ပါ': 'Select Location',
     'သွေးယူနစ်များမတွေ့ရှိပါ': 'No blood units found',
     'ရက်ကျန်ရှိ': 'Days Left',
+    'နောက်စာမျက်နှာ': 'Next Page',
+    'ပထမစာမျက်နှာ': 'First Page',
     
     # Transportation
     'ပို့ဆောင်ရေးအခြေအနေ': 'Transportation',
@@ -428,6 +555,22 @@ BURMESE_TO_ENGLISH = {
     # Add to BURMESE_TO_ENGLISH dictionary:
     'ဖုန်းနံပါတ်': 'Phone',
     'အပူချိန်စွမ်းရည်': 'Temperature Capability',
+    # Demand forecast
+    'ခန့်မှန်းပြတ်လပ်မှုများ': 'Projected Shortages',
+    'နေ့စဉ်အသုံးပြုမှု': 'Daily Use',
+    'ပြတ်လပ်မည့်ရက်': 'Shortage Date',
+    'ပြတ်လပ်မှုမခန့်မှန်းရပါ': 'No shortages projected',
+    # Bulk disposal
+    'ထုတ်ကုန်အားလုံး': 'All Products',
+    'အားလုံးစွန့်ပစ်မည်': 'Dispose All',
+    'ပြသထားသောရရှိနိုင်သည့်သက်တမ်းကုန်ယူနစ်အားလုံးကိုစွန့်ပစ်မလားသေချာပါသလား': 'Are you sure you want to dispose every available expired unit shown?',
+    'ယူနစ်စွန့်ပစ်ပြီး': 'units disposed',
+    'ထိန်းထားသည်': 'on hold',
+    'ထိန်းထားသောသက်တမ်းကုန်ယူနစ်များ': 'Expired units on hold',
+    'ခွဲဝေမှု သို့မဟုတ် ပို့ဆောင်မှုအတွက် ကြိုတင်ယူထားသဖြင့် အားလုံးစွန့်ပစ်ရာတွင် မပါဝင်ပါ၊ တစ်ခုချင်းစွန့်ပစ်ပါ။': 'Reserved for an allocation or a shipment, so Dispose All leaves them; dispose them one by one.',
+    'ရရှိနိုင်သောသက်တမ်းကုန်ယူနစ်မရှိပါ': 'No available expired units',
+    'ခွဲဝေမှု': 'Allocation',
+    'ကြိုတင်ယူထားသည်': 'Reserved',
 }
 
 ENGLISH_TO_BURMESE = {v: k for k, v in BURMESE_TO_ENGLISH.items()}
@@ -457,6 +600,62 @@ class BloodInventory(db.Model):
     current_location = db.Column(db.String(50), nullable=False)
     temperature_zone = db.Column(db.String(20), nullable=False)
     status = db.Column(db.String(20), default='Available')
+    allocation_id = db.Column(db.String(50))
+
+    def to_dict(self):
+        return {
+            'blood_id': self.blood_id,
+            'blood_type': self.blood_type,
+            'product_type': self.product_type,
+            'donation_date': self.donation_date.strftime('%Y-%m-%d'),
+            'expiry_date': self.expiry_date.strftime('%Y-%m-%d'),
+            'current_location': self.current_location,
+            'temperature_zone': self.temperature_zone,
+            'status': self.status,
+            'days_remaining': (self.expiry_date - datetime.now().date()).days
+        }
+
+    # Indexes follow the page access paths: status + expiry for the dashboard,
+    # type/location filters ordered by expiry for /inventory and reports,
+    # and bare expiry ranges for the expired/expiring counts
+    __table_args__ = (
+        db.Index('ix_blood_inventory_status_expiry', 'status', 'expiry_date'),
+        db.Index('ix_blood_inventory_type_location_expiry', 'blood_type', 'current_location', 'expiry_date'),
+        db.Index('ix_blood_inventory_location_expiry', 'current_location', 'expiry_date'),
+        db.Index('ix_blood_inventory_type_expiry', 'blood_type', 'expiry_date'),
+        db.Index('ix_blood_inventory_expiry', 'expiry_date'),
+        # FEFO allocation: oldest available unit of a type and product first
+        db.Index('ix_blood_inventory_fefo', 'blood_type', 'product_type', 'status', 'expiry_date'),
+    )
+
+class ArchivedBloodInventory(db.Model):
+    """Units that reached a terminal state, moved out of BloodInventory by the archiver"""
+    __tablename__ = 'blood_inventory_archive'
+    # Its own key: BloodInventory reuses the id of its newest row once that
+    # row is archived, so blood_id is what identifies a unit across tables
+    id = db.Column(db.Integer, primary_key=True)
+    blood_id = db.Column(db.String(50), unique=True, nullable=False)
+    blood_type = db.Column(db.String(10), nullable=False)
+    product_type = db.Column(db.String(20), nullable=False)
+    donation_date = db.Column(db.Date, nullable=False)
+    expiry_date = db.Column(db.Date, nullable=False)
+    current_location = db.Column(db.String(50), nullable=False)
+    temperature_zone = db.Column(db.String(20), nullable=False)
+    status = db.Column(db.String(20), nullable=False)
+    allocation_id = db.Column(db.String(50))
+    archived_at = db.Column(db.DateTime, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_blood_inventory_archive_location_expiry', 'current_location', 'expiry_date'),
+        db.Index('ix_blood_inventory_archive_archived_at', 'archived_at'),
+    )
+
+UNIT_COLUMNS = ['blood_id', 'blood_type', 'product_type', 'donation_date', 'expiry_date',
+                'current_location', 'temperature_zone', 'status', 'allocation_id']
+
+# Live and archived units together, for historical reporting; created by
+# migration 6. archived_at is NULL for units still in BloodInventory.
+inventory_history = table('blood_inventory_history', *(column(name) for name in UNIT_COLUMNS + ['archived_at']))
 
 class Location(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -469,6 +668,19 @@ class Location(db.Model):
     contact_person = db.Column(db.String(100))
     phone_number = db.Column(db.String(20))
 
+    def to_dict(self):
+        return {
+            'location_code': self.location_code,
+            'location_name': self.location_name,
+            'location_type': self.location_type,
+            'capacity': self.capacity,
+            'current_stock': self.current_stock,
+            'temperature_capability': self.temperature_capability,
+            'contact_person': self.contact_person,
+            'phone_number': self.phone_number,
+            'usage_percent': location_usage(self)
+        }
+
 class Transportation(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     shipment_id = db.Column(db.String(50), unique=True, nullable=False)
@@ -480,6 +692,10 @@ class Transportation(db.Model):
     driver_contact = db.Column(db.String(20))
     security_status = db.Column(db.String(20), default='Safe')
 
+    __table_args__ = (
+        db.Index('ix_transportation_status', 'status'),
+    )
+
 class ExpiryAlert(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     blood_id = db.Column(db.String(50), nullable=False)
@@ -487,6 +703,55 @@ class ExpiryAlert(db.Model):
     alert_date = db.Column(db.DateTime, nullable=False)
     days_remaining = db.Column(db.Integer)
     action_taken = db.Column(db.Boolean, default=False)
+    threshold_days = db.Column(db.Integer)
+
+    __table_args__ = (
+        db.Index('ix_expiry_alert_action_date', 'action_taken', 'alert_date'),
+        db.Index('ux_expiry_alert_unit_threshold', 'blood_id', 'threshold_days', unique=True),
+    )
+
+class IdSequence(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), unique=True, nullable=False)
+    last_value = db.Column(db.Integer, nullable=False, default=0)
+
+class InventoryEvent(db.Model):
+    """Append-only record of every unit state change; id is the sequence number"""
+    id = db.Column(db.Integer, primary_key=True)
+    event_type = db.Column(db.String(20), nullable=False)
+    blood_id = db.Column(db.String(50), nullable=False)
+    blood_type = db.Column(db.String(10), nullable=False)
+    product_type = db.Column(db.String(20), nullable=False)
+    location = db.Column(db.String(50), nullable=False)
+    expiry_date = db.Column(db.Date, nullable=False)
+    reference = db.Column(db.String(50))
+    # The unit's status before the change, so the expiry histogram can replay it
+    status = db.Column(db.String(20))
+    occurred_at = db.Column(db.DateTime, nullable=False)
+
+    # AUTOINCREMENT keeps ids strictly increasing, so consumers can resume
+    # from the last id they processed; a unit expires at most once
+    __table_args__ = (
+        db.Index('ix_inventory_event_blood_id', 'blood_id'),
+        db.Index('ux_inventory_event_expired', 'blood_id', unique=True,
+                 sqlite_where=db.text("event_type = 'expired'")),
+        {'sqlite_autoincrement': True},
+    )
+
+class InventoryEventTotal(db.Model):
+    """Daily event counts per location, blood type and product, kept by an event consumer"""
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    event_type = db.Column(db.String(20), nullable=False)
+    location = db.Column(db.String(50), nullable=False)
+    blood_type = db.Column(db.String(10), nullable=False)
+    product_type = db.Column(db.String(20), nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.Index('ux_inventory_event_total_key', 'day', 'event_type', 'location', 'blood_type', 'product_type',
+                 unique=True),
+    )
 
 # Utility Functions
 def calculate_expiry_date(product_type, donation_date):
@@ -517,6 +782,599 @@ def get_temperature_zone(product_type):
     }
     return zones.get(product_type, "2-6C")
 
+def location_usage(loc):
+    """Capacity usage of a location as a percentage"""
+    return (loc.current_stock / loc.capacity * 100) if loc.capacity and loc.capacity > 0 else 0
+
+# Blood type compatibility - for each product rule and recipient type, the
+# donor types it may receive are precomputed as a bitmask over BLOOD_TYPES.
+BLOOD_TYPES = ['A+', 'A-', 'B+', 'B-', 'O+', 'O-', 'AB+', 'AB-']
+BLOOD_TYPE_BITS = {blood_type: 1 << index for index, blood_type in enumerate(BLOOD_TYPES)}
+ABO_ANTIGENS = {'O': frozenset(), 'A': frozenset('A'), 'B': frozenset('B'), 'AB': frozenset('AB')}
+
+def split_blood_type(blood_type):
+    return ABO_ANTIGENS[blood_type[:-1]], blood_type.endswith('+')
+
+def red_cells_compatible(donor, recipient):
+    """Donor cells carry no ABO or RhD antigen the recipient lacks"""
+    donor_antigens, donor_rh = split_blood_type(donor)
+    recipient_antigens, recipient_rh = split_blood_type(recipient)
+    return donor_antigens <= recipient_antigens and (recipient_rh or not donor_rh)
+
+def whole_blood_compatible(donor, recipient):
+    """Whole blood carries both cells and plasma, so ABO must be identical"""
+    donor_antigens, donor_rh = split_blood_type(donor)
+    recipient_antigens, recipient_rh = split_blood_type(recipient)
+    return donor_antigens == recipient_antigens and (recipient_rh or not donor_rh)
+
+def plasma_compatible(donor, recipient):
+    """Reversed: donor plasma has no antibody against the recipient's antigens"""
+    return split_blood_type(recipient)[0] <= split_blood_type(donor)[0]
+
+COMPATIBILITY_RULES = {
+    'RBC': red_cells_compatible,
+    'Whole Blood': whole_blood_compatible,
+    'Plasma': plasma_compatible
+}
+
+def build_donor_masks(rule):
+    return {
+        recipient: sum(BLOOD_TYPE_BITS[donor] for donor in BLOOD_TYPES if rule(donor, recipient))
+        for recipient in BLOOD_TYPES
+    }
+
+# {product_type: {recipient: donor bitmask}}; products without a rule
+# (Platelets) are matched on the exact type only
+DONOR_MASKS = {product: build_donor_masks(rule) for product, rule in COMPATIBILITY_RULES.items()}
+
+def compatible_donor_types(recipient, product_type):
+    """Donor blood types a recipient can receive for a product, exact type first"""
+    mask = DONOR_MASKS.get(product_type, {}).get(recipient, BLOOD_TYPE_BITS.get(recipient, 0))
+    donors = [blood_type for blood_type in BLOOD_TYPES if mask & BLOOD_TYPE_BITS[blood_type]]
+    return sorted(donors, key=lambda blood_type: blood_type != recipient)
+
+def get_alert_thresholds(product_type):
+    thresholds = app.config['EXPIRY_ALERT_THRESHOLDS'].get(product_type, app.config['DEFAULT_EXPIRY_ALERT_THRESHOLDS'])
+    return sorted(thresholds)
+
+def get_alert_threshold(product_type, days_remaining):
+    """Tightest alert threshold a unit has crossed, or None if it crossed none"""
+    for threshold in get_alert_thresholds(product_type):
+        if days_remaining <= threshold:
+            return threshold
+    return None
+
+def reserve_blood_ids(count=1):
+    """Reserve a contiguous block of blood_id sequence numbers
+
+    The counter lives in the database and is bumped with a single upsert, so
+    the block is unique across threads and across worker processes sharing
+    the SQLite file. It runs inside the caller's transaction: the numbers are
+    taken in commit order and a rollback simply leaves a gap.
+    """
+    return reserve_sequence('blood_id', count)
+
+def reserve_sequence(name, count=1):
+    stmt = sqlite_insert(IdSequence).values(name=name, last_value=count)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['name'],
+        set_={'last_value': IdSequence.last_value + count}
+    ).returning(IdSequence.last_value)
+    last_value = db.session.execute(stmt).scalar_one()
+    return range(last_value - count + 1, last_value + 1)
+
+def format_blood_id(blood_type, product_type, sequence, day=None):
+    if day is None:
+        day = datetime.now().date()
+    return f"{blood_type}_{product_type}_{day.strftime('%Y%m%d')}_{sequence:08d}"
+
+def allocate_blood_id(blood_type, product_type):
+    return format_blood_id(blood_type, product_type, reserve_blood_ids(1)[0])
+
+# Inventory event log - every state change appends one InventoryEvent per
+# unit in the same transaction as the change itself, so the log and the
+# inventory never disagree. Units leave BloodInventory when disposed; their
+# history stays here. moved is part of the vocabulary for the transfer step,
+# which does not change unit state yet; archived marks a unit that reached a
+# terminal status outside the write paths leaving the hot table.
+EVENT_TYPES = ('received', 'moved', 'reserved', 'issued', 'disposed', 'expired', 'archived')
+
+def record_events(event_type, units, reference=None, occurred_at=None, status=None):
+    """Append an event for each unit (model, RETURNING row or dict with BloodInventory fields)
+
+    status is the units' status before the change; it defaults to their own,
+    and to 'Available' for models not yet flushed.
+    """
+    if occurred_at is None:
+        occurred_at = datetime.now()
+    rows = []
+    for unit in units:
+        get = unit.get if isinstance(unit, dict) else lambda field: getattr(unit, field)
+        rows.append({
+            'event_type': event_type,
+            'blood_id': get('blood_id'),
+            'blood_type': get('blood_type'),
+            'product_type': get('product_type'),
+            'location': get('current_location'),
+            'expiry_date': get('expiry_date'),
+            'reference': reference,
+            'status': status or get('status') or 'Available',
+            'occurred_at': occurred_at
+        })
+    if rows:
+        db.session.execute(db.insert(InventoryEvent), rows)
+
+# Event consumers - each keeps a cursor (the last event id it applied) in an
+# IdSequence row and only ever reads events past it, so aggregates grow with
+# new activity instead of being recomputed from the whole inventory. SQLite
+# has a single writer, so ids are committed in order and a cursor never
+# skips an event that commits later.
+def apply_daily_totals(events):
+    """Add a batch of events to the per-day InventoryEventTotal counts"""
+    counts = Counter(
+        (event.occurred_at.date(), event.event_type, event.location, event.blood_type, event.product_type)
+        for event in events
+    )
+    stmt = sqlite_insert(InventoryEventTotal)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['day', 'event_type', 'location', 'blood_type', 'product_type'],
+        set_={'count': InventoryEventTotal.count + stmt.excluded['count']}
+    )
+    db.session.execute(stmt, [
+        {'day': day, 'event_type': event_type, 'location': location, 'blood_type': blood_type,
+         'product_type': product_type, 'count': count}
+        for (day, event_type, location, blood_type, product_type), count in counts.items()
+    ])
+
+EVENT_CONSUMERS = {
+    'daily_totals': apply_daily_totals,
+}
+
+def run_event_consumers(batch_size=None):
+    """Apply every event past each consumer's cursor; returns events applied per consumer
+
+    Each batch commits together with its cursor move. The cursor only
+    advances from the value this run read, so when two workers race for the
+    same batch one of them rolls back instead of counting it twice.
+    """
+    if batch_size is None:
+        batch_size = app.config['EVENT_BATCH_SIZE']
+    applied = {}
+    for name, consumer in EVENT_CONSUMERS.items():
+        cursor_name = f'event_consumer:{name}'
+        applied[name] = 0
+        while True:
+            position = db.session.execute(
+                db.select(IdSequence.last_value).where(IdSequence.name == cursor_name)
+            ).scalar() or 0
+            events = db.session.execute(
+                db.select(InventoryEvent.id, InventoryEvent.event_type, InventoryEvent.location,
+                          InventoryEvent.blood_type, InventoryEvent.product_type, InventoryEvent.occurred_at)
+                .where(InventoryEvent.id > position)
+                .order_by(InventoryEvent.id)
+                .limit(batch_size)
+            ).all()
+            if not events:
+                db.session.rollback()
+                break
+            consumer(events)
+            stmt = sqlite_insert(IdSequence).values(name=cursor_name, last_value=events[-1].id)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['name'],
+                set_={'last_value': events[-1].id},
+                where=IdSequence.last_value == position
+            )
+            if db.session.execute(stmt).rowcount:
+                db.session.commit()
+                applied[name] += len(events)
+            else:
+                db.session.rollback()
+    return applied
+
+# Statistics service
+class InventoryStats(NamedTuple):
+    total_units: int
+    available_units: int
+    expired_units: int
+    expiring_3_days: int
+    expiring_7_days: int
+    available_expiring_7_days: int
+    by_blood_type: Dict[str, int]
+    by_product_type: Dict[str, int]
+    by_location: Dict[str, int]
+    by_status: Dict[str, int]
+
+    @property
+    def wastage_rate(self):
+        return (self.expired_units / self.total_units * 100) if self.total_units > 0 else 0
+
+def compute_inventory_stats(today=None):
+    """Compute every inventory statistic in a single GROUP BY scan
+
+    "Expiring" counts exclude units that have already expired.
+    """
+    if today is None:
+        today = datetime.now().date()
+
+    def count_where(condition):
+        return db.func.sum(db.case((condition, 1), else_=0))
+
+    expiry = BloodInventory.expiry_date
+    rows = db.session.query(
+        BloodInventory.blood_type,
+        BloodInventory.product_type,
+        BloodInventory.current_location,
+        BloodInventory.status,
+        db.func.count(),
+        count_where(expiry < today),
+        count_where(expiry.between(today, today + timedelta(days=3))),
+        count_where(expiry.between(today, today + timedelta(days=7)))
+    ).group_by(
+        BloodInventory.blood_type,
+        BloodInventory.product_type,
+        BloodInventory.current_location,
+        BloodInventory.status
+    ).all()
+
+    total = available = expired = expiring_3 = expiring_7 = available_expiring_7 = 0
+    by_blood_type, by_product_type, by_location, by_status = {}, {}, {}, {}
+
+    for blood_type, product_type, location, status, count, n_expired, n_expiring_3, n_expiring_7 in rows:
+        total += count
+        expired += n_expired
+        expiring_3 += n_expiring_3
+        expiring_7 += n_expiring_7
+        if status == 'Available':
+            available += count
+            available_expiring_7 += n_expiring_7
+
+        by_blood_type[blood_type] = by_blood_type.get(blood_type, 0) + count
+        by_product_type[product_type] = by_product_type.get(product_type, 0) + count
+        by_location[location] = by_location.get(location, 0) + count
+        by_status[status] = by_status.get(status, 0) + count
+
+    return InventoryStats(
+        total_units=total,
+        available_units=available,
+        expired_units=expired,
+        expiring_3_days=expiring_3,
+        expiring_7_days=expiring_7,
+        available_expiring_7_days=available_expiring_7,
+        by_blood_type=by_blood_type,
+        by_product_type=by_product_type,
+        by_location=by_location,
+        by_status=by_status
+    )
+
+# Expiry histogram - answers expired/expiring counts from memory. It is
+# loaded from the database on first use; after that, whenever the data
+# version moves, it replays the InventoryEvent rows committed since it last
+# synced. Events commit with the change they record, so writes from this
+# and every other worker process reach it without a full reload.
+expiry_histogram = ExpiryHistogram()
+
+# Status changes each event type makes to its unit; None is the status the
+# event recorded for the unit before the change
+EVENT_STATUS_CHANGES = {
+    'received': ((None, 1),),
+    'reserved': ((None, -1), ('Reserved', 1)),
+    'issued': ((None, -1),),
+    'disposed': ((None, -1),),
+    'archived': ((None, -1),),
+}
+# Past this many new events a fresh load is cheaper than replaying them
+HISTOGRAM_REPLAY_LIMIT = 20000
+
+def data_version_column():
+    """The committed data version as a scalar subquery, to read alongside the data it covers"""
+    return db.select(db.func.coalesce(db.func.max(IdSequence.last_value), 0)).where(
+        IdSequence.name == DATA_VERSION
+    ).scalar_subquery().label('data_version')
+
+def load_expiry_histogram():
+    """Rebuild the histogram from committed rows, noting the last event they include"""
+    # The data version and event position are read in the same statement as
+    # the counts, so all three come from one snapshot; the outer join yields
+    # a row even with no stock
+    position = db.select(
+        data_version_column(),
+        db.func.coalesce(db.func.max(InventoryEvent.id), 0).label('event_id')
+    ).subquery()
+    with db.engine.connect() as conn:
+        rows = conn.execute(
+            db.select(
+                position.c.data_version,
+                position.c.event_id,
+                BloodInventory.expiry_date,
+                BloodInventory.status,
+                BloodInventory.blood_type,
+                BloodInventory.product_type,
+                BloodInventory.current_location,
+                db.func.count(BloodInventory.id)
+            ).select_from(position).outerjoin(BloodInventory, db.true()).group_by(
+                position.c.data_version,
+                position.c.event_id,
+                BloodInventory.expiry_date,
+                BloodInventory.status,
+                BloodInventory.blood_type,
+                BloodInventory.product_type,
+                BloodInventory.current_location
+            )
+        ).all()
+    expiry_histogram.rebuild([row[2:] for row in rows if row[-1]])
+    expiry_histogram.event_id = rows[0].event_id
+    expiry_histogram.data_version = rows[0].data_version
+
+def replay_inventory_events():
+    """Apply the events committed since the histogram last synced"""
+    # One statement, so the version read covers exactly the events returned;
+    # the outer join yields the version even with no new events. The events
+    # come in id order from the primary key, but the join may reorder them.
+    version = db.select(data_version_column()).subquery()
+    new_events = db.select(
+        InventoryEvent.id, InventoryEvent.event_type, InventoryEvent.status, InventoryEvent.expiry_date,
+        InventoryEvent.blood_type, InventoryEvent.product_type, InventoryEvent.location
+    ).where(InventoryEvent.id > expiry_histogram.event_id).order_by(InventoryEvent.id).limit(
+        HISTOGRAM_REPLAY_LIMIT + 1
+    ).subquery()
+    with db.engine.connect() as conn:
+        rows = conn.execute(
+            db.select(version.c.data_version, new_events).select_from(version).outerjoin(new_events, db.true())
+        ).all()
+    events = [row for row in rows if row.id is not None]
+    if len(events) > HISTOGRAM_REPLAY_LIMIT:
+        load_expiry_histogram()
+        return
+
+    changes = Counter()
+    for event in events:
+        for status, count in EVENT_STATUS_CHANGES.get(event.event_type, ()):
+            changes[(event.expiry_date, status or event.status, event.blood_type, event.product_type,
+                     event.location)] += count
+    for key, count in changes.items():
+        if count:
+            expiry_histogram.add(*key, count=count)
+    if events:
+        expiry_histogram.event_id = max(event.id for event in events)
+    expiry_histogram.data_version = rows[0].data_version
+
+def get_expiry_histogram():
+    version = current_data_version()
+    if not expiry_histogram.loaded or expiry_histogram.data_version != version:
+        with expiry_histogram.lock:
+            if not expiry_histogram.loaded:
+                load_expiry_histogram()
+            elif expiry_histogram.data_version != version:
+                replay_inventory_events()
+    return expiry_histogram
+
+def get_inventory_stats(today=None):
+    """InventoryStats answered from the expiry histogram instead of SQL"""
+    if today is None:
+        today = datetime.now().date()
+    histogram = get_expiry_histogram()
+
+    return InventoryStats(
+        total_units=histogram.count(),
+        available_units=histogram.count(status='Available'),
+        expired_units=histogram.count_expired(today),
+        expiring_3_days=histogram.count_expiring(today, 3),
+        expiring_7_days=histogram.count_expiring(today, 7),
+        available_expiring_7_days=histogram.count_expiring(today, 7, status='Available'),
+        by_blood_type=histogram.breakdown('blood_type'),
+        by_product_type=histogram.breakdown('product_type'),
+        by_location=histogram.breakdown('location'),
+        by_status=histogram.breakdown('status')
+    )
+
+# Read-model cache - derived values (location list, counts, rendered pages)
+# are reused until the data changes. Every write bumps a shared version row
+# in the same transaction, so all worker processes on the SQLite file see
+# the change; the current date is part of the key so expiry-based values
+# roll over at midnight.
+DATA_VERSION = 'data_version'
+
+def read_data_version():
+    return db.session.query(IdSequence.last_value).filter_by(name=DATA_VERSION).scalar() or 0
+
+def bump_data_version():
+    """Mark the data as changed; call inside the write's transaction"""
+    stmt = sqlite_insert(IdSequence).values(name=DATA_VERSION, last_value=1)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['name'],
+        set_={'last_value': IdSequence.last_value + 1}
+    ).returning(IdSequence.last_value)
+    version = db.session.execute(stmt).scalar_one()
+    g.data_version = version
+    return version
+
+def current_data_version():
+    """The shared data version, read once per request"""
+    if 'data_version' not in g:
+        g.data_version = read_data_version()
+    return g.data_version
+
+class ReadCache:
+    """Values derived from the database, valid for one data version and day"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.key = None
+        self.values = {}
+
+    def get(self, name, compute):
+        key = (current_data_version(), datetime.now().date())
+        with self.lock:
+            if key != self.key:
+                self.key = key
+                self.values = {}
+            if name in self.values:
+                return self.values[name]
+
+        value = compute()
+        with self.lock:
+            if self.key == key:
+                self.values[name] = value
+        return value
+
+read_cache = ReadCache()
+
+# Conditional GETs - ETags are derived from the data version, language,
+# date and query string, so a matching If-None-Match is answered with 304
+# before the view runs any query or renders a template.
+def conditional_get(per_language=True, cache_control='no-cache'):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            parts = [request.endpoint, str(current_data_version()), datetime.now().date().isoformat(),
+                     request.query_string.decode('utf-8', 'replace')]
+            if per_language:
+                parts.append(get_current_language())
+            etag = hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()
+
+            if request.if_none_match.contains(etag):
+                response = Response(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = cache_control
+            if per_language:
+                response.vary.add('Cookie')
+            return response
+        return wrapper
+    return decorator
+
+def get_locations():
+    return read_cache.get('locations', lambda: [loc.to_dict() for loc in Location.query.all()])
+
+def get_cached_inventory_stats():
+    return read_cache.get('inventory_stats', get_inventory_stats)
+
+def verify_expiry_histogram(today=None):
+    """Compare histogram answers with SQL and return any mismatches"""
+    if today is None:
+        today = datetime.now().date()
+    mismatches = []
+
+    from_histogram = get_inventory_stats(today)._asdict()
+    from_sql = compute_inventory_stats(today)._asdict()
+    for field, expected in from_sql.items():
+        if field == 'by_status':
+            expected = {status: count for status, count in expected.items() if status is not None}
+        if from_histogram[field] != expected:
+            mismatches.append(f"{field}: histogram={from_histogram[field]} sql={expected}")
+
+    histogram = get_expiry_histogram()
+    for location in histogram.values['location']:
+        for days in (1, 3, 7, 30):
+            expected = BloodInventory.query.filter(
+                BloodInventory.current_location == location,
+                BloodInventory.expiry_date.between(today, today + timedelta(days=days))
+            ).count()
+            actual = histogram.count_expiring(today, days, location=location)
+            if actual != expected:
+                mismatches.append(f"{location} expiring in {days} days: histogram={actual} sql={expected}")
+
+    return mismatches
+
+# Demand forecasting - daily consumption and wastage series per (location,
+# blood type, product) are fitted with weekly seasonal exponential smoothing
+# in forecasting.py, every series in one set of array operations.
+# Consumption is units reserved by allocations, dated by their allocation
+# id; wastage is units that expired while still Available. A series runs
+# short on the first day its forecast demand exceeds today's stock less
+# what expires unused, assuming no new receipts.
+def load_forecast_history(today):
+    """Series keys with their consumption, wastage, stock and expiring arrays"""
+    history_days = app.config['FORECAST_HISTORY_DAYS']
+    horizon = app.config['FORECAST_HORIZON_DAYS']
+    first_day = today - timedelta(days=history_days)
+    origin = first_day.toordinal()
+
+    allocation_day = db.func.substr(BloodInventory.allocation_id, 7, 8)
+    consumed = db.session.execute(
+        db.select(BloodInventory.current_location, BloodInventory.blood_type,
+                  BloodInventory.product_type, allocation_day, db.func.count())
+        .where(BloodInventory.status == 'Reserved',
+               BloodInventory.allocation_id.like('ALLOC_%'),
+               allocation_day.between(first_day.strftime('%Y%m%d'),
+                                      (today - timedelta(days=1)).strftime('%Y%m%d')))
+        .group_by(BloodInventory.current_location, BloodInventory.blood_type,
+                  BloodInventory.product_type, allocation_day)
+    ).all()
+    available = get_expiry_histogram().totals(('location', 'blood_type', 'product_type', 'expiry_date'),
+                                              start=first_day, status='Available')
+    expired = {key: count for key, count in available.items() if key[3] < today.toordinal()}
+    on_hand = {key: count for key, count in available.items() if key[3] >= today.toordinal()}
+
+    keys = sorted({tuple(row[:3]) for row in consumed} | {key[:3] for key in on_hand})
+    index = {key: row for row, key in enumerate(keys)}
+    consumption = np.zeros((len(keys), history_days))
+    wastage = np.zeros((len(keys), history_days))
+    stock = np.zeros(len(keys))
+    expiring = np.zeros((len(keys), horizon))
+
+    if consumed:
+        day_index = {(first_day + timedelta(days=day)).strftime('%Y%m%d'): day for day in range(history_days)}
+        np.add.at(consumption, ([index[tuple(row[:3])] for row in consumed], [day_index[row[3]] for row in consumed]),
+                  [row[4] for row in consumed])
+    expired = {key: count for key, count in expired.items() if key[:3] in index}
+    if expired:
+        np.add.at(wastage, ([index[key[:3]] for key in expired], [key[3] - origin for key in expired]),
+                  list(expired.values()))
+    if on_hand:
+        np.add.at(stock, [index[key[:3]] for key in on_hand], list(on_hand.values()))
+        soon = {key: count for key, count in on_hand.items() if key[3] - today.toordinal() < horizon}
+        if soon:
+            np.add.at(expiring, ([index[key[:3]] for key in soon],
+                                 [key[3] - today.toordinal() for key in soon]), list(soon.values()))
+
+    return keys, consumption, wastage, stock, expiring
+
+def compute_demand_forecast(today=None):
+    """Per-series forecast rows, projected shortages first (soonest first)"""
+    if today is None:
+        today = datetime.now().date()
+    history_days = app.config['FORECAST_HISTORY_DAYS']
+    horizon = app.config['FORECAST_HORIZON_DAYS']
+
+    keys, consumption, wastage, stock, expiring = load_forecast_history(today)
+    if not keys:
+        return []
+
+    level, seasonal, _ = fit_smoothing(consumption)
+    demand = forecast(level, seasonal, history_days, horizon)
+    level, seasonal, _ = fit_smoothing(wastage)
+    expected_wastage = forecast(level, seasonal, history_days, horizon)
+    projected, lost = project_stock(stock, expiring, demand)
+    shortage = first_shortage(projected)
+
+    daily_demand = demand.mean(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cover = np.where(daily_demand > 0, stock / daily_demand, np.nan)
+
+    rows = []
+    for (location, blood_type, product_type), units, per_day, wasted, expiry_loss, day, days_of_cover in zip(
+            keys, stock.tolist(), daily_demand.tolist(), expected_wastage.mean(axis=1).tolist(),
+            lost[:, -1].tolist(), shortage.tolist(), cover.tolist()):
+        rows.append({
+            'location': location,
+            'blood_type': blood_type,
+            'product_type': product_type,
+            'stock': int(units),
+            'daily_demand': round(per_day, 2),
+            'daily_wastage': round(wasted, 2),
+            'projected_expiry_loss': round(expiry_loss, 1),
+            'days_of_cover': None if math.isnan(days_of_cover) else round(days_of_cover, 1),
+            'shortage_date': (today + timedelta(days=day)).strftime('%Y-%m-%d') if day >= 0 else None
+        })
+    rows.sort(key=lambda row: (row['shortage_date'] is None, row['shortage_date'] or '',
+                               row['location'], row['blood_type'], row['product_type']))
+    return rows
+
+def get_demand_forecast():
+    return read_cache.get('demand_forecast', compute_demand_forecast)
+
 # HTML Templates as strings - FIXED: Proper template syntax and structure
 BASE_TEMPLATE = '''
 <!DOCTYPE html>
@@ -565,7 +1423,7 @@ BASE_TEMPLATE = '''
 
     <div class="container mt-4">
         <div id="alert-container"></div>
-        {{ content | safe }}
+        {% block content %}{% endblock %}
     </div>
 
     <script src="https://cdn.jsdelivr.net/npm/bootstrap@5.1.3/dist/js/bootstrap.bundle.min.js"></script>
@@ -645,38 +1503,13 @@ BASE_TEMPLATE = '''
             });
         });
     </script>
-    {{ scripts | safe }}
+    {% block scripts %}{% endblock %}
 </body>
 </html>
 '''
 
-# Routes
-@app.route('/')
-def dashboard():
-    lang = get_current_language()
-    
-    total_units = BloodInventory.query.filter_by(status='Available').count()
-    
-    expiring_soon = BloodInventory.query.filter(
-        BloodInventory.status == 'Available',
-        BloodInventory.expiry_date <= datetime.now().date() + timedelta(days=7)
-    ).count()
-    
-    locations = Location.query.all()
-    location_data = []
-    for loc in locations:
-        usage_percent = round((loc.current_stock / loc.capacity * 100), 1) if loc.capacity and loc.capacity > 0 else 0
-        location_data.append({
-            'location_name': loc.location_name,
-            'current_stock': loc.current_stock,
-            'capacity': loc.capacity,
-            'usage_percent': usage_percent
-        })
-    
-    recent_alerts = ExpiryAlert.query.filter_by(action_taken=False).order_by(ExpiryAlert.alert_date.desc()).limit(5).all()
-    active_transport = Transportation.query.filter(Transportation.status.in_(['Scheduled', 'In Transit'])).count()
-    
-    content = render_template_string('''
+DASHBOARD_TEMPLATE = '''{% extends "base.html" %}
+{% block content %}
     <div class="row">
         <div class="col-12">
             <h1 class="mb-4">{{ translate("Dashboard Overview") }}</h1>
@@ -689,7 +1522,7 @@ def dashboard():
                 <div class="card-body">
                     <div class="d-flex justify-content-between align-items-center">
                         <div>
-                            <h2 class="mb-0">''' + str(total_units) + '''</h2>
+                            <h2 class="mb-0">{{ total_units }}</h2>
                             <p class="mb-0">{{ translate("Total Blood Units") }}</p>
                         </div>
                         <div class="display-6">
@@ -704,7 +1537,7 @@ def dashboard():
                 <div class="card-body">
                     <div class="d-flex justify-content-between align-items-center">
                         <div>
-                            <h2 class="mb-0">''' + str(expiring_soon) + '''</h2>
+                            <h2 class="mb-0">{{ expiring_soon }}</h2>
                             <p class="mb-0">{{ translate("Expiring Soon (7 days)") }}</p>
                         </div>
                         <div class="display-6">
@@ -719,7 +1552,7 @@ def dashboard():
                 <div class="card-body">
                     <div class="d-flex justify-content-between align-items-center">
                         <div>
-                            <h2 class="mb-0">''' + str(active_transport) + '''</h2>
+                            <h2 class="mb-0">{{ active_transport }}</h2>
                             <p class="mb-0">{{ translate("Active Shipments") }}</p>
                         </div>
                         <div class="display-6">
@@ -734,7 +1567,7 @@ def dashboard():
                 <div class="card-body">
                     <div class="d-flex justify-content-between align-items-center">
                         <div>
-                            <h2 class="mb-0">''' + str(len(locations)) + '''</h2>
+                            <h2 class="mb-0">{{ location_data | length }}</h2>
                             <p class="mb-0">{{ translate("Storage Locations") }}</p>
                         </div>
                         <div class="display-6">
@@ -753,20 +1586,21 @@ def dashboard():
                     <h5 class="card-title mb-0">{{ translate("Location Capacity") }}</h5>
                 </div>
                 <div class="card-body">
-    ''' + ''.join([f'''
+                    {% for loc in location_data %}
                     <div class="mb-3">
                         <div class="d-flex justify-content-between mb-1">
-                            <span class="small">{loc['location_name']}</span>
-                            <span class="small text-muted">{loc['current_stock']}/{loc['capacity']}</span>
+                            <span class="small">{{ loc.location_name }}</span>
+                            <span class="small text-muted">{{ loc.current_stock }}/{{ loc.capacity }}</span>
                         </div>
                         <div class="progress" style="height: 8px;">
-                            <div class="progress-bar {'bg-warning' if loc['usage_percent'] > 80 else 'bg-success'}" 
-                                 role="progressbar" style="width: {loc['usage_percent']}%"
-                                 aria-valuenow="{loc['usage_percent']}" aria-valuemin="0" aria-valuemax="100">
+                            <div class="progress-bar {{ 'bg-warning' if loc.usage_percent > 80 else 'bg-success' }}"
+                                 role="progressbar" style="width: {{ loc.usage_percent }}%"
+                                 aria-valuenow="{{ loc.usage_percent }}" aria-valuemin="0" aria-valuemax="100">
                             </div>
                         </div>
-                        <small class="text-muted">{loc['usage_percent']}% {{ translate("full") }}</small>
-                    </div>''' for loc in location_data]) + '''
+                        <small class="text-muted">{{ loc.usage_percent }}% {{ translate("full") }}</small>
+                    </div>
+                    {% endfor %}
                 </div>
             </div>
         </div>
@@ -777,21 +1611,23 @@ def dashboard():
                     <h5 class="card-title mb-0">{{ translate("Recent Alerts") }}</h5>
                 </div>
                 <div class="card-body">
-    ''' + (''.join([f'''
+                    {% for alert in recent_alerts %}
                     <div class="alert alert-warning alert-dismissible fade show py-2 mb-2">
                         <div class="d-flex align-items-center">
                             <i class="fas fa-exclamation-circle me-2"></i>
                             <small class="flex-grow-1">
-                                {{ translate("Blood unit") }} <strong>{alert.blood_id}</strong> 
-                                {{ translate("expiring in") }} {alert.days_remaining} {{ translate("days") }}
+                                {{ translate("Blood unit") }} <strong>{{ alert.blood_id }}</strong>
+                                {{ translate("expiring in") }} {{ alert.days_remaining }} {{ translate("days") }}
                             </small>
                         </div>
                         <button type="button" class="btn-close btn-close-sm" data-bs-dismiss="alert"></button>
-                    </div>''' for alert in recent_alerts]) if recent_alerts else '''
+                    </div>
+                    {% else %}
                     <div class="text-center text-muted py-4">
                         <i class="fas fa-check-circle fa-2x mb-2"></i>
                         <p class="mb-0">{{ translate("No recent alerts") }}</p>
-                    </div>''') + '''
+                    </div>
+                    {% endfor %}
                 </div>
             </div>
 
@@ -815,56 +1651,11 @@ def dashboard():
             </div>
         </div>
     </div>
-    ''', lang=lang, translate=translate_text)
-    
-    return render_template_string(BASE_TEMPLATE, content=content, scripts='', lang=lang, translate=translate_text)
+{% endblock %}
+'''
 
-@app.route('/inventory')
-def inventory():
-    lang = get_current_language()
-    
-    blood_type = request.args.get('blood_type', '')
-    location = request.args.get('location', '')
-    
-    query = BloodInventory.query
-    
-    if blood_type:
-        query = query.filter_by(blood_type=blood_type)
-    if location:
-        query = query.filter_by(current_location=location)
-    
-    inventory_items = query.order_by(BloodInventory.expiry_date).all()
-    locations = Location.query.all()
-    
-    # Prepare inventory data for template
-    inventory_data = []
-    for item in inventory_items:
-        days_left = (item.expiry_date - datetime.now().date()).days
-        
-        if days_left <= 0:
-            status_text = translate_text("Expired", lang)
-            status_class = "bg-dark"
-        elif days_left <= 3:
-            status_text = f"{days_left} {translate_text('days', lang)}"
-            status_class = "bg-danger"
-        elif days_left <= 7:
-            status_text = f"{days_left} {translate_text('days', lang)}"
-            status_class = "bg-warning"
-        else:
-            status_text = f"{days_left} {translate_text('days', lang)}"
-            status_class = "bg-success"
-            
-        inventory_data.append({
-            'blood_id': item.blood_id,
-            'blood_type': item.blood_type,
-            'product_type': item.product_type,
-            'location': item.current_location,
-            'expiry_date': item.expiry_date.strftime('%Y-%m-%d'),
-            'status_text': status_text,
-            'status_class': status_class
-        })
-    
-    inventory_template = '''
+INVENTORY_TEMPLATE = '''{% extends "base.html" %}
+{% block content %}
     <div class="row">
         <div class="col-12">
             <div class="d-flex justify-content-between align-items-center mb-4">
@@ -886,10 +1677,9 @@ def inventory():
                     <label class="form-label">{{ translate("Blood Type") }}</label>
                     <select name="blood_type" class="form-select">
                         <option value="">{{ translate("All Types") }}</option>
-                        <option value="A+" {% if request.args.get("blood_type") == "A+" %}selected{% endif %}>A+</option>
-                        <option value="B+" {% if request.args.get("blood_type") == "B+" %}selected{% endif %}>B+</option>
-                        <option value="O+" {% if request.args.get("blood_type") == "O+" %}selected{% endif %}>O+</option>
-                        <option value="AB+" {% if request.args.get("blood_type") == "AB+" %}selected{% endif %}>AB+</option>
+                        {% for blood_type in blood_types %}
+                        <option value="{{ blood_type }}" {% if request.args.get("blood_type") == blood_type %}selected{% endif %}>{{ blood_type }}</option>
+                        {% endfor %}
                     </select>
                 </div>
                 <div class="col-md-4">
@@ -946,73 +1736,98 @@ def inventory():
                     </tbody>
                 </table>
             </div>
+            <div class="d-flex justify-content-between">
+                {% if request.args.get("after") %}
+                <a href="{{ first_page_url }}" class="btn btn-outline-secondary">{{ translate("First Page") }}</a>
+                {% else %}
+                <span></span>
+                {% endif %}
+                {% if next_page_url %}
+                <a href="{{ next_page_url }}" class="btn btn-outline-primary">{{ translate("Next Page") }}</a>
+                {% endif %}
+            </div>
         </div>
     </div>
-    '''
-    
-    content = render_template_string(inventory_template, 
-                                   inventory_data=inventory_data, 
-                                   all_locations=locations,
-                                   request=request,
-                                   lang=lang, 
-                                   translate=translate_text)
-    
-    return render_template_string(BASE_TEMPLATE, content=content, scripts='', lang=lang, translate=translate_text)
+{% endblock %}
+'''
 
-@app.route('/expired-blood')
-def expired_blood():
-    lang = get_current_language()
-    
-    expired_blood = BloodInventory.query.filter(
-        BloodInventory.expiry_date < datetime.now().date()
-    ).all()
-    
-    # Prepare expired blood data for template
-    expired_data = []
-    for item in expired_blood:
-        days_expired = (datetime.now().date() - item.expiry_date).days
-        expired_data.append({
-            'blood_id': item.blood_id,
-            'blood_type': item.blood_type,
-            'product_type': item.product_type,
-            'location': item.current_location,
-            'donation_date': item.donation_date.strftime('%Y-%m-%d'),
-            'expiry_date': item.expiry_date.strftime('%Y-%m-%d'),
-            'days_expired': days_expired
-        })
-    
-    expired_template = '''
+EXPIRED_BLOOD_TEMPLATE = '''{% extends "base.html" %}
+{% block content %}
     <div class="row">
         <div class="col-12">
             <div class="d-flex justify-content-between align-items-center mb-4">
                 <h1>{{ translate("Expired Blood Units") }}</h1>
-                <span class="badge bg-danger fs-6">{{ expired_count }} {{ translate("expired units") }}</span>
+                <div>
+                    <span class="badge bg-danger fs-6">{{ expired_count }} {{ translate("expired units") }}</span>
+                    {% if held_data %}
+                    <span class="badge bg-warning text-dark fs-6">{{ held_data|length }} {{ translate("on hold") }}</span>
+                    {% endif %}
+                </div>
             </div>
         </div>
     </div>
 
-    <div class="card">
+    <div class="card mb-4">
         <div class="card-body">
-            {% if expired_data %}
-            <div class="table-responsive">
-                <table class="table table-striped table-hover">
-                    <thead class="table-light">
-                        <tr>
-                            <th>{{ translate("Blood ID") }}</th>
-                            <th>{{ translate("Blood Type") }}</th>
-                            <th>{{ translate("Product Type") }}</th>
-                            <th>{{ translate("Location") }}</th>
-                            <th>{{ translate("Donation Date") }}</th>
-                            <th>{{ translate("Expiry Date") }}</th>
-                            <th>{{ translate("Days Expired") }}</th>
-                            <th>{{ translate("Actions") }}</th>
-                        </tr>
-                    </thead>
-                    <tbody>
-                        {% for item in expired_data %}
-                        <tr>
-                            <td><strong>{{ item.blood_id }}</strong></td>
-                            <td><span class="badge bg-danger">{{ item.blood_type }}</span></td>
+            <form method="GET" class="row g-3">
+                <div class="col-md-4">
+                    <label class="form-label">{{ translate("Location") }}</label>
+                    <select name="location" class="form-select">
+                        <option value="">{{ translate("All Locations") }}</option>
+                        {% for loc in all_locations %}
+                        <option value="{{ loc.location_code }}" {% if request.args.get("location") == loc.location_code %}selected{% endif %}>
+                            {{ loc.location_name }}
+                        </option>
+                        {% endfor %}
+                    </select>
+                </div>
+                <div class="col-md-4">
+                    <label class="form-label">{{ translate("Product Type") }}</label>
+                    <select name="product_type" class="form-select">
+                        <option value="">{{ translate("All Products") }}</option>
+                        {% for product in ["Whole Blood", "RBC", "Platelets", "Plasma"] %}
+                        <option value="{{ product }}" {% if request.args.get("product_type") == product %}selected{% endif %}>{{ translate(product) }}</option>
+                        {% endfor %}
+                    </select>
+                </div>
+                <div class="col-md-4">
+                    <label class="form-label">&nbsp;</label>
+                    <div>
+                        <button type="submit" class="btn btn-outline-primary">{{ translate("Filter") }}</button>
+                        <a href="/expired-blood" class="btn btn-outline-secondary">{{ translate("Clear") }}</a>
+                        {% if expired_data and (request.args.get("location") or request.args.get("product_type")) %}
+                        <button type="button" class="btn btn-danger" onclick="disposeAllShown()">
+                            <i class="fas fa-trash me-1"></i>{{ translate("Dispose All") }} ({{ expired_count }})
+                        </button>
+                        {% endif %}
+                    </div>
+                </div>
+            </form>
+        </div>
+    </div>
+
+    <div class="card">
+        <div class="card-body">
+            {% if expired_data %}
+            <div class="table-responsive">
+                <table class="table table-striped table-hover">
+                    <thead class="table-light">
+                        <tr>
+                            <th>{{ translate("Blood ID") }}</th>
+                            <th>{{ translate("Blood Type") }}</th>
+                            <th>{{ translate("Product Type") }}</th>
+                            <th>{{ translate("Location") }}</th>
+                            <th>{{ translate("Donation Date") }}</th>
+                            <th>{{ translate("Expiry Date") }}</th>
+                            <th>{{ translate("Days Expired") }}</th>
+                            <th>{{ translate("Actions") }}</th>
+                        </tr>
+                    </thead>
+                    <tbody>
+                        {% for item in expired_data %}
+                        <tr>
+                            <td><strong>{{ item.blood_id }}</strong></td>
+                            <td><span class="badge bg-danger">{{ item.blood_type }}</span></td>
                             <td>{{ translate(item.product_type) }}</td>
                             <td>{{ item.location }}</td>
                             <td>{{ item.donation_date }}</td>
@@ -1028,6 +1843,8 @@ def expired_blood():
                     </tbody>
                 </table>
             </div>
+            {% elif held_data %}
+            <p class="text-muted mb-0">{{ translate("No available expired units") }}</p>
             {% else %}
             <div class="text-center py-5">
                 <i class="fas fa-check-circle fa-3x text-success mb-3"></i>
@@ -1041,6 +1858,51 @@ def expired_blood():
         </div>
     </div>
 
+    {% if held_data %}
+    <div class="card mt-4">
+        <div class="card-header">
+            <h5 class="mb-0">{{ translate("Expired units on hold") }}</h5>
+            <small class="text-muted">{{ translate("Reserved for an allocation or a shipment, so Dispose All leaves them; dispose them one by one.") }}</small>
+        </div>
+        <div class="card-body">
+            <div class="table-responsive">
+                <table class="table table-striped table-hover">
+                    <thead class="table-light">
+                        <tr>
+                            <th>{{ translate("Blood ID") }}</th>
+                            <th>{{ translate("Blood Type") }}</th>
+                            <th>{{ translate("Product Type") }}</th>
+                            <th>{{ translate("Location") }}</th>
+                            <th>{{ translate("Expiry Date") }}</th>
+                            <th>{{ translate("Status") }}</th>
+                            <th>{{ translate("Allocation") }}</th>
+                            <th>{{ translate("Actions") }}</th>
+                        </tr>
+                    </thead>
+                    <tbody>
+                        {% for item in held_data %}
+                        <tr>
+                            <td><strong>{{ item.blood_id }}</strong></td>
+                            <td><span class="badge bg-danger">{{ item.blood_type }}</span></td>
+                            <td>{{ translate(item.product_type) }}</td>
+                            <td>{{ item.location }}</td>
+                            <td>{{ item.expiry_date }}</td>
+                            <td>{{ translate(item.status) }}</td>
+                            <td>{{ item.allocation_id or '' }}</td>
+                            <td>
+                                <button class="btn btn-sm btn-outline-danger" onclick="markAsDisposed('{{ item.blood_id }}')">
+                                    <i class="fas fa-trash me-1"></i>{{ translate("Mark as Disposed") }}
+                                </button>
+                            </td>
+                        </tr>
+                        {% endfor %}
+                    </tbody>
+                </table>
+            </div>
+        </div>
+    </div>
+    {% endif %}
+
     <script>
     function markAsDisposed(bloodId) {
         if (confirm('{{ translate("Are you sure you want to mark this blood unit as disposed?") }}')) {
@@ -1063,58 +1925,49 @@ def expired_blood():
             });
         }
     }
+
+    function disposeAllShown() {
+        if (confirm('{{ translate("Are you sure you want to dispose every available expired unit shown?") }}')) {
+            fetch('/api/dispose_expired', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                },
+                body: JSON.stringify({
+                    location: {{ request.args.get("location", "")|tojson }},
+                    product_type: {{ request.args.get("product_type", "")|tojson }}
+                })
+            })
+            .then(response => response.json())
+            .then(result => {
+                if (result.success) {
+                    showAlert(result.disposed + ' {{ translate("units disposed") }}', 'success');
+                    setTimeout(() => {
+                        location.reload();
+                    }, 1500);
+                } else {
+                    showAlert('{{ translate("Error") }}: ' + result.error, 'danger');
+                }
+            });
+        }
+    }
     </script>
-    '''
-    
-    content = render_template_string(expired_template, 
-                                   expired_data=expired_data,
-                                   expired_count=len(expired_data),
-                                   lang=lang, 
-                                   translate=translate_text)
-    
-    return render_template_string(BASE_TEMPLATE, content=content, scripts='', lang=lang, translate=translate_text)
+{% endblock %}
+'''
 
-@app.route('/reports')
-def reports():
-    lang = get_current_language()
-    total_units = BloodInventory.query.count()
-    
-    # Fix: Expiring soon should be units expiring in 3 days but not expired
-    expiring_soon = BloodInventory.query.filter(
-        BloodInventory.expiry_date <= datetime.now().date() + timedelta(days=3),
-        BloodInventory.expiry_date >= datetime.now().date()
-    ).count()
-    
-    expired_count = BloodInventory.query.filter(
-        BloodInventory.expiry_date < datetime.now().date()
-    ).count()
-    
-    # Get blood type distribution
-    blood_types = ['A+', 'B+', 'O+', 'AB+']
-    blood_type_data = []
-    for blood_type in blood_types:
-        count = BloodInventory.query.filter_by(blood_type=blood_type).count()
-        percentage = (count / total_units * 100) if total_units > 0 else 0
-        blood_type_data.append({
-            'type': blood_type,
-            'count': count,
-            'percentage': percentage
-        })
-    
-    locations = Location.query.all()
-    
-    content = render_template_string('''
+REPORTS_TEMPLATE = '''{% extends "base.html" %}
+{% block content %}
     <div class="row">
         <div class="col-12">
             <h1 class="mb-4">{{ translate("Reports & Analytics") }}</h1>
         </div>
     </div>
-    
+
     <div class="row mb-4">
         <div class="col-md-3 mb-3">
             <div class="card text-white bg-primary stat-card">
                 <div class="card-body text-center">
-                    <h2 class="display-4 mb-2">''' + str(total_units) + '''</h2>
+                    <h2 class="display-4 mb-2">{{ total_units }}</h2>
                     <p class="mb-0">{{ translate("Total Blood Units") }}</p>
                 </div>
             </div>
@@ -1122,7 +1975,7 @@ def reports():
         <div class="col-md-3 mb-3">
             <div class="card text-white bg-warning stat-card">
                 <div class="card-body text-center">
-                    <h2 class="display-4 mb-2">''' + str(expiring_soon) + '''</h2>
+                    <h2 class="display-4 mb-2">{{ expiring_soon }}</h2>
                     <p class="mb-0">{{ translate("Expiring in 3 Days") }}</p>
                 </div>
             </div>
@@ -1130,7 +1983,7 @@ def reports():
         <div class="col-md-3 mb-3">
             <div class="card text-white bg-danger stat-card">
                 <div class="card-body text-center">
-                    <h2 class="display-4 mb-2">''' + str(expired_count) + '''</h2>
+                    <h2 class="display-4 mb-2">{{ expired_count }}</h2>
                     <p class="mb-0">{{ translate("Expired Units") }}</p>
                 </div>
             </div>
@@ -1138,13 +1991,13 @@ def reports():
         <div class="col-md-3 mb-3">
             <div class="card text-white bg-info stat-card">
                 <div class="card-body text-center">
-                    <h2 class="display-4 mb-2">''' + f'{(expired_count/total_units*100) if total_units > 0 else 0:.1f}%' + '''</h2>
+                    <h2 class="display-4 mb-2">{{ '%.1f' % wastage_rate }}%</h2>
                     <p class="mb-0">{{ translate("Wastage Rate") }}</p>
                 </div>
             </div>
         </div>
     </div>
-    
+
     <div class="row">
         <div class="col-md-8">
             <div class="card">
@@ -1162,19 +2015,20 @@ def reports():
                                 </tr>
                             </thead>
                             <tbody>
-    ''' + ''.join([f'''
+                                {% for data in blood_type_data %}
                                 <tr>
-                                    <td><span class="badge bg-danger">{data['type']}</span></td>
-                                    <td>{data['count']}</td>
-                                    <td>{data['percentage']:.1f}%</td>
-                                </tr>''' for data in blood_type_data]) + '''
+                                    <td><span class="badge bg-danger">{{ data.type }}</span></td>
+                                    <td>{{ data.count }}</td>
+                                    <td>{{ '%.1f' % data.percentage }}%</td>
+                                </tr>
+                                {% endfor %}
                             </tbody>
                         </table>
                     </div>
                 </div>
             </div>
         </div>
-        
+
         <div class="col-md-4">
             <div class="card">
                 <div class="card-header bg-white">
@@ -1182,12 +2036,12 @@ def reports():
                 </div>
                 <div class="card-body">
                     <div class="d-grid gap-2">
-    ''' + (f'''
+                        {% if expired_count > 0 %}
                         <a href="/expired-blood" class="btn btn-danger">
                             <i class="fas fa-exclamation-triangle me-2"></i>
-                            {{ translate("Manage Expired Blood") }} ({expired_count})
+                            {{ translate("Manage Expired Blood") }} ({{ expired_count }})
                         </a>
-    ''' if expired_count > 0 else '') + '''
+                        {% endif %}
                         <a href="/inventory" class="btn btn-outline-primary">
                             <i class="fas fa-list me-2"></i>
                             {{ translate("View All Inventory") }}
@@ -1199,38 +2053,76 @@ def reports():
                     </div>
                 </div>
             </div>
-            
+
             <div class="card mt-4">
                 <div class="card-header bg-white">
                     <h5 class="card-title mb-0">{{ translate("Location Summary") }}</h5>
                 </div>
                 <div class="card-body">
-    ''' + ''.join([f'''
+                    {% for loc in location_data %}
                     <div class="mb-3">
                         <div class="d-flex justify-content-between">
-                            <small><strong>{loc.location_name}</strong></small>
-                            <small>{loc.current_stock}/{loc.capacity}</small>
+                            <small><strong>{{ loc.location_name }}</strong></small>
+                            <small>{{ loc.current_stock }}/{{ loc.capacity }}</small>
                         </div>
                         <div class="progress" style="height: 6px;">
-                            <div class="progress-bar {'bg-warning' if (loc.current_stock/loc.capacity*100) > 80 else 'bg-success'}" 
-                                 style="width: {(loc.current_stock/loc.capacity*100) if loc.capacity else 0:.1f}%"></div>
+                            <div class="progress-bar {{ 'bg-warning' if loc.usage_percent > 80 else 'bg-success' }}"
+                                 style="width: {{ '%.1f' % loc.usage_percent }}%"></div>
                         </div>
-                    </div>''' for loc in locations]) + '''
+                    </div>
+                    {% endfor %}
                 </div>
             </div>
         </div>
     </div>
-    ''', lang=lang, translate=translate_text)
-    
-    return render_template_string(BASE_TEMPLATE, content=content, scripts='', lang=lang, translate=translate_text)
 
-# FIXED: Mobile Entry route with complete functionality
-@app.route('/mobile')
-def mobile_interface():
-    lang = get_current_language()
-    locations = Location.query.all()
-    
-    content = render_template_string('''
+    <div class="row mt-4">
+        <div class="col-12">
+            <div class="card">
+                <div class="card-header bg-white d-flex justify-content-between">
+                    <h5 class="card-title mb-0">{{ translate("Projected Shortages") }}</h5>
+                    <small class="text-muted">{{ shortage_count }} / {{ forecast_horizon }}d</small>
+                </div>
+                <div class="card-body">
+                    {% if shortages %}
+                    <div class="table-responsive">
+                        <table class="table table-sm">
+                            <thead>
+                                <tr>
+                                    <th>{{ translate("Location") }}</th>
+                                    <th>{{ translate("Blood Type") }}</th>
+                                    <th>{{ translate("Product Type") }}</th>
+                                    <th>{{ translate("Stock") }}</th>
+                                    <th>{{ translate("Daily Use") }}</th>
+                                    <th>{{ translate("Shortage Date") }}</th>
+                                </tr>
+                            </thead>
+                            <tbody>
+                                {% for row in shortages %}
+                                <tr>
+                                    <td>{{ row.location }}</td>
+                                    <td><span class="badge bg-danger">{{ row.blood_type }}</span></td>
+                                    <td>{{ translate(row.product_type) }}</td>
+                                    <td>{{ row.stock }}</td>
+                                    <td>{{ '%.1f' % row.daily_demand }}</td>
+                                    <td><strong>{{ row.shortage_date }}</strong></td>
+                                </tr>
+                                {% endfor %}
+                            </tbody>
+                        </table>
+                    </div>
+                    {% else %}
+                    <p class="text-muted mb-0">{{ translate("No shortages projected") }}</p>
+                    {% endif %}
+                </div>
+            </div>
+        </div>
+    </div>
+{% endblock %}
+'''
+
+MOBILE_TEMPLATE = '''{% extends "base.html" %}
+{% block content %}
     <div class="row">
         <div class="col-12">
             <h1 class="mb-4">{{ translate("Mobile Quick Entry") }}</h1>
@@ -1252,10 +2144,9 @@ def mobile_interface():
                                 <label class="form-label">{{ translate("Blood Type") }} *</label>
                                 <select name="blood_type" class="form-select" required>
                                     <option value="">{{ translate("Select Blood Type") }}</option>
-                                    <option value="A+">A+</option>
-                                    <option value="B+">B+</option>
-                                    <option value="O+">O+</option>
-                                    <option value="AB+">AB+</option>
+                                    {% for blood_type in blood_types %}
+                                    <option value="{{ blood_type }}">{{ blood_type }}</option>
+                                    {% endfor %}
                                 </select>
                             </div>
                             <div class="col-md-6 mb-3">
@@ -1274,14 +2165,15 @@ def mobile_interface():
                             <div class="col-md-6 mb-3">
                                 <label class="form-label">{{ translate("Donation Date") }} *</label>
                                 <input type="date" name="donation_date" class="form-control" required 
-                                       value="''' + datetime.now().date().strftime('%Y-%m-%d') + '''">
+                                       value="{{ today }}">
                             </div>
                             <div class="col-md-6 mb-3">
                                 <label class="form-label">{{ translate("Current Location") }} *</label>
                                 <select name="current_location" class="form-select" required>
                                     <option value="">{{ translate("Select Location") }}</option>
-    ''' + ''.join([f'''
-                                    <option value="{loc.location_code}">{loc.location_name}</option>''' for loc in locations]) + '''
+                                    {% for loc in locations %}
+                                    <option value="{{ loc.location_code }}">{{ loc.location_name }}</option>
+                                    {% endfor %}
                                 </select>
                             </div>
                         </div>
@@ -1387,159 +2279,731 @@ def mobile_interface():
         }
     }
     </script>
-    ''', lang=lang, translate=translate_text)
-    
-    return render_template_string(BASE_TEMPLATE, content=content, scripts='', lang=lang, translate=translate_text)
+{% endblock %}
+'''
 
-# Other routes
-@app.route('/locations')
-def locations():
-    lang = get_current_language()
-    locations = Location.query.all()
-    
-    # Pre-translate common terms
-    code_text = translate_text("Code", lang)
-    stock_text = translate_text("Stock", lang)
-    units_text = translate_text("units", lang)
-    contact_text = translate_text("Contact", lang)
-    phone_text = translate_text("Phone", lang)
-    temp_text = translate_text("Temperature Capability", lang)
-    storage_text = translate_text("Storage Locations", lang)
-    
-    locations_content = f'''
+LOCATIONS_TEMPLATE = '''{% extends "base.html" %}
+{% block content %}
     <div class="row">
         <div class="col-12">
-            <h1 class="mb-4">{storage_text}</h1>
+            <h1 class="mb-4">{{ translate("Storage Locations") }}</h1>
         </div>
     </div>
-    
+
     <div class="row">
-    '''
-    
-    for loc in locations:
-        usage_percent = (loc.current_stock / loc.capacity * 100) if loc.capacity and loc.capacity > 0 else 0
-        progress_bar_class = 'bg-warning' if usage_percent > 80 else 'bg-success'
-        
-        locations_content += f'''
+        {% for loc in location_data %}
         <div class="col-md-4 mb-4">
             <div class="card">
                 <div class="card-body">
-                    <h5 class="card-title">{loc.location_name}</h5>
+                    <h5 class="card-title">{{ loc.location_name }}</h5>
                     <p>
-                        <strong>{code_text}:</strong> {loc.location_code}<br>
-                        <strong>{stock_text}:</strong> {loc.current_stock}/{loc.capacity} {units_text}<br>
-                        <strong>{contact_text}:</strong> {loc.contact_person}<br>
-                        <strong>{phone_text}:</strong> {loc.phone_number}
+                        <strong>{{ translate("Code") }}:</strong> {{ loc.location_code }}<br>
+                        <strong>{{ translate("Stock") }}:</strong> {{ loc.current_stock }}/{{ loc.capacity }} {{ translate("units") }}<br>
+                        <strong>{{ translate("Contact") }}:</strong> {{ loc.contact_person }}<br>
+                        <strong>{{ translate("Phone") }}:</strong> {{ loc.phone_number }}
                     </p>
                     <div class="progress">
-                        <div class="progress-bar {progress_bar_class}" 
-                             style="width: {usage_percent:.1f}%">
-                            {usage_percent:.1f}%
+                        <div class="progress-bar {{ 'bg-warning' if loc.usage_percent > 80 else 'bg-success' }}"
+                             style="width: {{ '%.1f' % loc.usage_percent }}%">
+                            {{ '%.1f' % loc.usage_percent }}%
                         </div>
                     </div>
                     <small class="text-muted mt-2 d-block">
-                        <strong>{temp_text}:</strong> {loc.temperature_capability}
+                        <strong>{{ translate("Temperature Capability") }}:</strong> {{ loc.temperature_capability }}
                     </small>
                 </div>
             </div>
         </div>
-        '''
-    
-    locations_content += '''
+        {% endfor %}
     </div>
-    '''
-    
-    return render_template_string(BASE_TEMPLATE, content=locations_content, scripts='', lang=lang, translate=translate_text)
-@app.route('/transportation')
-def transportation():
-    lang = get_current_language()
-    shipments = Transportation.query.all()
-    transport_html = '<h1>{{ translate("Transportation") }}</h1><div class="card"><div class="card-body"><table class="table"><thead><tr><th>{{ translate("Shipment ID") }}</th><th>{{ translate("From") }}</th><th>{{ translate("To") }}</th><th>{{ translate("Status") }}</th></tr></thead><tbody>' + ''.join([f'<tr><td>{ship.shipment_id}</td><td>{ship.from_location}</td><td>{ship.to_location}</td><td><span class="badge bg-primary">{ship.status}</span></td></tr>' for ship in shipments]) + '</tbody></table></div></div>'
-    content = render_template_string(transport_html, lang=lang, translate=translate_text)
-    return render_template_string(BASE_TEMPLATE, content=content, scripts='', lang=lang, translate=translate_text)
+{% endblock %}
+'''
 
-# API Routes
-@app.route('/api/set_language', methods=['POST'])
-def set_language():
-    """API endpoint to set language preference"""
-    data = request.get_json()
-    language = data.get('language', 'en')
-    
-    if language in ['en', 'my']:
-        session['language'] = language
-        session.permanent = True
-        return jsonify({'success': True, 'language': language})
-    
-    return jsonify({'success': False, 'error': 'Invalid language'})
+TRANSPORTATION_TEMPLATE = '''{% extends "base.html" %}
+{% block content %}<h1>{{ translate("Transportation") }}</h1><div class="card"><div class="card-body"><table class="table"><thead><tr><th>{{ translate("Shipment ID") }}</th><th>{{ translate("From") }}</th><th>{{ translate("To") }}</th><th>{{ translate("Status") }}</th></tr></thead><tbody>{% for ship in shipments %}<tr><td>{{ ship.shipment_id }}</td><td>{{ ship.from_location }}</td><td>{{ ship.to_location }}</td><td><span class="badge bg-primary">{{ ship.status }}</span></td></tr>{% endfor %}</tbody></table></div></div>{% endblock %}
+'''
 
-@app.route('/api/expired_blood_count')
-def expired_blood_count():
-    expired_count = BloodInventory.query.filter(
-        BloodInventory.expiry_date < datetime.now().date()
-    ).count()
-    return jsonify({'expired_count': expired_count})
+PAGE_TEMPLATES = {
+    'base.html': BASE_TEMPLATE,
+    'dashboard.html': DASHBOARD_TEMPLATE,
+    'inventory.html': INVENTORY_TEMPLATE,
+    'expired_blood.html': EXPIRED_BLOOD_TEMPLATE,
+    'reports.html': REPORTS_TEMPLATE,
+    'mobile.html': MOBILE_TEMPLATE,
+    'locations.html': LOCATIONS_TEMPLATE,
+    'transportation.html': TRANSPORTATION_TEMPLATE,
+}
 
-@app.route('/api/dispose_blood/<blood_id>', methods=['POST'])
-def dispose_blood(blood_id):
+# Inventory listing - shared filters and keyset pagination ordered by (expiry_date, id)
+INVENTORY_PAGE_SIZE = 50
+MAX_INVENTORY_PAGE_SIZE = 500
+# Query arguments pagination links carry over from page to page
+INVENTORY_LINK_ARGS = ('blood_type', 'location', 'product_type', 'status', 'expiry_from', 'expiry_to', 'per_page')
+
+def parse_date_arg(value):
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+def filter_inventory(args):
+    """Build a BloodInventory query from the inventory filter arguments"""
+    query = BloodInventory.query
+
+    if args.get('blood_type'):
+        query = query.filter_by(blood_type=args['blood_type'])
+    if args.get('location'):
+        query = query.filter_by(current_location=args['location'])
+    if args.get('product_type'):
+        query = query.filter_by(product_type=args['product_type'])
+    if args.get('status'):
+        query = query.filter_by(status=args['status'])
+    if args.get('expiry_from'):
+        query = query.filter(BloodInventory.expiry_date >= parse_date_arg(args['expiry_from']))
+    if args.get('expiry_to'):
+        query = query.filter(BloodInventory.expiry_date <= parse_date_arg(args['expiry_to']))
+
+    return query
+
+def get_page_size(args):
     try:
-        blood_unit = BloodInventory.query.filter_by(blood_id=blood_id).first()
-        if blood_unit:
-            # Update location stock
-            location = Location.query.filter_by(location_code=blood_unit.current_location).first()
-            if location and location.current_stock > 0:
-                location.current_stock -= 1
-            
-            # Remove the blood unit from inventory
-            db.session.delete(blood_unit)
-            db.session.commit()
-            
-            return jsonify({'success': True, 'message': 'Blood unit disposed successfully'})
-        else:
-            return jsonify({'success': False, 'error': 'Blood unit not found'})
-    
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'success': False, 'error': str(e)})
+        per_page = int(args.get('per_page', INVENTORY_PAGE_SIZE))
+    except ValueError:
+        per_page = INVENTORY_PAGE_SIZE
+    return max(1, min(per_page, MAX_INVENTORY_PAGE_SIZE))
 
-# FIXED: Add missing API endpoint for mobile entry
-@app.route('/api/quick_entry', methods=['POST'])
-def quick_entry():
-    data = request.get_json()
-    
+def encode_cursor(item):
+    return f"{item.expiry_date.strftime('%Y-%m-%d')}_{item.id}"
+
+def decode_cursor(cursor):
     try:
-        blood_id = f"{data['blood_type']}_{data['product_type']}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-        expiry_date = calculate_expiry_date(data['product_type'], data['donation_date'])
-        
-        new_item = BloodInventory(
-            blood_id=blood_id,
-            blood_type=data['blood_type'],
-            product_type=data['product_type'],
-            donation_date=datetime.strptime(data['donation_date'], '%Y-%m-%d').date(),
-            expiry_date=expiry_date,
-            current_location=data['current_location'],
-            temperature_zone=get_temperature_zone(data['product_type'])
-        )
-        
-        db.session.add(new_item)
-        
-        # Update location stock
-        location = Location.query.filter_by(location_code=data['current_location']).first()
-        if location:
-            location.current_stock += 1
-        
-        db.session.commit()
-        
-        # Check if expiring soon and create alert
-        days_remaining = (expiry_date - datetime.now().date()).days
-        if days_remaining <= 7:
-            alert = ExpiryAlert(
-                blood_id=blood_id,
-                alert_type='Expiring',
-                alert_date=datetime.now(),
-                days_remaining=days_remaining
-            )
-            db.session.add(alert)
-            db.session.commit()
+        expiry_date, item_id = cursor.rsplit('_', 1)
+        return parse_date_arg(expiry_date), int(item_id)
+    except ValueError:
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+def paginate_inventory(query, after=None, per_page=INVENTORY_PAGE_SIZE):
+    """Return one page of a filtered inventory query and the cursor for the next
+
+    Seeks past the (expiry_date, id) of the last row seen instead of using
+    OFFSET, so every page costs the same regardless of its position.
+    """
+    if after:
+        query = query.filter(db.tuple_(BloodInventory.expiry_date, BloodInventory.id) > decode_cursor(after))
+
+    items = query.order_by(BloodInventory.expiry_date, BloodInventory.id).limit(per_page + 1).all()
+    next_cursor = encode_cursor(items[per_page - 1]) if len(items) > per_page else None
+    return items[:per_page], next_cursor
+
+# Template registry - every page is parsed and compiled once per language at
+# startup. Translations of string literals are inlined into the template
+# source before compiling, so only dynamic values are rendered per request.
+LANGUAGES = ['en', 'my']
+
+TRANSLATE_LITERAL = re.compile(r"""\{\{\s*translate\(\s*(?:"([^"]*)"|'([^']*)')\s*\)\s*\}\}""")
+
+def inline_translations(source, lang):
+    """Replace {{ translate("literal") }} with the escaped translation"""
+    def replace(match):
+        text = match.group(1) if match.group(1) is not None else match.group(2)
+        translated = str(escape(translate_text(text, lang)))
+        if any(marker in translated for marker in ('{{', '{%', '{#')):
+            return match.group(0)
+        return translated
+    return TRANSLATE_LITERAL.sub(replace, source)
+
+def create_template_registry(templates, cache_dir, lang):
+    """Build a Jinja environment holding the page templates precompiled for one language"""
+    cache_dir = os.path.join(cache_dir, lang)
+    os.makedirs(cache_dir, exist_ok=True)
+    env = app.jinja_env.overlay(
+        loader=DictLoader({name: inline_translations(source, lang) for name, source in templates.items()}),
+        bytecode_cache=FileSystemBytecodeCache(cache_dir),
+        auto_reload=False,
+        autoescape=True
+    )
+    # overlay() shares the parent's globals dict, so give each language its own.
+    # Only values known at render time (e.g. a unit's product type) still go through here
+    env.globals = dict(env.globals, translate=lambda text: translate_text(text, lang), blood_types=BLOOD_TYPES)
+
+    for name in templates:
+        env.get_template(name)
+
+    return env
+
+template_registries = {
+    lang: create_template_registry(PAGE_TEMPLATES, app.config['TEMPLATE_CACHE_DIR'], lang)
+    for lang in LANGUAGES
+}
+
+def render_page(template_name, **context):
+    """Render a precompiled page template in the page's language"""
+    started = time.perf_counter()
+    lang = context.get('lang') or get_current_language()
+    registry = template_registries.get(lang, template_registries['en'])
+    app.update_template_context(context)
+    html = registry.get_template(template_name).render(context)
+    if app.config['METRICS_ENABLED']:
+        metrics.observe('template_render_seconds', (template_name,), time.perf_counter() - started)
+    return html
+
+# Request metrics - per-endpoint latency, SQL and rendering costs, exposed at
+# /metrics in Prometheus text format. SQL statements and fetched rows are
+# counted per thread, so each request sees only its own work.
+metrics = MetricsRegistry(app.config['METRICS_DIR'], app.config['METRICS_FLUSH_INTERVAL'])
+metrics.histogram('http_request_duration_seconds', 'Request latency in seconds',
+                  ('endpoint', 'method', 'status'))
+metrics.histogram('http_response_size_bytes', 'Response body size in bytes', ('endpoint',),
+                  buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304))
+metrics.histogram('db_statements_per_request', 'SQL statements executed per request', ('endpoint',),
+                  buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100))
+metrics.histogram('db_seconds_per_request', 'Time spent executing SQL per request', ('endpoint',))
+metrics.histogram('db_rows_per_request', 'Rows fetched from the database per request', ('endpoint',),
+                  buckets=(0, 1, 10, 100, 1000, 10000, 100000))
+metrics.histogram('template_render_seconds', 'Page template render time in seconds', ('template',))
+
+class RequestMetrics(threading.local):
+    started = 0.0
+    statements = 0
+    sql_seconds = 0.0
+    rows = 0
+
+request_metrics = RequestMetrics()
+
+def before_statement(conn, cursor, statement, parameters, context, executemany):
+    conn.info['statement_started'] = time.perf_counter()
+
+def after_statement(conn, cursor, statement, parameters, context, executemany):
+    request_metrics.statements += 1
+    request_metrics.sql_seconds += time.perf_counter() - conn.info['statement_started']
+
+def count_fetched_row(cursor, row):
+    request_metrics.rows += 1
+    return row
+
+def install_row_counter(dbapi_connection, connection_record):
+    dbapi_connection.row_factory = count_fetched_row
+
+if app.config['METRICS_ENABLED']:
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', before_statement)
+        event.listen(db.engine, 'after_cursor_execute', after_statement)
+        if db.engine.dialect.name == 'sqlite':
+            event.listen(db.engine, 'connect', install_row_counter)
+
+@app.before_request
+def start_request_metrics():
+    if not app.config['METRICS_ENABLED']:
+        return
+    metrics.start_flusher()
+    request_metrics.started = time.perf_counter()
+    request_metrics.statements = 0
+    request_metrics.sql_seconds = 0.0
+    request_metrics.rows = 0
+
+@app.after_request
+def record_request_metrics(response):
+    if not app.config['METRICS_ENABLED']:
+        return response
+    endpoint = request.endpoint or 'unmatched'
+    metrics.observe('http_request_duration_seconds', (endpoint, request.method, response.status_code),
+                    time.perf_counter() - request_metrics.started)
+    metrics.observe('db_statements_per_request', (endpoint,), request_metrics.statements)
+    metrics.observe('db_seconds_per_request', (endpoint,), request_metrics.sql_seconds)
+    metrics.observe('db_rows_per_request', (endpoint,), request_metrics.rows)
+    size = response.calculate_content_length()
+    if size is not None:
+        metrics.observe('http_response_size_bytes', (endpoint,), size)
+    return response
+
+# Query analyzer - opt-in (QUERY_ANALYZER=true) aid for development and
+# staging. Statements run by a request are fingerprinted: a shape repeated
+# N_PLUS_ONE_THRESHOLD times is logged as an N+1 suspect, SELECTs slower than
+# SLOW_QUERY_MS are logged with their query plan, and a request running more
+# statements than its QUERY_BUDGETS entry is logged, or fails outright with
+# QUERY_BUDGET_STRICT so test runs catch the regression.
+class QueryBudgetExceeded(Exception):
+    pass
+
+class QueryLog(threading.local):
+    statements = None
+    last_report = None
+
+query_log = QueryLog()
+query_analyzer_installed = False
+
+@lru_cache(maxsize=2048)
+def fingerprint_sql(statement):
+    """Statement shape with literals and IN-list lengths removed"""
+    shape = re.sub(r"'(?:[^']|'')*'", '?', statement)
+    shape = re.sub(r'\b\d+(?:\.\d+)?\b', '?', shape)
+    shape = re.sub(r'\(\s*\?(?:\s*,\s*\?)*\s*\)', '(?...)', shape)
+    return re.sub(r'\s+', ' ', shape).strip()
+
+def explain_statement(cursor, statement, parameters):
+    """Query plan of a statement, run on a plain cursor of the same connection"""
+    try:
+        plan_cursor = cursor.connection.cursor()
+        rows = plan_cursor.execute('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+        plan_cursor.close()
+    except Exception as e:
+        return [f'(no plan: {e})']
+    return [row[-1] for row in rows]
+
+def start_statement_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info['analyzer_started'] = time.perf_counter()
+
+def log_statement(conn, cursor, statement, parameters, context, executemany):
+    if query_log.statements is None:
+        return
+    elapsed_ms = (time.perf_counter() - conn.info['analyzer_started']) * 1000
+    query_log.statements.append((statement, elapsed_ms))
+    if (elapsed_ms > app.config['SLOW_QUERY_MS'] and not executemany
+            and statement.lstrip().upper().startswith('SELECT')):
+        plan = explain_statement(cursor, statement, parameters)
+        app.logger.warning("Slow query (%.1f ms) in %s: %s\n  plan: %s",
+                           elapsed_ms, request.endpoint if request else None,
+                           fingerprint_sql(statement), '\n        '.join(plan))
+
+def install_query_analyzer():
+    global query_analyzer_installed
+    if query_analyzer_installed:
+        return
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', start_statement_timer)
+        event.listen(db.engine, 'after_cursor_execute', log_statement)
+    query_analyzer_installed = True
+
+if app.config['QUERY_ANALYZER']:
+    install_query_analyzer()
+
+@app.before_request
+def start_query_log():
+    if app.config['QUERY_ANALYZER']:
+        query_log.statements = []
+
+@app.after_request
+def check_query_log(response):
+    statements = query_log.statements
+    if statements is None:
+        return response
+    query_log.statements = None
+
+    endpoint = request.endpoint or 'unmatched'
+    shapes = Counter(fingerprint_sql(statement) for statement, _ in statements)
+    suspects = [(shape, count) for shape, count in shapes.most_common()
+                if count >= app.config['N_PLUS_ONE_THRESHOLD']]
+    for shape, count in suspects:
+        app.logger.warning("Possible N+1 in %s: %d x %s", endpoint, count, shape)
+
+    budget = app.config['QUERY_BUDGETS'].get(endpoint)
+    over_budget = budget is not None and len(statements) > budget
+    query_log.last_report = {
+        'endpoint': endpoint,
+        'statements': len(statements),
+        'sql_ms': sum(elapsed for _, elapsed in statements),
+        'budget': budget,
+        'n_plus_one': suspects
+    }
+    response.headers['X-Query-Count'] = str(len(statements))
+    if over_budget:
+        message = f"{endpoint} ran {len(statements)} SQL statements, budget is {budget}"
+        if app.config['QUERY_BUDGET_STRICT']:
+            raise QueryBudgetExceeded(message)
+        app.logger.error(message)
+    return response
+
+# Routes
+@app.route('/')
+@conditional_get(cache_control='private, no-cache')
+def dashboard():
+    lang = get_current_language()
+
+    return read_cache.get(('dashboard', lang), lambda: render_dashboard(lang))
+
+def render_dashboard(lang):
+    stats = get_cached_inventory_stats()
+
+    location_data = []
+    for loc in get_locations():
+        location_data.append({
+            'location_name': loc['location_name'],
+            'current_stock': loc['current_stock'],
+            'capacity': loc['capacity'],
+            'usage_percent': round(loc['usage_percent'], 1)
+        })
+
+    recent_alerts = ExpiryAlert.query.filter_by(action_taken=False).order_by(ExpiryAlert.alert_date.desc()).limit(5).all()
+    active_transport = Transportation.query.filter(Transportation.status.in_(['Scheduled', 'In Transit'])).count()
+
+    return render_page('dashboard.html',
+                       lang=lang,
+                       total_units=stats.available_units,
+                       expiring_soon=stats.available_expiring_7_days,
+                       active_transport=active_transport,
+                       location_data=location_data,
+                       recent_alerts=recent_alerts)
+
+@app.route('/inventory')
+@conditional_get(cache_control='private, no-cache')
+def inventory():
+    lang = get_current_language()
+
+    try:
+        inventory_items, next_cursor = paginate_inventory(
+            filter_inventory(request.args),
+            after=request.args.get('after'),
+            per_page=get_page_size(request.args)
+        )
+    except ValueError:
+        abort(400)
+    locations = get_locations()
+
+    # Prepare inventory data for template
+    inventory_data = []
+    for item in inventory_items:
+        days_left = (item.expiry_date - datetime.now().date()).days
+
+        if days_left <= 0:
+            status_text = translate_text("Expired", lang)
+            status_class = "bg-dark"
+        elif days_left <= 3:
+            status_text = f"{days_left} {translate_text('days', lang)}"
+            status_class = "bg-danger"
+        elif days_left <= 7:
+            status_text = f"{days_left} {translate_text('days', lang)}"
+            status_class = "bg-warning"
+        else:
+            status_text = f"{days_left} {translate_text('days', lang)}"
+            status_class = "bg-success"
+
+        inventory_data.append({
+            'blood_id': item.blood_id,
+            'blood_type': item.blood_type,
+            'product_type': item.product_type,
+            'location': item.current_location,
+            'expiry_date': item.expiry_date.strftime('%Y-%m-%d'),
+            'status_text': status_text,
+            'status_class': status_class
+        })
+
+    filters = {key: request.args[key] for key in INVENTORY_LINK_ARGS if request.args.get(key)}
+
+    return render_page('inventory.html',
+                       inventory_data=inventory_data,
+                       all_locations=locations,
+                       first_page_url=url_for('inventory', **filters),
+                       next_page_url=url_for('inventory', after=next_cursor, **filters) if next_cursor else None,
+                       lang=lang)
+
+@app.route('/expired-blood')
+@conditional_get(cache_control='private, no-cache')
+def expired_blood():
+    lang = get_current_language()
+
+    expired_blood = BloodInventory.query.filter(
+        BloodInventory.expiry_date < datetime.now().date()
+    )
+    if request.args.get('location'):
+        expired_blood = expired_blood.filter_by(current_location=request.args['location'])
+    if request.args.get('product_type'):
+        expired_blood = expired_blood.filter_by(product_type=request.args['product_type'])
+
+    # Prepare expired blood data for template. Only Available units are
+    # what Dispose All removes; Reserved ones are held for an allocation or
+    # a shipment and listed apart, to be disposed one by one
+    expired_data = []
+    held_data = []
+    for item in expired_blood:
+        days_expired = (datetime.now().date() - item.expiry_date).days
+        (expired_data if item.status == 'Available' else held_data).append({
+            'blood_id': item.blood_id,
+            'blood_type': item.blood_type,
+            'product_type': item.product_type,
+            'location': item.current_location,
+            'donation_date': item.donation_date.strftime('%Y-%m-%d'),
+            'expiry_date': item.expiry_date.strftime('%Y-%m-%d'),
+            'days_expired': days_expired,
+            'status': item.status,
+            'allocation_id': item.allocation_id
+        })
+
+    return render_page('expired_blood.html',
+                       expired_data=expired_data,
+                       expired_count=len(expired_data),
+                       held_data=held_data,
+                       all_locations=get_locations(),
+                       lang=lang)
+
+@app.route('/reports')
+@conditional_get(cache_control='private, no-cache')
+def reports():
+    lang = get_current_language()
+    return read_cache.get(('reports', lang), lambda: render_reports(lang))
+
+def render_reports(lang):
+    stats = get_cached_inventory_stats()
+    total_units = stats.total_units
+
+    # Get blood type distribution
+    blood_type_data = []
+    for blood_type in BLOOD_TYPES:
+        count = stats.by_blood_type.get(blood_type, 0)
+        percentage = (count / total_units * 100) if total_units > 0 else 0
+        blood_type_data.append({
+            'type': blood_type,
+            'count': count,
+            'percentage': percentage
+        })
+
+    shortages = [row for row in get_demand_forecast() if row['shortage_date']]
+
+    return render_page('reports.html',
+                       lang=lang,
+                       total_units=total_units,
+                       expiring_soon=stats.expiring_3_days,
+                       expired_count=stats.expired_units,
+                       wastage_rate=stats.wastage_rate,
+                       blood_type_data=blood_type_data,
+                       location_data=get_locations(),
+                       shortages=shortages[:app.config['REPORT_SHORTAGE_ROWS']],
+                       shortage_count=len(shortages),
+                       forecast_horizon=app.config['FORECAST_HORIZON_DAYS'])
+
+# FIXED: Mobile Entry route with complete functionality
+@app.route('/mobile')
+def mobile_interface():
+    lang = get_current_language()
+
+    return render_page('mobile.html',
+                       lang=lang,
+                       locations=get_locations(),
+                       today=datetime.now().date().strftime('%Y-%m-%d'))
+
+# Other routes
+@app.route('/locations')
+@conditional_get(cache_control='private, no-cache')
+def locations():
+    lang = get_current_language()
+    return read_cache.get(('locations', lang),
+                          lambda: render_page('locations.html', lang=lang, location_data=get_locations()))
+
+@app.route('/transportation')
+def transportation():
+    lang = get_current_language()
+    shipments = Transportation.query.all()
+    return render_page('transportation.html', lang=lang, shipments=shipments)
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Request metrics merged across worker processes, in Prometheus text format"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+# Health checks for load balancers and process supervisors
+@app.route('/healthz')
+def liveness():
+    """The process is up and serving requests"""
+    return jsonify({'status': 'ok', 'pid': os.getpid()})
+
+@app.route('/readyz')
+def readiness():
+    """The worker can take traffic: not draining and the database answers"""
+    if app.config['DRAINING']:
+        return jsonify({'status': 'draining', 'pid': os.getpid()}), 503
+    try:
+        db.session.execute(text('SELECT 1'))
+    except Exception as e:
+        return jsonify({'status': 'unavailable', 'error': str(e)}), 503
+    return jsonify({'status': 'ready', 'pid': os.getpid()})
+
+# API Routes
+@app.route('/api/set_language', methods=['POST'])
+def set_language():
+    """API endpoint to set language preference"""
+    data = request.get_json()
+    language = data.get('language', 'en')
+    
+    if language in LANGUAGES:
+        session['language'] = language
+        session.permanent = True
+        return jsonify({'success': True, 'language': language})
+    
+    return jsonify({'success': False, 'error': 'Invalid language'})
+
+@app.route('/api/expired_blood_count')
+@conditional_get(per_language=False)
+def expired_blood_count():
+    expired_count = read_cache.get('expired_count', lambda: get_expiry_histogram().count_expired(datetime.now().date()))
+    return jsonify({'expired_count': expired_count})
+
+@app.route('/api/forecast')
+@conditional_get(per_language=False)
+def demand_forecast():
+    """Forecast rows, optionally filtered by location, blood_type, product_type or shortages_only"""
+    rows = get_demand_forecast()
+    for field in ('location', 'blood_type', 'product_type'):
+        value = request.args.get(field)
+        if value:
+            rows = [row for row in rows if row[field] == value]
+    if request.args.get('shortages_only', '').lower() in ('1', 'true'):
+        rows = [row for row in rows if row['shortage_date']]
+    return jsonify({
+        'success': True,
+        'history_days': app.config['FORECAST_HISTORY_DAYS'],
+        'horizon_days': app.config['FORECAST_HORIZON_DAYS'],
+        'series': rows
+    })
+
+def usage_counts_select(first_day, location=None):
+    """Event counts per product and type since first_day, including events the consumer has not applied
+
+    A GET never runs the consumers (that would take the write lock on every
+    read); the events past the daily_totals cursor are counted here instead.
+    It is one statement, so a consumer committing mid-read cannot count a
+    batch twice.
+    """
+    cursor = db.select(db.func.coalesce(db.func.max(IdSequence.last_value), 0)).where(
+        IdSequence.name == 'event_consumer:daily_totals'
+    ).scalar_subquery()
+    totals = db.select(
+        InventoryEventTotal.product_type, InventoryEventTotal.event_type, InventoryEventTotal.count
+    ).where(InventoryEventTotal.day > first_day)
+    pending = db.select(
+        InventoryEvent.product_type, InventoryEvent.event_type, db.literal(1).label('count')
+    ).where(InventoryEvent.id > cursor, db.func.date(InventoryEvent.occurred_at) > first_day.isoformat())
+    if location:
+        totals = totals.where(InventoryEventTotal.location == location)
+        pending = pending.where(InventoryEvent.location == location)
+    counts = db.union_all(totals, pending).subquery()
+    return db.select(counts.c.product_type, counts.c.event_type, db.func.sum(counts.c.count)).group_by(
+        counts.c.product_type, counts.c.event_type
+    )
+
+@app.route('/api/usage_stats')
+@conditional_get(per_language=False)
+def usage_stats():
+    """Received, reserved, disposed and expired counts and wastage rate per product over the last days"""
+    try:
+        days = int(request.args.get('days', 30))
+        location = request.args.get('location')
+        first_day = datetime.now().date() - timedelta(days=days)
+
+        products = {}
+        for product_type, event_type, count in db.session.execute(usage_counts_select(first_day, location)):
+            products.setdefault(product_type, dict.fromkeys(EVENT_TYPES, 0))[event_type] = count
+        for counts in products.values():
+            counts['wastage_rate'] = round(counts['expired'] / counts['received'], 4) if counts['received'] else None
+        return jsonify({'success': True, 'days': days, 'location': location, 'products': products})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)})
+
+@app.route('/api/dispose_blood/<blood_id>', methods=['POST'])
+def dispose_blood(blood_id):
+    try:
+        blood_unit = BloodInventory.query.filter_by(blood_id=blood_id).first()
+        if blood_unit:
+            # Move the blood unit to the archive; this also updates location stock
+            record_events('disposed', [blood_unit])
+            units = archive_units([blood_unit.id], status='Disposed')
+            db.session.commit()
+            
+            return jsonify({'success': True, 'message': 'Blood unit disposed successfully'})
+        else:
+            return jsonify({'success': False, 'error': 'Blood unit not found'})
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)})
+
+# Filters /api/dispose_expired accepts; at least one is required, so an
+# empty request cannot dispose every expired unit in the network. Only
+# Available units are disposed: Reserved ones belong to an allocation or a
+# scheduled rebalancing shipment and are disposed one by one, if at all.
+DISPOSAL_FILTERS = ('location', 'product_type', 'blood_type', 'expiry_from', 'expiry_to')
+
+@app.route('/api/dispose_expired', methods=['POST'])
+def dispose_expired():
+    """Dispose every expired Available unit matching the JSON filters in one transaction; returns the manifest"""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'success': False, 'error': 'Expected a JSON object of disposal filters'})
+    filters = {field: data[field] for field in DISPOSAL_FILTERS if data.get(field)}
+    for field, value in filters.items():
+        if not isinstance(value, str):
+            return jsonify({'success': False, 'error': f"'{field}' must be a string"})
+    if not filters:
+        return jsonify({'success': False, 'error': 'Specify a location, product_type, blood_type or expiry date filter'})
+
+    try:
+        query = filter_inventory(filters).filter(
+            BloodInventory.status == 'Available',
+            BloodInventory.expiry_date < datetime.now().date()
+        )
+        ids = [unit_id for (unit_id,) in query.with_entities(BloodInventory.id)]
+        # Expiry is recorded before the units leave the live table, so usage
+        # stats count them as wasted even if no scanner pass saw them
+        record_expired_ids(ids)
+        units = archive_units(ids, status='Disposed')
+        record_events('disposed', units)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)})
+
+    manifest = {}
+    for unit in sorted(units, key=lambda unit: (unit.current_location, unit.expiry_date, unit.blood_id)):
+        manifest.setdefault(unit.current_location, []).append({
+            'blood_id': unit.blood_id,
+            'blood_type': unit.blood_type,
+            'product_type': unit.product_type,
+            'expiry_date': unit.expiry_date.strftime('%Y-%m-%d')
+        })
+    return jsonify({
+        'success': True,
+        'disposed': len(units),
+        'locations': [{'location': location, 'count': len(disposed), 'units': disposed}
+                      for location, disposed in manifest.items()]
+    })
+
+# FIXED: Add missing API endpoint for mobile entry
+@app.route('/api/quick_entry', methods=['POST'])
+def quick_entry():
+    data = request.get_json()
+    
+    try:
+        blood_id = allocate_blood_id(data['blood_type'], data['product_type'])
+        expiry_date = calculate_expiry_date(data['product_type'], data['donation_date'])
+        
+        new_item = BloodInventory(
+            blood_id=blood_id,
+            blood_type=data['blood_type'],
+            product_type=data['product_type'],
+            donation_date=datetime.strptime(data['donation_date'], '%Y-%m-%d').date(),
+            expiry_date=expiry_date,
+            current_location=data['current_location'],
+            temperature_zone=get_temperature_zone(data['product_type'])
+        )
+        
+        db.session.add(new_item)
+        record_events('received', [new_item])
+        
+        # Update location stock
+        adjust_location_stock({data['current_location']: 1})
+        
+        # Check if expiring soon and create alert in the same transaction,
+        # so a scanner pass cannot raise it between the unit and its alert
+        days_remaining = (expiry_date - datetime.now().date()).days
+        threshold = get_alert_threshold(data['product_type'], days_remaining)
+        if threshold is not None:
+            alert = ExpiryAlert(
+                blood_id=blood_id,
+                alert_type='Expiring',
+                alert_date=datetime.now(),
+                days_remaining=days_remaining,
+                threshold_days=threshold
+            )
+            db.session.add(alert)
+        
+        bump_data_version()
+        db.session.commit()
         
         return jsonify({'success': True, 'blood_id': blood_id})
     
@@ -1547,13 +3011,113 @@ def quick_entry():
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)})
 
+@app.route('/api/inventory', methods=['GET'])
+@conditional_get(per_language=False)
+def list_inventory():
+    try:
+        items, next_cursor = paginate_inventory(
+            filter_inventory(request.args),
+            after=request.args.get('after'),
+            per_page=get_page_size(request.args)
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+    return jsonify({
+        'success': True,
+        'items': [item.to_dict() for item in items],
+        'next_cursor': next_cursor
+    })
+
+# Streaming exports - rows are read in server-side chunks and written out
+# as they arrive, so memory stays flat whatever the export size
+EXPORT_CHUNK_SIZE = 1000
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson'
+}
+
+def stream_rows(engine, statement, export_format):
+    """Yield a Core select as CSV or NDJSON, one chunk of rows at a time"""
+    with engine.connect() as conn:
+        result = conn.execution_options(yield_per=EXPORT_CHUNK_SIZE).execute(statement)
+        columns = list(result.keys())
+
+        if export_format == 'csv':
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(columns)
+            for rows in result.partitions():
+                writer.writerows(rows)
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            yield buffer.getvalue()
+        else:
+            for rows in result.partitions():
+                yield ''.join(json.dumps(dict(zip(columns, row)), default=str) + '\n' for row in rows)
+
+def export_response(statement, name):
+    export_format = request.args.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'success': False, 'error': f"Unsupported format: {export_format}"})
+
+    return Response(
+        stream_rows(db.engine, statement, export_format),
+        mimetype=EXPORT_FORMATS[export_format],
+        headers={'Content-Disposition': f'attachment; filename={name}.{export_format}'}
+    )
+
+@app.route('/api/export/inventory')
+@conditional_get(per_language=False)
+def export_inventory():
+    try:
+        query = filter_inventory(request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+    statement = query.order_by(BloodInventory.expiry_date, BloodInventory.id).statement
+    return export_response(statement, 'inventory')
+
+@app.route('/api/export/history')
+@conditional_get(per_language=False)
+def export_history():
+    """Live and archived units, filtered by location, blood_type, product_type or status"""
+    statement = db.select(inventory_history)
+    for field in ('blood_type', 'product_type', 'status'):
+        if request.args.get(field):
+            statement = statement.where(inventory_history.c[field] == request.args[field])
+    if request.args.get('location'):
+        statement = statement.where(inventory_history.c.current_location == request.args['location'])
+    return export_response(statement.order_by(inventory_history.c.donation_date, inventory_history.c.blood_id),
+                           'inventory_history')
+
+@app.route('/api/export/alerts')
+@conditional_get(per_language=False)
+def export_alerts():
+    query = ExpiryAlert.query
+
+    try:
+        if request.args.get('alert_type'):
+            query = query.filter_by(alert_type=request.args['alert_type'])
+        if request.args.get('action_taken'):
+            query = query.filter_by(action_taken=request.args['action_taken'].lower() == 'true')
+        if request.args.get('alert_from'):
+            query = query.filter(ExpiryAlert.alert_date >= parse_date_arg(request.args['alert_from']))
+        if request.args.get('alert_to'):
+            query = query.filter(ExpiryAlert.alert_date < parse_date_arg(request.args['alert_to']) + timedelta(days=1))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+    return export_response(query.order_by(ExpiryAlert.id).statement, 'alerts')
+
 # FIXED: Add missing API endpoint for inventory
 @app.route('/api/inventory', methods=['POST'])
 def add_inventory():
     data = request.get_json()
     
     try:
-        blood_id = f"{data['blood_type']}_{data['product_type']}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        blood_id = allocate_blood_id(data['blood_type'], data['product_type'])
         expiry_date = calculate_expiry_date(data['product_type'], data['donation_date'])
         
         new_item = BloodInventory(
@@ -1567,25 +3131,27 @@ def add_inventory():
         )
         
         db.session.add(new_item)
+        record_events('received', [new_item])
         
         # Update location stock
-        location = Location.query.filter_by(location_code=data['current_location']).first()
-        if location:
-            location.current_stock += 1
-        
-        db.session.commit()
+        adjust_location_stock({data['current_location']: 1})
         
-        # Check if expiring soon and create alert
+        # Check if expiring soon and create alert in the same transaction,
+        # so a scanner pass cannot raise it between the unit and its alert
         days_remaining = (expiry_date - datetime.now().date()).days
-        if days_remaining <= 7:
+        threshold = get_alert_threshold(data['product_type'], days_remaining)
+        if threshold is not None:
             alert = ExpiryAlert(
                 blood_id=blood_id,
                 alert_type='Expiring',
                 alert_date=datetime.now(),
-                days_remaining=days_remaining
+                days_remaining=days_remaining,
+                threshold_days=threshold
             )
             db.session.add(alert)
-            db.session.commit()
+        
+        bump_data_version()
+        db.session.commit()
         
         return jsonify({'success': True, 'blood_id': blood_id})
     
@@ -1593,9 +3159,1121 @@ def add_inventory():
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)})
 
+# Fields every /api/inventory/bulk unit must carry, each as a string
+BULK_UNIT_FIELDS = ('blood_type', 'product_type', 'current_location', 'donation_date')
+
+@app.route('/api/inventory/bulk', methods=['POST'])
+def bulk_add_inventory():
+    """Insert a JSON array of blood units in a single transaction"""
+    data = request.get_json(silent=True)
+    if not isinstance(data, list):
+        return jsonify({'success': False, 'error': 'Expected a JSON array of blood units'})
+
+    now = datetime.now()
+    today = now.date()
+
+    # Expiry and temperature zone only depend on product/donation date, so
+    # each distinct combination is computed once for the whole batch
+    expiry_dates = {}
+    temperature_zones = {}
+
+    valid_units = []
+    results = [None] * len(data)
+
+    for index, unit in enumerate(data):
+        try:
+            # Fields become dict keys and column values below, so anything
+            # but a string (a list, an object, null) fails this row alone
+            for field in BULK_UNIT_FIELDS:
+                if not isinstance(unit[field], str):
+                    raise TypeError(f"'{field}' must be a string")
+            blood_type = unit['blood_type']
+            product_type = unit['product_type']
+            current_location = unit['current_location']
+            donation_date = datetime.strptime(unit['donation_date'], '%Y-%m-%d').date()
+
+            key = (product_type, donation_date)
+            if key not in expiry_dates:
+                expiry_dates[key] = calculate_expiry_date(product_type, donation_date)
+            if product_type not in temperature_zones:
+                temperature_zones[product_type] = get_temperature_zone(product_type)
+        except (KeyError, TypeError, ValueError) as e:
+            results[index] = {'index': index, 'success': False, 'error': str(e)}
+            continue
+
+        valid_units.append((index, {
+            'blood_type': blood_type,
+            'product_type': product_type,
+            'donation_date': donation_date,
+            'expiry_date': expiry_dates[key],
+            'current_location': current_location,
+            'temperature_zone': temperature_zones[product_type],
+            'status': 'Available'
+        }))
+
+    units = []
+    alerts = []
+    stock_deltas = {}
+
+    try:
+        if valid_units:
+            sequences = reserve_blood_ids(len(valid_units))
+
+            for (index, unit), sequence in zip(valid_units, sequences):
+                unit['blood_id'] = format_blood_id(unit['blood_type'], unit['product_type'], sequence, today)
+                units.append(unit)
+                stock_deltas[unit['current_location']] = stock_deltas.get(unit['current_location'], 0) + 1
+
+                days_remaining = (unit['expiry_date'] - today).days
+                threshold = get_alert_threshold(unit['product_type'], days_remaining)
+                if threshold is not None:
+                    alerts.append({
+                        'blood_id': unit['blood_id'],
+                        'alert_type': 'Expiring',
+                        'alert_date': now,
+                        'days_remaining': days_remaining,
+                        'action_taken': False,
+                        'threshold_days': threshold
+                    })
+
+                results[index] = {'index': index, 'success': True, 'blood_id': unit['blood_id']}
+
+            db.session.execute(db.insert(BloodInventory), units)
+        if alerts:
+            db.session.execute(db.insert(ExpiryAlert), alerts)
+        record_events('received', units)
+        adjust_location_stock(stock_deltas)
+        bump_data_version()
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)})
+
+    return jsonify({
+        'success': True,
+        'inserted': len(units),
+        'failed': len(results) - len(units),
+        'results': results
+    })
+
+# FEFO allocation - hospital requests reserve the available units that
+# expire first. Each reservation is one UPDATE ... WHERE id IN (ordered,
+# limited SELECT) RETURNING statement: SQLite runs it under the write lock,
+# so two concurrent requests can never claim the same unit.
+def available_units_query(blood_type, product_type, location=None, compatible=False, today=None):
+    """Select of unexpired Available units a recipient can receive, best match first
+
+    With compatible set, every donor type allowed by the product's rule is
+    included (one IN over the FEFO index) and exact-type units rank first;
+    otherwise only the exact type. Within a rank, earliest expiry first.
+    """
+    if today is None:
+        today = datetime.now().date()
+
+    blood_types = compatible_donor_types(blood_type, product_type) if compatible else [blood_type]
+    query = db.select(BloodInventory).where(
+        BloodInventory.blood_type.in_(blood_types),
+        BloodInventory.product_type == product_type,
+        BloodInventory.status == 'Available',
+        BloodInventory.expiry_date >= today
+    )
+    if location:
+        query = query.where(BloodInventory.current_location == location)
+    if len(blood_types) > 1:
+        query = query.order_by(BloodInventory.blood_type != blood_type)
+    return query.order_by(BloodInventory.expiry_date, BloodInventory.id)
+
+def claim_units(candidates, allocation_id):
+    """Mark the units selected by candidates (an id SELECT) Reserved; returns the claimed rows
+
+    The SELECT already requires status 'Available' and runs inside the
+    UPDATE, so repeating the status test here is unnecessary - and it would
+    lead SQLite to scan the status index instead of looking up the ids.
+    """
+    stmt = db.update(BloodInventory).where(
+        BloodInventory.id.in_(candidates)
+    ).values(status='Reserved', allocation_id=allocation_id).returning(
+        BloodInventory.blood_id,
+        BloodInventory.blood_type,
+        BloodInventory.product_type,
+        BloodInventory.expiry_date,
+        BloodInventory.current_location
+    ).execution_options(synchronize_session=False)
+    return db.session.execute(stmt).all()
+
+def reserve_fefo_units(blood_type, product_type, quantity, allocation_id, location=None, compatible=False):
+    """Mark up to quantity units Reserved, best match first; returns the claimed rows"""
+    candidates = available_units_query(blood_type, product_type, location, compatible)
+    return claim_units(candidates.with_only_columns(BloodInventory.id).limit(quantity), allocation_id)
+
+allocation_lock = threading.Lock()
+
+@app.route('/api/compatible_units')
+def compatible_units():
+    """Available units a recipient can receive: exact type first, then soonest expiry"""
+    blood_type = request.args.get('blood_type', '')
+    product_type = request.args.get('product_type', '')
+    if blood_type not in BLOOD_TYPE_BITS:
+        return jsonify({'success': False, 'error': f'Unknown blood type: {blood_type}'})
+    try:
+        limit = min(int(request.args.get('limit', INVENTORY_PAGE_SIZE)), MAX_INVENTORY_PAGE_SIZE)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)})
+    location = request.args.get('location') or None
+
+    query = available_units_query(blood_type, product_type, location, compatible=True)
+    units = db.session.scalars(query.limit(limit)).all()
+    counts = dict(db.session.execute(
+        query.order_by(None).with_only_columns(BloodInventory.blood_type, db.func.count())
+        .group_by(BloodInventory.blood_type)
+    ).all())
+
+    donor_types = compatible_donor_types(blood_type, product_type)
+    return jsonify({
+        'success': True,
+        'recipient': blood_type,
+        'product_type': product_type,
+        'compatible_types': donor_types,
+        'available_by_type': {donor: counts.get(donor, 0) for donor in donor_types},
+        'units': [dict(unit.to_dict(), exact_match=unit.blood_type == blood_type) for unit in units]
+    })
+
+@app.route('/api/allocate', methods=['POST'])
+def allocate_blood():
+    """Reserve units for a hospital request, first-expired-first-out
+
+    Units at the preferred location are taken first, then the rest from any
+    location. With allow_compatible, other donor types the recipient can
+    receive are used once the exact type runs out. Unless allow_partial is
+    set, a request that cannot be filled in full reserves nothing.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        blood_type = data['blood_type']
+        product_type = data['product_type']
+        quantity = int(data.get('quantity', 1))
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({'success': False, 'error': f'Invalid request: {e}'})
+    if not 1 <= quantity <= app.config['MAX_ALLOCATION_QUANTITY']:
+        return jsonify({'success': False,
+                        'error': f"quantity must be between 1 and {app.config['MAX_ALLOCATION_QUANTITY']}"})
+    location = data.get('location')
+    allow_partial = bool(data.get('allow_partial', False))
+    compatible = bool(data.get('allow_compatible', False))
+    if blood_type not in BLOOD_TYPE_BITS:
+        return jsonify({'success': False, 'error': f'Unknown blood type: {blood_type}'})
+
+    try:
+        # Threads of this process queue here instead of in SQLite's busy
+        # handler, whose sleep-and-retry backoff gives long tails in bursts
+        with allocation_lock:
+            allocation_id = f"ALLOC_{datetime.now().strftime('%Y%m%d')}_{reserve_sequence('allocation')[0]:08d}"
+            units = []
+            if location:
+                units += reserve_fefo_units(blood_type, product_type, quantity, allocation_id,
+                                           location, compatible)
+            if len(units) < quantity:
+                units += reserve_fefo_units(blood_type, product_type, quantity - len(units), allocation_id,
+                                           compatible=compatible)
+
+            if not units or (len(units) < quantity and not allow_partial):
+                db.session.rollback()
+                return jsonify({'success': False,
+                                'error': f'Only {len(units)} of {quantity} units available',
+                                'available': len(units)})
+
+            record_events('reserved', units, reference=allocation_id, status='Available')
+            bump_data_version()
+            db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)})
+
+    units.sort(key=lambda unit: (unit.blood_type != blood_type, unit.expiry_date, unit.blood_id))
+    return jsonify({
+        'success': True,
+        'allocation_id': allocation_id,
+        'requested': quantity,
+        'allocated': len(units),
+        'units': [{
+            'blood_id': unit.blood_id,
+            'blood_type': unit.blood_type,
+            'expiry_date': unit.expiry_date.strftime('%Y-%m-%d'),
+            'location': unit.current_location
+        } for unit in units]
+    })
+
+# Rebalancing - near-expiry units held above a location's share of network
+# stock are shipped to locations below theirs. A location's share of each
+# (blood type, product) follows its capacity among the locations that have
+# the product's temperature zone. Surplus and shortfall are matched as a
+# min-cost flow: intra-region lanes cost less than inter-region ones and no
+# destination receives more than its free capacity. Lanes run through one
+# hub per region and commodity, so the network grows linearly with the
+# number of locations instead of quadratically. Planning works on counts
+# only; units are picked when the shipments are written.
+def location_region(location_code):
+    return location_code.split('_', 1)[0]
+
+def at_risk_window(product_type, today):
+    """Expiry dates of units worth moving: inside the widest alert window, not too close to expiry"""
+    earliest = today + timedelta(days=app.config['REBALANCE_MIN_DAYS_REMAINING'])
+    return earliest, today + timedelta(days=get_alert_thresholds(product_type)[-1])
+
+def plan_rebalancing(today=None):
+    """Shipments that move at-risk surplus units to under-stocked locations
+
+    Returns a list of {'from_location', 'to_location', 'items'} where each
+    item is {'blood_type', 'product_type', 'quantity'}; nothing is written.
+    """
+    if today is None:
+        today = datetime.now().date()
+    lane_costs = app.config['REBALANCE_LANE_COSTS']
+
+    locations = db.session.query(Location.location_code, Location.capacity,
+                                 Location.current_stock, Location.temperature_capability).all()
+    current_data_version()
+    stock = get_expiry_histogram().totals(('location', 'blood_type', 'product_type'),
+                                          start=today, status='Available')
+
+    # Units on scheduled or moving shipments count toward their destination's
+    # stock and capacity; they left the source's Available stock when reserved
+    inbound = {}
+    for location, blood_type, product_type, count in db.session.execute(
+        db.select(Transportation.to_location, BloodInventory.blood_type,
+                  BloodInventory.product_type, db.func.count())
+        .join(Transportation, Transportation.shipment_id == BloodInventory.allocation_id)
+        .where(BloodInventory.status == 'Reserved',
+               BloodInventory.expiry_date >= today,
+               Transportation.status.in_(['Scheduled', 'In Transit']))
+        .group_by(Transportation.to_location, BloodInventory.blood_type, BloodInventory.product_type)
+    ):
+        stock[(location, blood_type, product_type)] = stock.get((location, blood_type, product_type), 0) + count
+        inbound[location] = inbound.get(location, 0) + count
+
+    # blood_type IN (every type) lets each product's range use the FEFO index
+    at_risk = {}
+    for product_type in sorted({product for _, _, product in stock}):
+        earliest, latest = at_risk_window(product_type, today)
+        for location, blood_type, count in db.session.execute(
+            db.select(BloodInventory.current_location, BloodInventory.blood_type, db.func.count())
+            .where(BloodInventory.blood_type.in_(BLOOD_TYPES),
+                   BloodInventory.product_type == product_type,
+                   BloodInventory.status == 'Available',
+                   BloodInventory.expiry_date.between(earliest, latest))
+            .group_by(BloodInventory.current_location, BloodInventory.blood_type)
+        ):
+            at_risk[(location, blood_type, product_type)] = count
+
+    network = MinCostFlow()
+    source, sink = network.add_node(), network.add_node()
+    surplus_nodes, shortfall_nodes, location_nodes = {}, {}, {}
+
+    for blood_type, product_type in sorted({(blood_type, product) for _, blood_type, product in at_risk}):
+        zone = get_temperature_zone(product_type)
+        capacity = {code: capacity for code, capacity, _, temperatures in locations
+                    if capacity and zone in (temperatures or '')}
+        total_capacity = sum(capacity.values())
+        total_stock = sum(stock.get((code, blood_type, product_type), 0) for code, _, _, _ in locations)
+
+        surplus, shortfall = {}, {}
+        for code, _, _, _ in locations:
+            share = total_stock * capacity.get(code, 0) / total_capacity if total_capacity else 0
+            held = stock.get((code, blood_type, product_type), 0)
+            movable = min(at_risk.get((code, blood_type, product_type), 0), held - math.ceil(share))
+            if movable > 0:
+                surplus[code] = movable
+            elif code in capacity and math.floor(share) > held:
+                shortfall[code] = math.floor(share) - held
+        if not surplus or not shortfall:
+            continue
+
+        hubs = {region: network.add_node()
+                for region in {location_region(code) for code in list(surplus) + list(shortfall)}}
+        outgoing = {}
+        for code, movable in surplus.items():
+            node = network.add_node()
+            surplus_nodes[node] = (code, blood_type, product_type)
+            network.add_edge(source, node, movable, 0)
+            network.add_edge(node, hubs[location_region(code)], movable, 0)
+            outgoing[location_region(code)] = outgoing.get(location_region(code), 0) + movable
+        for code, needed in shortfall.items():
+            node = network.add_node()
+            shortfall_nodes[node] = code
+            if code not in location_nodes:
+                location_nodes[code] = network.add_node()
+            network.add_edge(hubs[location_region(code)], node, needed, lane_costs['same_region'])
+            network.add_edge(node, location_nodes[code], needed, 0)
+        for origin, movable in outgoing.items():
+            for region in {location_region(code) for code in shortfall} - {origin}:
+                network.add_edge(hubs[origin], hubs[region], movable,
+                                 lane_costs['other_region'] - lane_costs['same_region'])
+
+    for code, capacity, current_stock, _ in locations:
+        if code in location_nodes:
+            free = capacity - (current_stock or 0) - inbound.get(code, 0)
+            network.add_edge(location_nodes[code], sink, max(free, 0), 0)
+
+    network.solve(source, sink)
+
+    lanes = {}
+    for path, amount in network.paths(source, sink):
+        from_location, blood_type, product_type = surplus_nodes[path[1]]
+        items = lanes.setdefault((from_location, shortfall_nodes[path[-3]]), {})
+        items[(blood_type, product_type)] = items.get((blood_type, product_type), 0) + amount
+
+    return [{
+        'from_location': from_location,
+        'to_location': to_location,
+        'items': [{'blood_type': blood_type, 'product_type': product_type, 'quantity': quantity}
+                  for (blood_type, product_type), quantity in sorted(items.items())]
+    } for (from_location, to_location), items in sorted(lanes.items())]
+
+def schedule_rebalancing(plan, departure=None, today=None):
+    """Write a plan as Scheduled shipments, each one's units Reserved under its shipment id
+
+    Each item claims the at-risk units with the latest expiry at the source,
+    leaving the earliest there to be used first-expired-first-out. Units
+    taken by an allocation since planning are skipped, and shipments left
+    with no units are not written. Returns the written shipments.
+    """
+    if today is None:
+        today = datetime.now().date()
+    if departure is None:
+        departure = datetime.now() + timedelta(hours=app.config['REBALANCE_DEPARTURE_HOURS'])
+    if not plan:
+        return []
+
+    sequences = reserve_sequence('shipment', len(plan))
+    shipments = []
+    for sequence, lane in zip(sequences, plan):
+        shipment_id = f"SHP_REB_{departure.strftime('%Y%m%d')}_{sequence:06d}"
+        units = []
+        for item in lane['items']:
+            earliest, latest = at_risk_window(item['product_type'], today)
+            # product_type || '' keeps SQLite off the FEFO index, which
+            # would scan the product's units at every location
+            candidates = db.select(BloodInventory.id).where(
+                BloodInventory.blood_type == item['blood_type'],
+                BloodInventory.current_location == lane['from_location'],
+                BloodInventory.product_type.concat('') == item['product_type'],
+                BloodInventory.status == 'Available',
+                BloodInventory.expiry_date.between(earliest, latest)
+            ).order_by(BloodInventory.expiry_date.desc(), BloodInventory.id.desc()).limit(item['quantity'])
+            units += claim_units(candidates, shipment_id)
+        if not units:
+            continue
+        record_events('reserved', units, reference=shipment_id, status='Available')
+        db.session.add(Transportation(
+            shipment_id=shipment_id,
+            from_location=lane['from_location'],
+            to_location=lane['to_location'],
+            scheduled_departure=departure,
+            status='Scheduled'
+        ))
+        shipments.append({'shipment_id': shipment_id, 'from_location': lane['from_location'],
+                          'to_location': lane['to_location'], 'units': units})
+
+    bump_data_version()
+    db.session.commit()
+    return shipments
+
+@app.route('/api/rebalance', methods=['POST'])
+def rebalance_stock():
+    """Plan near-expiry rebalancing shipments; writes them unless dry_run is set"""
+    data = request.get_json(silent=True)
+    if data is None:
+        data = {}
+    if not isinstance(data, dict):
+        return jsonify({'success': False, 'error': 'Expected a JSON object'}), 400
+    dry_run = bool(data.get('dry_run', False))
+
+    try:
+        started = time.perf_counter()
+        plan = plan_rebalancing()
+        planning_ms = (time.perf_counter() - started) * 1000
+        if dry_run:
+            shipments = [dict(lane, shipment_id=None, quantity=sum(item['quantity'] for item in lane['items']))
+                         for lane in plan]
+        else:
+            with allocation_lock:
+                written = schedule_rebalancing(plan)
+            shipments = [{
+                'shipment_id': shipment['shipment_id'],
+                'from_location': shipment['from_location'],
+                'to_location': shipment['to_location'],
+                'quantity': len(shipment['units']),
+                'blood_ids': [unit.blood_id for unit in shipment['units']]
+            } for shipment in written]
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)})
+
+    return jsonify({
+        'success': True,
+        'dry_run': dry_run,
+        'planning_ms': round(planning_ms, 1),
+        'units': sum(shipment['quantity'] for shipment in shipments),
+        'shipments': shipments
+    })
+
+def adjust_location_stock(stock_deltas):
+    """Apply {location_code: delta} to Location.current_stock in one statement
+
+    The arithmetic happens in SQL, so concurrent writers cannot lose each
+    other's updates, and stock never goes below zero.
+    """
+    if not stock_deltas:
+        return
+    location_table = Location.__table__
+    db.session.execute(
+        db.update(location_table)
+        .where(location_table.c.location_code == db.bindparam('code'))
+        .values(current_stock=db.func.max(location_table.c.current_stock + db.bindparam('delta'), 0)),
+        [{'code': code, 'delta': delta} for code, delta in stock_deltas.items()]
+    )
+
+def reconcile_location_stock(fix=False):
+    """Compare every Location.current_stock with its BloodInventory count
+
+    Returns the locations that drifted; with fix=True their counters are
+    reset to the counted values in the same transaction.
+    """
+    counted = dict(db.session.query(
+        BloodInventory.current_location, db.func.count()
+    ).group_by(BloodInventory.current_location).all())
+
+    drift = []
+    for location_code, current_stock in db.session.query(Location.location_code, Location.current_stock):
+        actual = counted.get(location_code, 0)
+        if (current_stock or 0) != actual:
+            drift.append({
+                'location_code': location_code,
+                'recorded': current_stock,
+                'actual': actual,
+                'drift': (current_stock or 0) - actual
+            })
+
+    if fix and drift:
+        location_table = Location.__table__
+        db.session.execute(
+            db.update(location_table)
+            .where(location_table.c.location_code == db.bindparam('code'))
+            .values(current_stock=db.bindparam('actual')),
+            [{'code': row['location_code'], 'actual': row['actual']} for row in drift]
+        )
+        bump_data_version()
+        db.session.commit()
+
+    return drift
+
+# Archiver - BloodInventory only holds live stock. Units in a terminal
+# status, and reservations older than ARCHIVE_RESERVED_AFTER_DAYS (issued by
+# then), are moved to blood_inventory_archive in batches, so hot queries and
+# the expiry histogram scale with live stock rather than lifetime volume.
+# Units on a rebalancing shipment stay live whatever their age.
+ARCHIVE_STATUSES = ('Used', 'Issued', 'Disposed', 'Expired')
+ARCHIVE_ID_CHUNK = 10000
+
+def archive_units(ids, status=None):
+    """Move units from BloodInventory to the archive in the caller's transaction
+
+    status, if given, replaces the units' status in the archive. Location
+    stock and the data version change with the move. Returns the removed
+    rows as they were in the hot table, for the caller's events.
+    """
+    if not ids:
+        return []
+    hot = BloodInventory.__table__
+    archived = hot.c.status if status is None else db.literal(status)
+    now = datetime.now()
+    units = []
+    # Chunked to stay well inside SQLite's limit on bound parameters
+    for start in range(0, len(ids), ARCHIVE_ID_CHUNK):
+        chunk = ids[start:start + ARCHIVE_ID_CHUNK]
+        db.session.execute(db.insert(ArchivedBloodInventory).from_select(
+            UNIT_COLUMNS + ['archived_at'],
+            db.select(*(archived if name == 'status' else hot.c[name] for name in UNIT_COLUMNS),
+                      db.literal(now, db.DateTime))
+            .where(hot.c.id.in_(chunk))
+        ))
+        units += db.session.execute(
+            db.delete(hot).where(hot.c.id.in_(chunk)).returning(
+                hot.c.blood_id, hot.c.blood_type, hot.c.product_type, hot.c.expiry_date,
+                hot.c.status, hot.c.current_location
+            )
+        ).all()
+    adjust_location_stock({location: -count for location, count in
+                           Counter(unit.current_location for unit in units).items()})
+    bump_data_version()
+    return units
+
+def terminal_units_query():
+    return db.select(BloodInventory.id).where(BloodInventory.status.in_(ARCHIVE_STATUSES))
+
+def issued_units_query(now=None):
+    """Reserved units whose reservation event is older than ARCHIVE_RESERVED_AFTER_DAYS"""
+    if now is None:
+        now = datetime.now()
+    cutoff = now - timedelta(days=app.config['ARCHIVE_RESERVED_AFTER_DAYS'])
+    return db.select(BloodInventory.id).join(
+        InventoryEvent,
+        db.and_(InventoryEvent.blood_id == BloodInventory.blood_id,
+                InventoryEvent.event_type == 'reserved',
+                InventoryEvent.reference == BloodInventory.allocation_id)
+    ).where(
+        BloodInventory.status == 'Reserved',
+        InventoryEvent.occurred_at < cutoff,
+        ~db.exists().where(Transportation.shipment_id == BloodInventory.allocation_id)
+    )
+
+def archive_terminal_units(batch_size=None):
+    """Archive every terminal unit, one committed batch at a time; returns how many moved"""
+    if batch_size is None:
+        batch_size = app.config['ARCHIVE_BATCH_SIZE']
+    moved = 0
+    for candidates, status, event_type in ((terminal_units_query(), None, 'archived'),
+                                           (issued_units_query(), 'Issued', 'issued')):
+        while True:
+            ids = db.session.scalars(candidates.limit(batch_size)).all()
+            if not ids:
+                db.session.rollback()
+                break
+            units = archive_units(ids, status=status)
+            record_events(event_type, units)
+            db.session.commit()
+            moved += len(units)
+    return moved
+
+# Expiry scanner - raises ExpiryAlert rows as units cross their product's
+# alert thresholds. Each (product type, threshold) band is one index-backed
+# range read feeding an INSERT OR IGNORE, so re-running it never duplicates
+# an alert: the unique (blood_id, threshold_days) index absorbs repeats.
+def scan_expiring_units(today=None):
+    """Create any missing threshold alerts and return how many were created"""
+    if today is None:
+        today = datetime.now().date()
+    now = datetime.now()
+
+    configured = app.config['EXPIRY_ALERT_THRESHOLDS']
+    bands = [(BloodInventory.product_type == product_type, get_alert_thresholds(product_type))
+             for product_type in configured]
+    bands.append((BloodInventory.product_type.notin_(list(configured)),
+                  sorted(app.config['DEFAULT_EXPIRY_ALERT_THRESHOLDS'])))
+
+    days_remaining = db.cast(
+        db.func.julianday(BloodInventory.expiry_date) - db.func.julianday(today.strftime('%Y-%m-%d')),
+        db.Integer
+    )
+    created = 0
+
+    for product_filter, thresholds in bands:
+        lower = today
+        for threshold in thresholds:
+            upper = today + timedelta(days=threshold)
+            crossing = db.select(
+                BloodInventory.blood_id,
+                db.literal('Expiring'),
+                db.literal(now, db.DateTime),
+                days_remaining,
+                db.literal(False),
+                db.literal(threshold)
+            ).where(
+                BloodInventory.status == 'Available',
+                product_filter,
+                BloodInventory.expiry_date.between(lower, upper)
+            )
+            result = db.session.execute(
+                db.insert(ExpiryAlert).prefix_with('OR IGNORE').from_select(
+                    ['blood_id', 'alert_type', 'alert_date', 'days_remaining', 'action_taken', 'threshold_days'],
+                    crossing
+                )
+            )
+            if result.rowcount:
+                bump_data_version()
+            db.session.commit()
+            created += result.rowcount
+            lower = upper + timedelta(days=1)
+
+    return created
+
+def expired_events_select(first_day, last_day):
+    """Available units that expired between the two dates, as InventoryEvent insert rows"""
+    return db.select(
+        db.literal('expired'),
+        BloodInventory.blood_id,
+        BloodInventory.blood_type,
+        BloodInventory.product_type,
+        BloodInventory.current_location,
+        BloodInventory.expiry_date,
+        BloodInventory.status,
+        # a unit is usable through its expiry date, so it expires at the
+        # start of the next day
+        db.func.datetime(BloodInventory.expiry_date, '+1 day')
+    ).where(
+        BloodInventory.status == 'Available',
+        BloodInventory.expiry_date.between(first_day, last_day)
+    )
+
+EXPIRED_EVENT_COLUMNS = ['event_type', 'blood_id', 'blood_type', 'product_type', 'location',
+                         'expiry_date', 'status', 'occurred_at']
+
+def record_expired_units(today=None, lookback_days=None):
+    """Append an 'expired' event for units that expired in the lookback window
+
+    INSERT OR IGNORE against the unique expired-event index makes repeat
+    runs no-ops, so the scanner can simply run it every pass.
+    """
+    if today is None:
+        today = datetime.now().date()
+    if lookback_days is None:
+        lookback_days = app.config['EXPIRED_EVENT_LOOKBACK_DAYS']
+    first_day = today - timedelta(days=lookback_days)
+    result = db.session.execute(
+        db.insert(InventoryEvent).prefix_with('OR IGNORE').from_select(
+            EXPIRED_EVENT_COLUMNS, expired_events_select(first_day, today - timedelta(days=1))
+        )
+    )
+    # New events change /api/usage_stats, whose ETag follows the data version
+    if result.rowcount:
+        bump_data_version()
+    db.session.commit()
+    return result.rowcount
+
+def record_expired_ids(ids):
+    """Append the 'expired' event for expired Available units by id, in the caller's transaction
+
+    For units about to leave BloodInventory, which record_expired_units
+    would never see again; units it already recorded are skipped.
+    """
+    expired = expired_events_select(datetime.min.date(), datetime.now().date() - timedelta(days=1))
+    for start in range(0, len(ids), ARCHIVE_ID_CHUNK):
+        db.session.execute(
+            db.insert(InventoryEvent).prefix_with('OR IGNORE').from_select(
+                EXPIRED_EVENT_COLUMNS, expired.where(BloodInventory.id.in_(ids[start:start + ARCHIVE_ID_CHUNK]))
+            )
+        )
+
+def start_expiry_scanner(interval):
+    """Run scan_expiring_units every interval seconds on a daemon thread"""
+    def run():
+        while True:
+            with app.app_context():
+                try:
+                    created = scan_expiring_units()
+                    if created:
+                        app.logger.info("Expiry scanner created %d alerts", created)
+                    expired = record_expired_units()
+                    if expired:
+                        app.logger.info("Expiry scanner recorded %d expired units", expired)
+                    run_event_consumers()
+                    archived = archive_terminal_units()
+                    if archived:
+                        app.logger.info("Archiver moved %d units", archived)
+                except Exception:
+                    db.session.rollback()
+                    app.logger.exception("Expiry scan failed")
+            time.sleep(interval)
+
+    thread = threading.Thread(target=run, name='expiry-scanner', daemon=True)
+    thread.start()
+    return thread
+
+# Schema migrations for existing blood_supply.db files. The applied version
+# is tracked in SQLite's PRAGMA user_version. db.create_all() runs first and
+# only creates missing tables, so each migration is the frozen DDL its
+# version needed on top of the tables that existed then - never derived from
+# today's models, whose indexes may use columns a later migration adds. Every
+# statement is idempotent, because fresh databases run the whole chain too.
+def add_missing_column(conn, table_name, column_name, column_type):
+    existing = {row[1] for row in conn.exec_driver_sql(f'PRAGMA table_info({table_name})')}
+    if column_name not in existing:
+        conn.exec_driver_sql(f'ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type}')
+
+def run_ddl(*statements):
+    def migrate(conn):
+        for statement in statements:
+            conn.exec_driver_sql(statement)
+    return migrate
+
+def migrate_alert_thresholds(conn):
+    add_missing_column(conn, 'expiry_alert', 'threshold_days', 'INTEGER')
+    conn.exec_driver_sql('CREATE UNIQUE INDEX IF NOT EXISTS ux_expiry_alert_unit_threshold '
+                         'ON expiry_alert (blood_id, threshold_days)')
+
+def migrate_fefo_allocation(conn):
+    add_missing_column(conn, 'blood_inventory', 'allocation_id', 'VARCHAR(50)')
+    conn.exec_driver_sql('CREATE INDEX IF NOT EXISTS ix_blood_inventory_fefo '
+                         'ON blood_inventory (blood_type, product_type, status, expiry_date)')
+
+def migrate_inventory_events(conn):
+    """Start the event log from current state: received for every unit, expired for lapsed ones"""
+    run_ddl(
+        'CREATE INDEX IF NOT EXISTS ix_inventory_event_blood_id ON inventory_event (blood_id)',
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_inventory_event_expired ON inventory_event (blood_id) "
+        "WHERE event_type = 'expired'",
+        'CREATE UNIQUE INDEX IF NOT EXISTS ux_inventory_event_total_key '
+        'ON inventory_event_total (day, event_type, location, blood_type, product_type)',
+    )(conn)
+    conn.execute(text(
+        "INSERT INTO inventory_event (event_type, blood_id, blood_type, product_type, location, expiry_date, "
+        "occurred_at) "
+        "SELECT 'received', blood_id, blood_type, product_type, current_location, expiry_date, "
+        "datetime(donation_date) FROM blood_inventory ORDER BY donation_date, id"
+    ))
+    conn.execute(text(
+        "INSERT OR IGNORE INTO inventory_event (event_type, blood_id, blood_type, product_type, location, "
+        "expiry_date, occurred_at) "
+        "SELECT 'expired', blood_id, blood_type, product_type, current_location, expiry_date, "
+        "datetime(expiry_date, '+1 day') FROM blood_inventory "
+        "WHERE status = 'Available' AND expiry_date < :today"
+    ), {'today': datetime.now().date().isoformat()})
+
+def migrate_inventory_archive(conn):
+    """Create the archive indexes and history view; date open reservations from now"""
+    run_ddl(
+        'CREATE INDEX IF NOT EXISTS ix_blood_inventory_archive_location_expiry '
+        'ON blood_inventory_archive (current_location, expiry_date)',
+        'CREATE INDEX IF NOT EXISTS ix_blood_inventory_archive_archived_at ON blood_inventory_archive (archived_at)',
+        'CREATE VIEW IF NOT EXISTS blood_inventory_history AS '
+        'SELECT id, blood_id, blood_type, product_type, donation_date, expiry_date, current_location, '
+        'temperature_zone, status, allocation_id, NULL AS archived_at FROM blood_inventory '
+        'UNION ALL '
+        'SELECT id, blood_id, blood_type, product_type, donation_date, expiry_date, current_location, '
+        'temperature_zone, status, allocation_id, archived_at FROM blood_inventory_archive',
+    )(conn)
+    # The archiver ages reservations by their reserved event, which units
+    # reserved before the event log do not have
+    conn.execute(text(
+        "INSERT INTO inventory_event (event_type, blood_id, blood_type, product_type, location, expiry_date, "
+        "reference, occurred_at) "
+        "SELECT 'reserved', blood_id, blood_type, product_type, current_location, expiry_date, allocation_id, "
+        ":now FROM blood_inventory AS unit WHERE status = 'Reserved' AND NOT EXISTS ("
+        "SELECT 1 FROM inventory_event WHERE inventory_event.blood_id = unit.blood_id "
+        "AND inventory_event.event_type = 'reserved')"
+    ), {'now': datetime.now().isoformat(' ')})
+
+def migrate_archive_key(conn):
+    """Rebuild the archive with its own id, and the history view without ids"""
+    run_ddl(
+        'DROP VIEW IF EXISTS blood_inventory_history',
+        'CREATE TABLE blood_inventory_archive_new (id INTEGER NOT NULL, blood_id VARCHAR(50) NOT NULL, '
+        'blood_type VARCHAR(10) NOT NULL, product_type VARCHAR(20) NOT NULL, donation_date DATE NOT NULL, '
+        'expiry_date DATE NOT NULL, current_location VARCHAR(50) NOT NULL, temperature_zone VARCHAR(20) NOT NULL, '
+        'status VARCHAR(20) NOT NULL, allocation_id VARCHAR(50), archived_at DATETIME NOT NULL, '
+        'PRIMARY KEY (id), UNIQUE (blood_id))',
+        'INSERT INTO blood_inventory_archive_new (blood_id, blood_type, product_type, donation_date, expiry_date, '
+        'current_location, temperature_zone, status, allocation_id, archived_at) '
+        'SELECT blood_id, blood_type, product_type, donation_date, expiry_date, current_location, '
+        'temperature_zone, status, allocation_id, archived_at FROM blood_inventory_archive ORDER BY archived_at, id',
+        'DROP TABLE blood_inventory_archive',
+        'ALTER TABLE blood_inventory_archive_new RENAME TO blood_inventory_archive',
+        'CREATE INDEX ix_blood_inventory_archive_location_expiry '
+        'ON blood_inventory_archive (current_location, expiry_date)',
+        'CREATE INDEX ix_blood_inventory_archive_archived_at ON blood_inventory_archive (archived_at)',
+        'CREATE VIEW blood_inventory_history AS '
+        'SELECT blood_id, blood_type, product_type, donation_date, expiry_date, current_location, '
+        'temperature_zone, status, allocation_id, NULL AS archived_at FROM blood_inventory '
+        'UNION ALL '
+        'SELECT blood_id, blood_type, product_type, donation_date, expiry_date, current_location, '
+        'temperature_zone, status, allocation_id, archived_at FROM blood_inventory_archive',
+    )(conn)
+
+def migrate_event_status(conn):
+    # Events before this have no status; the histogram never replays them,
+    # as it loads from the tables after an upgrade
+    add_missing_column(conn, 'inventory_event', 'status', 'VARCHAR(20)')
+
+MIGRATIONS = [
+    (1, 'add indexes for inventory, alert and shipment filters', run_ddl(
+        'CREATE INDEX IF NOT EXISTS ix_blood_inventory_status_expiry ON blood_inventory (status, expiry_date)',
+        'CREATE INDEX IF NOT EXISTS ix_blood_inventory_type_location_expiry '
+        'ON blood_inventory (blood_type, current_location, expiry_date)',
+        'CREATE INDEX IF NOT EXISTS ix_blood_inventory_location_expiry '
+        'ON blood_inventory (current_location, expiry_date)',
+        'CREATE INDEX IF NOT EXISTS ix_blood_inventory_expiry ON blood_inventory (expiry_date)',
+        'CREATE INDEX IF NOT EXISTS ix_transportation_status ON transportation (status)',
+        'CREATE INDEX IF NOT EXISTS ix_expiry_alert_action_date ON expiry_alert (action_taken, alert_date)',
+    )),
+    (2, 'add ExpiryAlert.threshold_days for the expiry scanner', migrate_alert_thresholds),
+    (3, 'add BloodInventory.allocation_id and the FEFO allocation index', migrate_fefo_allocation),
+    (4, 'backfill the inventory event log', migrate_inventory_events),
+    (5, 'add the inventory archive history view', migrate_inventory_archive),
+    (6, 'give the inventory archive its own primary key', migrate_archive_key),
+    (7, 'add InventoryEvent.status for replaying events into the expiry histogram', migrate_event_status),
+    (8, 'add the blood type + expiry index for /inventory filtered by type', run_ddl(
+        'CREATE INDEX IF NOT EXISTS ix_blood_inventory_type_expiry ON blood_inventory (blood_type, expiry_date)',
+    )),
+]
+
+def apply_migrations(engine=None):
+    """Apply any schema migrations the database has not seen yet"""
+    with (engine or db.engine).begin() as conn:
+        version = conn.exec_driver_sql('PRAGMA user_version').scalar()
+        for target, description, migrate in MIGRATIONS:
+            if version < target:
+                migrate(conn)
+                conn.exec_driver_sql(f'PRAGMA user_version = {target}')
+                version = target
+                print(f"Applied migration {target}: {description}")
+
+# Schema of a blood_supply.db from before the migrations existed, frozen so
+# check-migrations can upgrade one and compare it with a fresh database
+BASELINE_SCHEMA = (
+    'CREATE TABLE blood_inventory (id INTEGER NOT NULL, blood_id VARCHAR(50) NOT NULL, '
+    'blood_type VARCHAR(10) NOT NULL, product_type VARCHAR(20) NOT NULL, donation_date DATE NOT NULL, '
+    'expiry_date DATE NOT NULL, current_location VARCHAR(50) NOT NULL, temperature_zone VARCHAR(20) NOT NULL, '
+    'status VARCHAR(20), PRIMARY KEY (id), UNIQUE (blood_id))',
+    'CREATE TABLE location (id INTEGER NOT NULL, location_code VARCHAR(20) NOT NULL, '
+    'location_name VARCHAR(100) NOT NULL, location_type VARCHAR(20) NOT NULL, capacity INTEGER, '
+    'current_stock INTEGER, temperature_capability VARCHAR(100), contact_person VARCHAR(100), '
+    'phone_number VARCHAR(20), PRIMARY KEY (id), UNIQUE (location_code))',
+    'CREATE TABLE transportation (id INTEGER NOT NULL, shipment_id VARCHAR(50) NOT NULL, '
+    'from_location VARCHAR(50) NOT NULL, to_location VARCHAR(50) NOT NULL, scheduled_departure DATETIME, '
+    'status VARCHAR(20), driver_name VARCHAR(100), driver_contact VARCHAR(20), security_status VARCHAR(20), '
+    'PRIMARY KEY (id), UNIQUE (shipment_id))',
+    'CREATE TABLE expiry_alert (id INTEGER NOT NULL, blood_id VARCHAR(50) NOT NULL, '
+    'alert_type VARCHAR(20) NOT NULL, alert_date DATETIME NOT NULL, days_remaining INTEGER, '
+    'action_taken BOOLEAN, PRIMARY KEY (id))',
+    "INSERT INTO location VALUES (1, 'YGN_MAIN', 'Yangon Main Blood Bank', 'Storage', 1000, 2, '2-6C', "
+    "'Dr. Staff', '+95-1-100000')",
+    "INSERT INTO blood_inventory VALUES (1, 'O+_RBC_001', 'O+', 'RBC', '2024-01-01', '2024-02-12', "
+    "'YGN_MAIN', '2-6C', 'Available')",
+    "INSERT INTO blood_inventory VALUES (2, 'A+_RBC_002', 'A+', 'RBC', '2024-01-02', '2024-02-13', "
+    "'YGN_MAIN', '2-6C', 'Reserved')",
+    "INSERT INTO expiry_alert VALUES (1, 'O+_RBC_001', 'Expiring', '2024-02-10 08:00:00', 2, 0)",
+)
+
+def schema_snapshot(engine):
+    """Columns of every table and view, and columns of every index, as comparable tuples"""
+    with engine.connect() as conn:
+        objects = conn.exec_driver_sql(
+            "SELECT type, name FROM sqlite_master WHERE type IN ('table', 'view', 'index') "
+            "AND name NOT LIKE 'sqlite_%'"
+        ).all()
+        snapshot = set()
+        for object_type, name in objects:
+            if object_type == 'index':
+                columns = [row[2] for row in conn.exec_driver_sql(f'PRAGMA index_info({name})')]
+            else:
+                columns = [(row[1], row[2]) for row in conn.exec_driver_sql(f'PRAGMA table_info({name})')]
+            snapshot.add((object_type, name, tuple(sorted(columns))))
+    return snapshot
+
+def explain_query_plan(query):
+    """Return the EXPLAIN QUERY PLAN detail lines for an ORM query"""
+    compiled = query.statement.compile(dialect=db.engine.dialect,
+                                       compile_kwargs={'render_postcompile': True})
+    params = tuple(compiled.params[name] for name in compiled.positiontup)
+    with db.engine.connect() as conn:
+        rows = conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + str(compiled), params).fetchall()
+    return [row[-1] for row in rows]
+
+def hot_queries():
+    """Queries behind the main pages, with whether their ORDER BY must come from an index"""
+    today = datetime.now().date()
+    return {
+        'dashboard_expiring_soon': (BloodInventory.query.filter(
+            BloodInventory.status == 'Available',
+            BloodInventory.expiry_date <= today + timedelta(days=7)
+        ), False),
+        'inventory_all': (BloodInventory.query.order_by(BloodInventory.expiry_date), True),
+        'inventory_by_type_and_location': (BloodInventory.query.filter_by(
+            blood_type='A+', current_location='YGN_MAIN'
+        ).order_by(BloodInventory.expiry_date), True),
+        'inventory_by_location': (BloodInventory.query.filter_by(
+            current_location='YGN_MAIN'
+        ).order_by(BloodInventory.expiry_date), True),
+        'inventory_by_type': (BloodInventory.query.filter_by(
+            blood_type='A+'
+        ).order_by(BloodInventory.expiry_date), True),
+        'inventory_next_page': (BloodInventory.query.filter(
+            db.tuple_(BloodInventory.expiry_date, BloodInventory.id) > (today, 1)
+        ).order_by(BloodInventory.expiry_date, BloodInventory.id), True),
+        'expired_blood': (BloodInventory.query.filter(BloodInventory.expiry_date < today), False),
+        'pending_alerts': (ExpiryAlert.query.filter_by(action_taken=False)
+                           .order_by(ExpiryAlert.alert_date.desc()).limit(5), True),
+        'expiry_scan': (BloodInventory.query.filter(
+            BloodInventory.status == 'Available',
+            BloodInventory.product_type == 'RBC',
+            BloodInventory.expiry_date.between(today, today + timedelta(days=7))
+        ), False),
+        'fefo_allocation': (BloodInventory.query.filter(
+            BloodInventory.blood_type == 'O+',
+            BloodInventory.product_type == 'RBC',
+            BloodInventory.status == 'Available',
+            BloodInventory.expiry_date >= today
+        ).order_by(BloodInventory.expiry_date, BloodInventory.id).limit(10), True),
+        'compatible_units': (db.session.query(BloodInventory).from_statement(
+            available_units_query('AB+', 'RBC', compatible=True).limit(10)), False),
+        'rebalance_claim': (BloodInventory.query.filter(
+            BloodInventory.blood_type == 'O+',
+            BloodInventory.current_location == 'YGN_MAIN',
+            BloodInventory.product_type.concat('') == 'Platelets',
+            BloodInventory.status == 'Available',
+            BloodInventory.expiry_date.between(today + timedelta(days=1), today + timedelta(days=3))
+        ).order_by(BloodInventory.expiry_date.desc(), BloodInventory.id.desc()).limit(10), True),
+        'active_shipments': (Transportation.query.filter(
+            Transportation.status.in_(['Scheduled', 'In Transit'])
+        ), False),
+        'archive_terminal': (db.session.query(BloodInventory.id).from_statement(
+            terminal_units_query().limit(10)), False),
+        'archive_issued': (db.session.query(BloodInventory.id).from_statement(
+            issued_units_query().limit(10)), False),
+    }
+
+def check_query_plans():
+    """Return a list of hot queries that fall back to a table scan or a sort"""
+    problems = []
+    for name, (query, index_ordered) in hot_queries().items():
+        for detail in explain_query_plan(query):
+            if detail.startswith('SCAN') and 'INDEX' not in detail:
+                problems.append(f"{name}: {detail}")
+            elif index_ordered and 'USE TEMP B-TREE' in detail:
+                problems.append(f"{name}: {detail}")
+    return problems
+
+@app.cli.command('check-query-plans')
+def check_query_plans_command():
+    """Fail if any hot query is planned as a full scan"""
+    problems = check_query_plans()
+    for problem in problems:
+        print(f"Query plan regression - {problem}")
+    if problems:
+        sys.exit(1)
+    print("All hot queries use an index.")
+
+# Read-only requests checked by check-query-budgets, cold and then warm
+QUERY_BUDGET_CHECKS = [
+    '/',
+    '/inventory',
+    '/inventory?blood_type=A%2B&location=YGN_MAIN',
+    '/expired-blood',
+    '/reports',
+    '/mobile',
+    '/locations',
+    '/transportation',
+    '/api/expired_blood_count',
+    '/api/inventory?per_page=50',
+    '/api/forecast',
+    '/api/usage_stats'
+]
+
+@app.cli.command('check-query-budgets')
+def check_query_budgets_command():
+    """Fail if a page exceeds its query budget or shows an N+1 pattern"""
+    app.config['QUERY_ANALYZER'] = True
+    install_query_analyzer()
+    client = app.test_client()
+    failures = 0
+
+    for path in QUERY_BUDGET_CHECKS:
+        for label in ('cold', 'warm'):
+            if label == 'cold':
+                # In its own app context: a request reuses the active one,
+                # so the g.data_version the bump sets would spare it a read
+                with app.app_context():
+                    bump_data_version()
+                    db.session.commit()
+            # A fresh app context per request, so g does not carry over
+            with app.app_context():
+                client.get(path)
+            report = query_log.last_report
+            problems = []
+            if report['budget'] is not None and report['statements'] > report['budget']:
+                problems.append(f"over budget of {report['budget']}")
+            problems += [f"N+1: {count} x {shape[:80]}" for shape, count in report['n_plus_one']]
+            failures += bool(problems)
+            print(f"{path} ({label}): {report['statements']} statements, "
+                  f"{report['sql_ms']:.1f}ms SQL" + (' - ' + '; '.join(problems) if problems else ''))
+
+    if failures:
+        sys.exit(1)
+    print("All pages are within their query budgets.")
+
+@app.cli.command('check-migrations')
+def check_migrations_command():
+    """Fail if upgrading a baseline database does not reach the schema of a fresh one"""
+    workdir = tempfile.mkdtemp(prefix='migrations_')
+    fresh = create_engine('sqlite:///' + os.path.join(workdir, 'fresh.db'))
+    upgraded = create_engine('sqlite:///' + os.path.join(workdir, 'upgraded.db'))
+    with upgraded.begin() as conn:
+        run_ddl(*BASELINE_SCHEMA)(conn)
+    for engine in (fresh, upgraded):
+        db.metadata.create_all(engine)
+        apply_migrations(engine)
+
+    expected, actual = schema_snapshot(fresh), schema_snapshot(upgraded)
+    for object_type, name, columns in sorted(expected - actual):
+        print(f"Missing after upgrade - {object_type} {name} {columns}")
+    for object_type, name, columns in sorted(actual - expected):
+        print(f"Unexpected after upgrade - {object_type} {name} {columns}")
+    shutil.rmtree(workdir)
+    if expected != actual:
+        sys.exit(1)
+    print(f"A baseline database upgrades to the fresh schema ({len(expected)} objects).")
+
+@app.cli.command('reconcile-stock')
+@click.option('--fix', is_flag=True, help='Reset drifted counters to the counted stock')
+def reconcile_stock_command(fix):
+    """Report (and optionally fix) Location.current_stock drift"""
+    started = time.time()
+    drift = reconcile_location_stock(fix=fix)
+    for row in drift:
+        print(f"{row['location_code']}: recorded {row['recorded']}, counted {row['actual']} ({row['drift']:+d})")
+    action = 'Fixed' if fix else 'Found'
+    print(f"{action} {len(drift)} drifted locations in {(time.time() - started) * 1000:.1f}ms")
+
+@app.cli.command('rebalance')
+@click.option('--dry-run', is_flag=True, help='Print the plan without writing shipments')
+def rebalance_command(dry_run):
+    """Plan (and schedule) shipments of near-expiry surplus units"""
+    started = time.time()
+    plan = plan_rebalancing()
+    planning_ms = (time.time() - started) * 1000
+    if dry_run:
+        lanes = [(None, lane['from_location'], lane['to_location'], sum(item['quantity'] for item in lane['items']))
+                 for lane in plan]
+    else:
+        lanes = [(shipment['shipment_id'], shipment['from_location'], shipment['to_location'], len(shipment['units']))
+                 for shipment in schedule_rebalancing(plan)]
+    for shipment_id, from_location, to_location, quantity in lanes:
+        print(f"{shipment_id or 'proposed'}: {from_location} -> {to_location}, {quantity} units")
+    action = 'Proposed' if dry_run else 'Scheduled'
+    print(f"{action} {len(lanes)} shipments of {sum(lane[3] for lane in lanes)} units "
+          f"(planned in {planning_ms:.1f}ms)")
+
+@app.cli.command('process-events')
+def process_events_command():
+    """Apply new inventory events to the incremental aggregates"""
+    started = time.time()
+    expired = record_expired_units()
+    applied = run_event_consumers()
+    for name, count in applied.items():
+        print(f"{name}: applied {count} events")
+    print(f"Recorded {expired} expired units in {(time.time() - started) * 1000:.1f}ms")
+
+@app.cli.command('archive-units')
+def archive_units_command():
+    """Move terminal units out of BloodInventory into the archive"""
+    started = time.time()
+    moved = archive_terminal_units()
+    print(f"Archived {moved} units in {(time.time() - started) * 1000:.1f}ms")
+
+@app.cli.command('check-expiry-histogram')
+def check_expiry_histogram_command():
+    """Fail if the in-memory expiry histogram disagrees with SQL"""
+    mismatches = verify_expiry_histogram()
+    for mismatch in mismatches:
+        print(f"Expiry histogram mismatch - {mismatch}")
+    if mismatches:
+        sys.exit(1)
+    print("Expiry histogram matches the database.")
+
 def init_db():
     with app.app_context():
         db.create_all()
+        apply_migrations()
         
         if Location.query.count() == 0:
             print("Creating sample data...")
@@ -1629,6 +4307,8 @@ def init_db():
             db.session.commit()
             
             # Add sample blood units including some expired ones
+            stock_deltas = {}
+            sample_units = []
             for i in range(15):
                 blood_type = ['A+', 'B+', 'O+', 'AB+'][i % 4]
                 product = ['Whole Blood', 'RBC', 'Platelets'][i % 3]
@@ -1652,16 +4332,19 @@ def init_db():
                     temperature_zone=get_temperature_zone(product)
                 )
                 db.session.add(blood_unit)
-                
-                location = Location.query.filter_by(location_code=location_code).first()
-                if location:
-                    location.current_stock += 1
+                sample_units.append(blood_unit)
+                stock_deltas[location_code] = stock_deltas.get(location_code, 0) + 1
             
+            record_events('received', sample_units)
+            adjust_location_stock(stock_deltas)
+            bump_data_version()
             db.session.commit()
             print("Sample data added successfully!")
         else:
             print("Database already contains data.")
 
+        load_expiry_histogram()
+
 if __name__ == '__main__':
     print("Starting Myanmar Blood Supply Chain Management System...")
     init_db()
@@ -0,0 +1,6 @@
+﻿"""
+Benchmarks for Myanmar Blood Supply Chain System
+
+Each module is a standalone script (python benchmarks/<name>.py) that runs
+against its own database selected through DATABASE_URL.
+"""
@@ -0,0 +1,227 @@
+﻿#!/usr/bin/env python3
+"""
+Synthetic dataset generator for Myanmar Blood Supply Chain System
+
+Fills a database with production-sized data: locations spread over the
+regions, blood units with a configurable expiry spread, expiry alerts for
+units inside their product's alert window (up to --alerts) and shipments.
+Reserved units carry allocation ids dated over the last eight weeks,
+and every unit gets its received (and reserved) inventory events.
+--used adds units already in the terminal 'Used' state, the lifetime
+volume the archiver moves out of the hot table.
+Rows are written with chunked executemany inserts; location stock
+counters, the blood_id sequence and the data version are kept consistent
+so the app can run on the result directly.
+
+Usage:
+    python benchmarks/generate_data.py --database /tmp/big.db \\
+        --locations 100 --units 1000000 --alerts 100000 --shipments 10000 \\
+        --expiry-from -30 --expiry-to 90 [--used 0]
+"""
+import argparse
+import itertools
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+BLOOD_TYPES = ['O+', 'A+', 'B+', 'AB+', 'O-', 'A-', 'B-', 'AB-']
+# Rough donor population mix for Myanmar, weights follow BLOOD_TYPES
+BLOOD_TYPE_WEIGHTS = [36, 24, 32, 7, 0.4, 0.3, 0.2, 0.1]
+PRODUCTS = ['Whole Blood', 'RBC', 'Platelets', 'Plasma']
+PRODUCT_WEIGHTS = [20, 45, 15, 20]
+STATUSES = ['Available', 'Reserved']
+STATUS_WEIGHTS = [95, 5]
+REGIONS = [
+    ('YGN', 'Yangon'), ('MDY', 'Mandalay'), ('NPT', 'Naypyidaw'), ('BGO', 'Bago'),
+    ('MGY', 'Magway'), ('SGG', 'Sagaing'), ('TGI', 'Taunggyi'), ('MLM', 'Mawlamyine'),
+    ('PTN', 'Pathein'), ('MKN', 'Myitkyina'), ('STW', 'Sittwe'), ('LSO', 'Lashio'),
+    ('DWI', 'Dawei'), ('HPA', 'Hpa-An'), ('LKW', 'Loikaw'), ('HKA', 'Hakha'),
+    ('MYA', 'Monywa'), ('PYY', 'Pyay'), ('MKT', 'Meiktila'), ('KLY', 'Kalay')
+]
+SHIPMENT_STATUSES = ['Scheduled', 'In Transit', 'Delivered']
+SHIPMENT_STATUS_WEIGHTS = [20, 10, 70]
+
+
+def location_rows(count):
+    rows = []
+    for i in range(count):
+        code, name = REGIONS[i % len(REGIONS)]
+        is_storage = i < len(REGIONS)
+        rows.append({
+            'location_code': f'{code}_{i:03d}',
+            'location_name': f'{name} {"Blood Bank" if is_storage else "Hospital"} {i // len(REGIONS) + 1}',
+            'location_type': 'Storage' if is_storage else 'Hospital',
+            'capacity': 20000 if is_storage else 5000,
+            'current_stock': 0,
+            'temperature_capability': '2-6C, 20-24C, -18C' if is_storage else '2-6C',
+            'contact_person': f'Dr. Staff {i}',
+            'phone_number': f'+95-{i % 90 + 1}-{100000 + i}'
+        })
+    return rows
+
+
+def unit_rows(count, location_codes, expiry_from, expiry_to, rng, today, status=None):
+    """Yield (blood_id-less) unit dicts whose expiry is uniform over the spread
+
+    status fixes every unit's status instead of drawing it from STATUSES.
+    """
+    from app import calculate_expiry_date, get_temperature_zone
+
+    shelf_life = {product: calculate_expiry_date(product, today) - today for product in PRODUCTS}
+    for _ in range(count):
+        product = rng.choices(PRODUCTS, PRODUCT_WEIGHTS)[0]
+        expiry_date = today + timedelta(days=rng.randint(expiry_from, expiry_to))
+        unit_status = status or rng.choices(STATUSES, STATUS_WEIGHTS)[0]
+        # Reserved units get an allocation id dated within the last eight
+        # weeks, which is the consumption history the forecasts fit
+        allocation_id = None
+        if unit_status == 'Reserved':
+            allocated = today - timedelta(days=rng.randint(1, 56))
+            allocation_id = f"ALLOC_{allocated.strftime('%Y%m%d')}_{rng.randint(1, 99999999):08d}"
+        yield {
+            'blood_type': rng.choices(BLOOD_TYPES, BLOOD_TYPE_WEIGHTS)[0],
+            'product_type': product,
+            'donation_date': expiry_date - shelf_life[product],
+            'expiry_date': expiry_date,
+            'current_location': rng.choice(location_codes),
+            'temperature_zone': get_temperature_zone(product),
+            'status': unit_status,
+            'allocation_id': allocation_id
+        }
+
+
+def unit_events(rows):
+    """Inventory events for generated units: received on the donation date, reserved on the allocation date"""
+    for row in rows:
+        event = {
+            'blood_id': row['blood_id'],
+            'blood_type': row['blood_type'],
+            'product_type': row['product_type'],
+            'location': row['current_location'],
+            'expiry_date': row['expiry_date'],
+        }
+        yield dict(event, event_type='received', reference=None,
+                   status='Available' if row['allocation_id'] else row['status'],
+                   occurred_at=datetime.combine(row['donation_date'], datetime.min.time()))
+        if row['allocation_id']:
+            allocated = datetime.strptime(row['allocation_id'].split('_')[1], '%Y%m%d')
+            yield dict(event, event_type='reserved', reference=row['allocation_id'], status='Available',
+                       occurred_at=allocated)
+
+
+def generate(locations=100, units=1000000, alerts=100000, shipments=10000,
+             expiry_from=-30, expiry_to=90, seed=42, chunk_size=20000, used=0):
+    from app import (app, db, BloodInventory, Location, Transportation, ExpiryAlert, InventoryEvent,
+                     format_blood_id, reserve_blood_ids, adjust_location_stock,
+                     bump_data_version, get_alert_threshold, init_db, record_expired_units)
+
+    rng = random.Random(seed)
+    today = datetime.now().date()
+    now = datetime.now()
+    init_db()
+
+    with app.app_context():
+        started = time.time()
+        existing = {code for (code,) in db.session.query(Location.location_code)}
+        new_locations = [row for row in location_rows(locations) if row['location_code'] not in existing]
+        if new_locations:
+            db.session.execute(db.insert(Location), new_locations)
+        location_codes = [code for (code,) in db.session.query(Location.location_code)]
+        db.session.commit()
+        print(f"📍 {len(new_locations)} locations")
+
+        stock_deltas = {}
+        alert_candidates = []
+        inserted = 0
+        pending = []
+        total = units + used
+        rows = itertools.chain(
+            unit_rows(units, location_codes, expiry_from, expiry_to, rng, today),
+            unit_rows(used, location_codes, expiry_from, expiry_to, rng, today, status='Used')
+        )
+        for unit in rows:
+            pending.append(unit)
+            if len(pending) == chunk_size or inserted + len(pending) == total:
+                sequences = reserve_blood_ids(len(pending))
+                for sequence, row in zip(sequences, pending):
+                    row['blood_id'] = format_blood_id(row['blood_type'], row['product_type'],
+                                                      sequence, row['donation_date'])
+                    stock_deltas[row['current_location']] = stock_deltas.get(row['current_location'], 0) + 1
+                    days_remaining = (row['expiry_date'] - today).days
+                    threshold = get_alert_threshold(row['product_type'], days_remaining)
+                    if len(alert_candidates) < alerts and days_remaining >= 0 and threshold:
+                        alert_candidates.append((row['blood_id'], days_remaining, threshold))
+                db.session.execute(db.insert(BloodInventory), pending)
+                db.session.execute(db.insert(InventoryEvent), list(unit_events(pending)))
+                db.session.commit()
+                inserted += len(pending)
+                pending = []
+                print(f"\r🩸 {inserted}/{total} units", end='', flush=True)
+        print()
+
+        alert_rows = []
+        for blood_id, days_remaining, threshold in alert_candidates:
+            alert_rows.append({
+                'blood_id': blood_id,
+                'alert_type': 'Expiring',
+                'alert_date': now - timedelta(minutes=rng.randint(0, 7 * 24 * 60)),
+                'days_remaining': days_remaining,
+                'action_taken': rng.random() < 0.3,
+                'threshold_days': threshold
+            })
+        for start in range(0, len(alert_rows), chunk_size):
+            db.session.execute(db.insert(ExpiryAlert), alert_rows[start:start + chunk_size])
+        print(f"🔔 {len(alert_rows)} alerts")
+
+        first_shipment = db.session.query(Transportation).count()
+        shipment_rows = []
+        for i in range(shipments):
+            from_location, to_location = rng.sample(location_codes, 2)
+            shipment_rows.append({
+                'shipment_id': f'SHP_{first_shipment + i:08d}',
+                'from_location': from_location,
+                'to_location': to_location,
+                'scheduled_departure': now + timedelta(hours=rng.randint(-24 * 60, 24 * 14)),
+                'status': rng.choices(SHIPMENT_STATUSES, SHIPMENT_STATUS_WEIGHTS)[0],
+                'driver_name': f'Driver {rng.randint(1, 500)}',
+                'driver_contact': f'+95-9-{rng.randint(1000000, 9999999)}',
+                'security_status': 'Safe'
+            })
+        for start in range(0, len(shipment_rows), chunk_size):
+            db.session.execute(db.insert(Transportation), shipment_rows[start:start + chunk_size])
+        print(f"🚚 {len(shipment_rows)} shipments")
+
+        adjust_location_stock(stock_deltas)
+        bump_data_version()
+        db.session.commit()
+        expired = record_expired_units(today, lookback_days=max(-expiry_from, 0))
+        print(f"🗑️ {expired} expired events")
+        print(f"✅ Generated in {time.time() - started:.1f}s")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fill a database with synthetic production-scale data')
+    parser.add_argument('--database', help='SQLite file to fill (default: the app database)')
+    parser.add_argument('--locations', type=int, default=100)
+    parser.add_argument('--units', type=int, default=1000000)
+    parser.add_argument('--alerts', type=int, default=100000)
+    parser.add_argument('--shipments', type=int, default=10000)
+    parser.add_argument('--expiry-from', type=int, default=-30,
+                        help='earliest expiry, in days from today (negative = already expired)')
+    parser.add_argument('--expiry-to', type=int, default=90,
+                        help='latest expiry, in days from today')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--used', type=int, default=0,
+                        help='extra units already used, left in the hot table for the archiver')
+    args = parser.parse_args()
+
+    if args.database:
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.abspath(args.database)
+
+    generate(args.locations, args.units, args.alerts, args.shipments,
+             args.expiry_from, args.expiry_to, args.seed, used=args.used)
@@ -0,0 +1,261 @@
+﻿#!/usr/bin/env python3
+"""
+End-to-end latency benchmark for Myanmar Blood Supply Chain System
+
+Drives a weighted mix of page views, intake and disposal from concurrent
+threads, either through the Flask test client (default, also counts SQL
+statements per request) or against a running server (--url). Reports
+p50/p95/p99 latency, throughput and queries per route, and writes the
+results to JSON; --compare prints the p95 change against an earlier run.
+
+Usage:
+    python benchmarks/generate_data.py --database /tmp/big.db
+    python benchmarks/latency.py --database /tmp/big.db --threads 8 --duration 30 \\
+        --output results.json [--compare previous.json]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# route name -> weight in the request mix
+ROUTE_MIX = {
+    '/': 20,
+    '/inventory': 20,
+    '/reports': 10,
+    '/expired-blood': 10,
+    '/api/quick_entry': 25,
+    '/api/dispose_blood': 15
+}
+BLOOD_TYPES = ['O+', 'A+', 'B+', 'AB+']
+PRODUCTS = ['Whole Blood', 'RBC', 'Platelets', 'Plasma']
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    index = max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+
+class QueryCounter:
+    """Counts SQL statements per thread via an engine event"""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+
+        self.local = threading.local()
+        event.listen(engine, 'before_cursor_execute', self.count)
+
+    def count(self, conn, cursor, statement, parameters, context, executemany):
+        self.local.count = getattr(self.local, 'count', 0) + 1
+
+    def reset(self):
+        self.local.count = 0
+
+    def value(self):
+        return getattr(self.local, 'count', 0)
+
+
+class TestClientDriver:
+    def __init__(self, app, counter):
+        self.client = app.test_client()
+        self.counter = counter
+
+    def request(self, method, path, body=None):
+        self.counter.reset()
+        if method == 'POST':
+            response = self.client.post(path, json=body)
+        else:
+            response = self.client.get(path)
+        ok = response.status_code < 400
+        if ok and response.is_json:
+            ok = response.get_json().get('success', True)
+        return ok, self.counter.value()
+
+
+class HttpDriver:
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+    def request(self, method, path, body=None):
+        data = json.dumps(body).encode() if body is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data, method=method,
+                                     headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(req, timeout=60) as response:
+                payload = response.read()
+                ok = True
+                if response.headers.get_content_type() == 'application/json':
+                    ok = json.loads(payload).get('success', True)
+        except (urllib.error.URLError, OSError, ValueError):
+            ok = False
+        return ok, None
+
+
+class Workload:
+    """Picks the next request; disposals consume a shared pool of unit ids"""
+
+    def __init__(self, disposable_ids, seed):
+        self.disposable_ids = disposable_ids
+        self.lock = threading.Lock()
+        self.routes = list(ROUTE_MIX)
+        self.weights = [ROUTE_MIX[route] for route in self.routes]
+        self.seed = seed
+
+    def next_request(self, rng):
+        route = rng.choices(self.routes, self.weights)[0]
+        if route == '/api/quick_entry':
+            return route, 'POST', route, {
+                'blood_type': rng.choice(BLOOD_TYPES),
+                'product_type': rng.choice(PRODUCTS),
+                'donation_date': datetime.now().strftime('%Y-%m-%d'),
+                'current_location': 'YGN_MAIN'
+            }
+        if route == '/api/dispose_blood':
+            with self.lock:
+                blood_id = self.disposable_ids.pop() if self.disposable_ids else None
+            if blood_id is None:
+                return self.next_request(rng)
+            return route, 'POST', f'/api/dispose_blood/{blood_id}', None
+        if route == '/inventory':
+            return route, 'GET', f'/inventory?page={rng.randint(1, 5)}', None
+        return route, 'GET', route, None
+
+
+def run_thread(driver, workload, deadline, seed, samples):
+    rng = random.Random(seed)
+    while time.time() < deadline:
+        route, method, path, body = workload.next_request(rng)
+        started = time.perf_counter()
+        ok, queries = driver.request(method, path, body)
+        samples.append((route, (time.perf_counter() - started) * 1000, ok, queries))
+
+
+def summarise(samples, elapsed):
+    routes = {}
+    for route in ROUTE_MIX:
+        rows = [sample for sample in samples if sample[0] == route]
+        if not rows:
+            continue
+        latencies = sorted(latency for _, latency, _, _ in rows)
+        queries = [count for _, _, _, count in rows if count is not None]
+        routes[route] = {
+            'requests': len(rows),
+            'errors': sum(1 for _, _, ok, _ in rows if not ok),
+            'throughput_rps': round(len(rows) / elapsed, 2),
+            'mean_ms': round(sum(latencies) / len(latencies), 3),
+            'p50_ms': round(percentile(latencies, 0.50), 3),
+            'p95_ms': round(percentile(latencies, 0.95), 3),
+            'p99_ms': round(percentile(latencies, 0.99), 3),
+            'max_ms': round(latencies[-1], 3),
+            'queries_mean': round(sum(queries) / len(queries), 2) if queries else None,
+            'queries_max': max(queries) if queries else None
+        }
+
+    latencies = sorted(latency for _, latency, _, _ in samples)
+    total = {
+        'requests': len(samples),
+        'errors': sum(1 for _, _, ok, _ in samples if not ok),
+        'throughput_rps': round(len(samples) / elapsed, 2),
+        'p50_ms': round(percentile(latencies, 0.50), 3) if latencies else None,
+        'p95_ms': round(percentile(latencies, 0.95), 3) if latencies else None,
+        'p99_ms': round(percentile(latencies, 0.99), 3) if latencies else None
+    }
+    return routes, total
+
+
+def print_report(routes, total, previous=None):
+    print(f"{'route':<22}{'reqs':>7}{'err':>5}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'queries':>9}"
+          + ("  p95 vs previous" if previous else ""))
+    for route, stats in routes.items():
+        queries = '-' if stats['queries_mean'] is None else f"{stats['queries_mean']:.1f}"
+        line = (f"{route:<22}{stats['requests']:>7}{stats['errors']:>5}{stats['throughput_rps']:>9.1f}"
+                f"{stats['p50_ms']:>9.2f}{stats['p95_ms']:>9.2f}{stats['p99_ms']:>9.2f}{queries:>9}")
+        before = (previous or {}).get('routes', {}).get(route)
+        if before:
+            change = (stats['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100 if before['p95_ms'] else 0
+            line += f"  {before['p95_ms']:.2f} -> {stats['p95_ms']:.2f} ({change:+.0f}%)"
+        print(line)
+    print(f"{'total':<22}{total['requests']:>7}{total['errors']:>5}{total['throughput_rps']:>9.1f}"
+          f"{total['p50_ms'] or 0:>9.2f}{total['p95_ms'] or 0:>9.2f}{total['p99_ms'] or 0:>9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Concurrent end-to-end latency benchmark')
+    parser.add_argument('--database', help='SQLite file to run against (default: the app database)')
+    parser.add_argument('--url', help='benchmark a running server instead of the in-process test client')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=30, help='seconds')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', default='latency_results.json')
+    parser.add_argument('--compare', help='earlier results JSON to compare p95 against')
+    args = parser.parse_args()
+
+    if args.database:
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.abspath(args.database)
+
+    from app import app, db, init_db, BloodInventory
+
+    init_db()
+    with app.app_context():
+        unit_count = db.session.query(BloodInventory).count()
+        disposable_ids = [blood_id for (blood_id,) in
+                          db.session.query(BloodInventory.blood_id).order_by(db.func.random()).limit(50000)]
+
+    if args.url:
+        drivers = [HttpDriver(args.url) for _ in range(args.threads)]
+    else:
+        with app.app_context():
+            counter = QueryCounter(db.engine)
+        drivers = [TestClientDriver(app, counter) for _ in range(args.threads)]
+
+    workload = Workload(disposable_ids, args.seed)
+    samples = []
+    started = time.time()
+    deadline = started + args.duration
+    threads = [threading.Thread(target=run_thread, args=(driver, workload, deadline, args.seed + i, samples))
+               for i, driver in enumerate(drivers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.time() - started
+
+    routes, total = summarise(samples, elapsed)
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+
+    print(f"{args.threads} threads, {elapsed:.1f}s, {unit_count} units, "
+          f"{'server ' + args.url if args.url else 'test client'}")
+    print_report(routes, total, previous)
+
+    results = {
+        'run_at': datetime.now().isoformat(timespec='seconds'),
+        'target': args.url or 'test_client',
+        'threads': args.threads,
+        'duration_s': round(elapsed, 2),
+        'units': unit_count,
+        'route_mix': ROUTE_MIX,
+        'routes': routes,
+        'total': total
+    }
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"📄 Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+﻿#!/usr/bin/env python3
+"""
+Timing benchmark for the near-expiry rebalancing optimizer
+
+Generates (or reuses) a synthetic database with hundreds of locations and
+a short expiry spread, so tens of thousands of units are at risk, then
+times plan_rebalancing() warm and reports the size of the plan. With
+--schedule the plan is also written as Scheduled shipments and a second
+run checks that nothing already shipped is proposed again.
+
+Usage: python benchmarks/rebalance.py --database /tmp/rebalance.db [--locations 300] [--units 300000]
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time the rebalancing optimizer')
+    parser.add_argument('--database', default='rebalance_benchmark.db')
+    parser.add_argument('--locations', type=int, default=300)
+    parser.add_argument('--units', type=int, default=300000)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--schedule', action='store_true', help='also write the plan')
+    args = parser.parse_args()
+
+    database = os.path.abspath(args.database)
+    os.environ['DATABASE_URL'] = 'sqlite:///' + database
+    if not os.path.exists(database):
+        from benchmarks.generate_data import generate
+        generate(locations=args.locations, units=args.units, alerts=0, shipments=0,
+                 expiry_from=-5, expiry_to=60)
+
+    from app import app, plan_rebalancing, schedule_rebalancing, get_expiry_histogram
+
+    with app.app_context():
+        started = time.perf_counter()
+        get_expiry_histogram()
+        print(f"Expiry histogram loaded in {(time.perf_counter() - started) * 1000:.0f}ms")
+
+        timings = []
+        for _ in range(args.runs):
+            started = time.perf_counter()
+            plan = plan_rebalancing()
+            timings.append((time.perf_counter() - started) * 1000)
+        units = sum(item['quantity'] for lane in plan for item in lane['items'])
+        timings.sort()
+        print(f"Plan: {len(plan)} shipments, {units} units")
+        print(f"Planning: best {timings[0]:.0f}ms, median {timings[len(timings) // 2]:.0f}ms, "
+              f"worst {timings[-1]:.0f}ms over {args.runs} runs")
+
+        if args.schedule:
+            started = time.perf_counter()
+            shipments = schedule_rebalancing(plan)
+            print(f"Scheduled {len(shipments)} shipments of {sum(len(s['units']) for s in shipments)} units "
+                  f"in {(time.perf_counter() - started) * 1000:.0f}ms")
+            again = sum(item['quantity'] for lane in plan_rebalancing() for item in lane['items'])
+            print(f"Units proposed again after scheduling: {again}")
+            if again:
+                print("FAILED")
+                sys.exit(1)
+
+        if timings[len(timings) // 2] > 1000:
+            print("FAILED: median planning time over one second")
+            sys.exit(1)
+    print("OK")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+﻿#!/usr/bin/env python3
+"""
+Read/write throughput under concurrent load, per SQLite profile
+
+Runs the same mix of dashboard/API readers and quick_entry writers against a
+fresh database once for each SQLITE_PROFILE (default: rollback journal and
+library defaults; performance: WAL and the pragmas in app.SQLITE_PROFILES)
+and reports requests per second and "database is locked" failures.
+
+Usage: python benchmarks/sqlite_profile.py [readers] [writers] [seconds]
+"""
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+READ_PATHS = ['/api/inventory?per_page=50', '/api/expired_blood_count', '/locations']
+
+
+def reader(deadline, queue):
+    from app import app
+
+    client = app.test_client()
+    done = failed = 0
+    while time.time() < deadline:
+        for path in READ_PATHS:
+            try:
+                response = client.get(path)
+                ok = response.status_code == 200
+            except Exception:
+                ok = False
+            done += ok
+            failed += not ok
+    queue.put(('read', done, failed))
+
+
+def writer(deadline, queue):
+    from app import app
+
+    client = app.test_client()
+    done = failed = 0
+    unit = {
+        'blood_type': 'O+',
+        'product_type': 'RBC',
+        'donation_date': time.strftime('%Y-%m-%d'),
+        'current_location': 'YGN_MAIN'
+    }
+    while time.time() < deadline:
+        try:
+            ok = client.post('/api/quick_entry', json=unit).get_json().get('success')
+        except Exception:
+            ok = False
+        done += bool(ok)
+        failed += not ok
+    queue.put(('write', done, failed))
+
+
+def run_profile(profile, readers, writers, seconds):
+    workdir = tempfile.mkdtemp(prefix=f'sqlite_{profile}_')
+    os.environ['SQLITE_PROFILE'] = profile
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+
+    ctx = multiprocessing.get_context('spawn')
+    setup = ctx.Process(target=initialise)
+    setup.start()
+    setup.join()
+
+    queue = ctx.Queue()
+    deadline = time.time() + 2 + seconds
+    workers = ([ctx.Process(target=reader, args=(deadline, queue)) for _ in range(readers)] +
+               [ctx.Process(target=writer, args=(deadline, queue)) for _ in range(writers)])
+    for worker in workers:
+        worker.start()
+    results = [queue.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+
+    totals = {'read': [0, 0], 'write': [0, 0]}
+    for kind, done, failed in results:
+        totals[kind][0] += done
+        totals[kind][1] += failed
+    return totals
+
+
+def initialise():
+    from app import init_db
+    init_db()
+
+
+def main():
+    readers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    writers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    seconds = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+
+    print(f"Readers: {readers}, writers: {writers}, duration: {seconds}s")
+    for profile in ('default', 'performance'):
+        totals = run_profile(profile, readers, writers, seconds)
+        (reads, read_errors), (writes, write_errors) = totals['read'], totals['write']
+        print(f"{profile:>12}: reads {reads / seconds:8.1f}/s ({read_errors} failed), "
+              f"writes {writes / seconds:8.1f}/s ({write_errors} failed)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+﻿#!/usr/bin/env python3
+"""
+Stress test for FEFO allocation
+
+Seeds a fresh database with a known stock of units, then fires a burst of
+/api/allocate requests from several worker processes, each running several
+threads, all sharing one SQLite file. Exits non-zero if any unit was handed
+to two allocations, if the stored Reserved rows disagree with what the
+clients were told, or if an allocation skipped an earlier-expiring unit
+that was still available when it ran.
+
+Usage: python benchmarks/stress_allocation.py [processes] [threads] [requests] [units]
+"""
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+BLOOD_TYPES = ['O+', 'A+', 'B+']
+PRODUCT = 'RBC'
+
+
+def client_worker(app, requests_per_thread, seed, allocations, errors, latencies):
+    client = app.test_client()
+
+    for i in range(requests_per_thread):
+        request = {
+            'blood_type': BLOOD_TYPES[(seed + i) % len(BLOOD_TYPES)],
+            'product_type': PRODUCT,
+            'quantity': 1 + (seed + i) % 4,
+            'allow_partial': True
+        }
+        if i % 3 == 0:
+            request['location'] = 'MDY_REGIONAL'
+
+        started = time.perf_counter()
+        result = client.post('/api/allocate', json=request).get_json()
+        latencies.append(time.perf_counter() - started)
+
+        if result.get('success'):
+            allocations.append((result['allocation_id'], request['blood_type'], 'location' in request,
+                                [unit['blood_id'] for unit in result['units']]))
+        elif 'available' not in result:
+            errors.append(result.get('error'))
+
+
+def process_worker(threads, requests_per_thread, index, queue):
+    from app import app
+
+    allocations = []
+    errors = []
+    latencies = []
+    workers = [
+        threading.Thread(target=client_worker,
+                         args=(app, requests_per_thread, index * threads + t, allocations, errors, latencies))
+        for t in range(threads)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    queue.put((allocations, errors, latencies))
+
+
+def main():
+    processes = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 25
+    requests_per_thread = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+    units = int(sys.argv[4]) if len(sys.argv) > 4 else 3000
+
+    workdir = tempfile.mkdtemp(prefix='allocation_stress_')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'stress.db')
+
+    from app import app, db, init_db, BloodInventory
+
+    init_db()
+    today = datetime.now().date()
+    with app.app_context():
+        client = app.test_client()
+        stock = [{
+            'blood_type': BLOOD_TYPES[i % len(BLOOD_TYPES)],
+            'product_type': PRODUCT,
+            'donation_date': (today - timedelta(days=i % 40)).strftime('%Y-%m-%d'),
+            'current_location': ['YGN_MAIN', 'MDY_REGIONAL'][i % 2]
+        } for i in range(units)]
+        client.post('/api/inventory/bulk', json=stock)
+        expiry_of = dict(db.session.query(BloodInventory.blood_id, BloodInventory.expiry_date))
+
+    ctx = multiprocessing.get_context('spawn')
+    queue = ctx.Queue()
+    started = time.time()
+    workers = [ctx.Process(target=process_worker, args=(threads, requests_per_thread, i, queue))
+               for i in range(processes)]
+    for worker in workers:
+        worker.start()
+    results = [queue.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    elapsed = time.time() - started
+
+    allocations = [allocation for allocated, _, _ in results for allocation in allocated]
+    errors = [error for _, errs, _ in results for error in errs]
+    latencies = sorted(latency for _, _, lats in results for latency in lats)
+    issued = [blood_id for _, _, _, blood_ids in allocations for blood_id in blood_ids]
+    collisions = len(issued) - len(set(issued))
+
+    with app.app_context():
+        reserved = dict(db.session.query(BloodInventory.blood_id, BloodInventory.allocation_id)
+                        .filter(BloodInventory.status == 'Reserved'))
+    mismatched = sum(1 for allocation_id, _, _, blood_ids in allocations
+                     for blood_id in blood_ids if reserved.get(blood_id) != allocation_id)
+
+    # FEFO: units only ever move from Available to Reserved, so once a request
+    # without a preferred location took a unit expiring on some date, no unit
+    # of that type expiring earlier can still be Available at the end
+    fefo_violations = 0
+    with app.app_context():
+        for blood_type in BLOOD_TYPES:
+            latest_issued = max((expiry_of[blood_id] for _, allocated_type, preferred, blood_ids in allocations
+                                 if allocated_type == blood_type and not preferred for blood_id in blood_ids),
+                                default=None)
+            if latest_issued is None:
+                continue
+            fefo_violations += BloodInventory.query.filter(
+                BloodInventory.blood_type == blood_type,
+                BloodInventory.product_type == PRODUCT,
+                BloodInventory.status == 'Available',
+                BloodInventory.expiry_date >= today,
+                BloodInventory.expiry_date < latest_issued
+            ).count()
+
+    total_requests = processes * threads * requests_per_thread
+    p = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000 if latencies else 0
+    print(f"{total_requests} allocation requests in {elapsed:.2f}s ({total_requests / elapsed:.0f} req/s), "
+          f"{processes} processes x {threads} threads")
+    print(f"Latency p50 {p(0.5):.1f}ms, p95 {p(0.95):.1f}ms, p99 {p(0.99):.1f}ms")
+    print(f"Allocations: {len(allocations)}, units issued: {len(issued)} of {len(expiry_of)}")
+    print(f"Double allocations: {collisions}, stored mismatches: {mismatched}, FEFO violations: {fefo_violations}")
+    print(f"Errors: {len(errors)}")
+    for error in sorted(set(map(str, errors)))[:10]:
+        print(f"  - {error}")
+
+    if collisions or mismatched or fefo_violations or errors:
+        print("FAILED")
+        sys.exit(1)
+    print("OK: every unit allocated once, earliest expiry first")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+﻿#!/usr/bin/env python3
+"""
+Stress test for blood_id allocation
+
+Hammers /api/quick_entry and /api/inventory/bulk from several worker
+processes, each running several threads, all sharing one SQLite file.
+Exits non-zero if any blood_id was handed out twice or if the ids issued
+to a single client were not increasing.
+
+Usage: python benchmarks/stress_blood_id.py [processes] [threads] [requests]
+"""
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+BLOOD_TYPES = ['A+', 'B+', 'O+', 'AB+']
+PRODUCTS = ['Whole Blood', 'RBC', 'Platelets', 'Plasma']
+
+
+def sequence_of(blood_id):
+    return int(blood_id.rsplit('_', 1)[1])
+
+
+def client_worker(app, requests_per_thread, issued, errors):
+    client = app.test_client()
+    last_sequence = 0
+
+    for i in range(requests_per_thread):
+        unit = {
+            'blood_type': BLOOD_TYPES[i % 4],
+            'product_type': PRODUCTS[i % 4],
+            'donation_date': time.strftime('%Y-%m-%d'),
+            'current_location': 'YGN_MAIN'
+        }
+
+        if i % 10 == 0:
+            result = client.post('/api/inventory/bulk', json=[unit] * 20).get_json()
+            blood_ids = [row['blood_id'] for row in result.get('results', []) if row.get('success')]
+        else:
+            result = client.post('/api/quick_entry', json=unit).get_json()
+            blood_ids = [result['blood_id']] if result.get('success') else []
+
+        if not result.get('success'):
+            errors.append(result.get('error'))
+            continue
+
+        for blood_id in blood_ids:
+            sequence = sequence_of(blood_id)
+            if sequence <= last_sequence:
+                errors.append(f'non-monotonic id {blood_id} after sequence {last_sequence}')
+            last_sequence = sequence
+            issued.append(blood_id)
+
+
+def process_worker(threads, requests_per_thread, queue):
+    from app import app
+
+    issued = []
+    errors = []
+    workers = [
+        threading.Thread(target=client_worker, args=(app, requests_per_thread, issued, errors))
+        for _ in range(threads)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    queue.put((issued, errors))
+
+
+def main():
+    processes = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    requests_per_thread = int(sys.argv[3]) if len(sys.argv) > 3 else 50
+
+    workdir = tempfile.mkdtemp(prefix='blood_id_stress_')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'stress.db')
+
+    from app import app, db, init_db, BloodInventory
+    init_db()
+
+    ctx = multiprocessing.get_context('spawn')
+    queue = ctx.Queue()
+    started = time.time()
+    workers = [ctx.Process(target=process_worker, args=(threads, requests_per_thread, queue))
+               for _ in range(processes)]
+    for worker in workers:
+        worker.start()
+    results = [queue.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    elapsed = time.time() - started
+
+    issued = [blood_id for ids, _ in results for blood_id in ids]
+    errors = [error for _, errs in results for error in errs]
+    collisions = len(issued) - len(set(issued))
+
+    with app.app_context():
+        stored = db.session.query(BloodInventory.blood_id).count()
+        distinct = db.session.query(BloodInventory.blood_id).distinct().count()
+
+    print(f"Issued {len(issued)} ids in {elapsed:.2f}s ({len(issued) / elapsed:.0f} ids/s)")
+    print(f"Processes: {processes}, threads per process: {threads}")
+    print(f"Collisions: {collisions}, stored rows: {stored}, distinct stored ids: {distinct}")
+    print(f"Errors: {len(errors)}")
+    for error in sorted(set(map(str, errors)))[:10]:
+        print(f"  - {error}")
+
+    if collisions or stored != distinct or any('UNIQUE' in str(e) or 'monotonic' in str(e) for e in errors):
+        print("FAILED: blood_id collision detected")
+        sys.exit(1)
+    print("OK: no blood_id collisions")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,228 @@
+﻿"""
+In-memory expiry histogram for the Myanmar Blood Supply Chain System
+
+Keeps per-day counts of blood units by expiry date in Fenwick trees, split
+by status, blood type, product type and location, so "expired",
+"expiring within N days" and "expiring between dates" counts are answered
+in O(log n) without touching the database.
+"""
+import threading
+from array import array
+from datetime import date, timedelta
+from itertools import combinations
+from operator import itemgetter
+
+DIMENSIONS = ('status', 'blood_type', 'product_type', 'location')
+
+# A tree is kept for every combination of up to this many dimension values,
+# so a count can be filtered on any one or two dimensions at once
+MAX_FILTERS = 2
+
+
+class FenwickTree:
+    """Binary indexed tree over a fixed number of day buckets"""
+
+    def __init__(self, size):
+        self.size = size
+        self.tree = array('q', [0]) * (size + 1)
+
+    @classmethod
+    def from_counts(cls, counts):
+        """Build a tree from per-bucket counts in O(n)"""
+        tree = cls(len(counts))
+        tree.tree[1:] = counts
+        for index in range(1, tree.size + 1):
+            parent = index + (index & -index)
+            if parent <= tree.size:
+                tree.tree[parent] += tree.tree[index]
+        return tree
+
+    def add(self, index, delta):
+        index += 1
+        while index <= self.size:
+            self.tree[index] += delta
+            index += index & -index
+
+    def prefix_sum(self, index):
+        """Sum of buckets 0..index inclusive"""
+        index = min(index, self.size - 1) + 1
+        total = 0
+        while index > 0:
+            total += self.tree[index]
+            index -= index & -index
+        return total
+
+
+class ExpiryHistogram:
+    """Per-day expiry counts answering range questions in O(log n)
+
+    Bucket 0 is the histogram origin, a few weeks before the day it was
+    built. Units that expired before the origin are folded into bucket 0,
+    which keeps "expired" counts exact while bounding the tree size; only
+    ranges reaching back before the origin lose day resolution. The trees grow
+    (and the origin moves forward) when an expiry date past the last bucket
+    is added.
+    """
+
+    def __init__(self, days=512, lookback=30):
+        self.initial_days = days
+        self.lookback = lookback
+        self.lock = threading.RLock()
+        self.loaded = False
+        # Sync point kept by the owner: the last change log entry and data
+        # version the counts include
+        self.event_id = 0
+        self.data_version = None
+        self.counts = {}
+        self._build_trees(date.today(), days)
+
+    def _build_trees(self, today, days):
+        self.origin = today.toordinal() - self.lookback
+        self.days = days
+        self.values = {dimension: set() for dimension in DIMENSIONS}
+        columns = {}
+        for (expiry, *key), count in self.counts.items():
+            unit = dict(zip(DIMENSIONS, key))
+            bucket = self._bucket(expiry)
+            for tree_key in self._tree_keys(unit):
+                column = columns.get(tree_key)
+                if column is None:
+                    column = columns[tree_key] = array('q', [0]) * days
+                column[bucket] += count
+            for dimension in DIMENSIONS:
+                self.values[dimension].add(unit[dimension])
+        self.trees = {key: FenwickTree.from_counts(column) for key, column in columns.items()}
+
+    def _bucket(self, ordinal):
+        return max(0, ordinal - self.origin)
+
+    def _tree_keys(self, unit):
+        items = [(dimension, unit[dimension]) for dimension in DIMENSIONS]
+        for size in range(MAX_FILTERS + 1):
+            yield from combinations(items, size)
+
+    def _apply(self, expiry, unit, count):
+        bucket = self._bucket(expiry)
+        for key in self._tree_keys(unit):
+            tree = self.trees.get(key)
+            if tree is None:
+                tree = self.trees[key] = FenwickTree(self.days)
+            tree.add(bucket, count)
+        for dimension in DIMENSIONS:
+            self.values[dimension].add(unit[dimension])
+
+    def add(self, expiry_date, status, blood_type, product_type, location, count=1):
+        """Record count units (negative to remove) expiring on expiry_date"""
+        expiry = expiry_date.toordinal()
+        full_key = (expiry, status, blood_type, product_type, location)
+
+        with self.lock:
+            remaining = self.counts.get(full_key, 0) + count
+            if remaining:
+                self.counts[full_key] = remaining
+            else:
+                self.counts.pop(full_key, None)
+
+            if self._bucket(expiry) >= self.days:
+                days = self.initial_days
+                while expiry - (date.today().toordinal() - self.lookback) >= days:
+                    days *= 2
+                self._build_trees(date.today(), days)
+            else:
+                self._apply(expiry, {
+                    'status': status,
+                    'blood_type': blood_type,
+                    'product_type': product_type,
+                    'location': location
+                }, count)
+
+    def rebuild(self, rows, today=None):
+        """Replace the contents with (expiry_date, status, blood_type, product_type, location, count) rows"""
+        if today is None:
+            today = date.today()
+
+        with self.lock:
+            self.counts = {}
+            last_expiry = today.toordinal()
+            for expiry_date, status, blood_type, product_type, location, count in rows:
+                expiry = expiry_date.toordinal()
+                key = (expiry, status, blood_type, product_type, location)
+                self.counts[key] = self.counts.get(key, 0) + count
+                last_expiry = max(last_expiry, expiry)
+
+            days = self.initial_days
+            while last_expiry - (today.toordinal() - self.lookback) >= days:
+                days *= 2
+            self._build_trees(today, days)
+            self.loaded = True
+
+    def count(self, start=None, end=None, **filters):
+        """Units expiring between start and end inclusive (either may be open)"""
+        key = tuple((dimension, filters[dimension]) for dimension in DIMENSIONS
+                    if filters.get(dimension) is not None)
+        if len(key) > MAX_FILTERS:
+            raise ValueError(f"At most {MAX_FILTERS} filters can be combined")
+
+        with self.lock:
+            tree = self.trees.get(key)
+            if tree is None:
+                return 0
+
+            if end is None:
+                high = tree.prefix_sum(self.days - 1)
+            elif end.toordinal() < self.origin:
+                return 0
+            else:
+                high = tree.prefix_sum(self._bucket(end.toordinal()))
+
+            if start is None or start.toordinal() <= self.origin:
+                return high
+            return high - tree.prefix_sum(self._bucket(start.toordinal()) - 1)
+
+    def count_expired(self, today, **filters):
+        return self.count(end=today - timedelta(days=1), **filters)
+
+    def count_expiring(self, today, days, **filters):
+        """Units that have not expired yet but will within the next days"""
+        return self.count(start=today, end=today + timedelta(days=days), **filters)
+
+    def breakdown(self, dimension, start=None, end=None, **filters):
+        """Counts for every known value of one dimension"""
+        with self.lock:
+            values = [value for value in self.values[dimension] if value is not None]
+        result = {}
+        for value in values:
+            count = self.count(start, end, **dict(filters, **{dimension: value}))
+            if count:
+                result[value] = count
+        return result
+
+    def totals(self, dimensions, start=None, end=None, **filters):
+        """Counts grouped by several dimensions at once
+
+        Walks the per-day counts rather than the trees, so any number of
+        dimensions and filters can be combined; cost is linear in the number
+        of distinct (expiry, status, type, product, location) keys. The
+        'expiry_date' dimension groups by the date's ordinal.
+        """
+        low = start.toordinal() if start is not None else 0
+        high = end.toordinal() if end is not None else date.max.toordinal()
+        group_of = itemgetter(*[0 if dimension == 'expiry_date' else DIMENSIONS.index(dimension) + 1
+                                for dimension in dimensions])
+        wanted = [(DIMENSIONS.index(dimension) + 1, value) for dimension, value in filters.items()
+                  if value is not None]
+
+        result = {}
+        with self.lock:
+            for key, count in self.counts.items():
+                if not low <= key[0] <= high:
+                    continue
+                for position, value in wanted:
+                    if key[position] != value:
+                        break
+                else:
+                    group = group_of(key)
+                    result[group] = result.get(group, 0) + count
+        if len(dimensions) == 1:
+            return {(group,): count for group, count in result.items() if count}
+        return {group: count for group, count in result.items() if count}
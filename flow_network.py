@@ -0,0 +1,134 @@
+﻿"""
+Min-cost flow solver for the Myanmar Blood Supply Chain System
+
+Primal-dual algorithm: Dijkstra over reduced costs updates the node
+potentials, then a Dinic blocking flow saturates every shortest path at
+once. The number of phases is bounded by the number of distinct path
+costs, which stays small for the integer lane costs used by the
+rebalancing optimizer, so large networks solve in a handful of passes.
+"""
+import heapq
+from collections import deque
+
+INFINITY = float('inf')
+
+# Edge layout: [to, residual capacity, cost, index of reverse edge, original capacity]
+TO, CAP, COST, REV, ORIGINAL = range(5)
+
+
+class MinCostFlow:
+    def __init__(self):
+        self.graph = []
+
+    def add_node(self):
+        self.graph.append([])
+        return len(self.graph) - 1
+
+    def add_edge(self, source, target, capacity, cost):
+        self.graph[source].append([target, capacity, cost, len(self.graph[target]), capacity])
+        self.graph[target].append([source, 0, -cost, len(self.graph[source]) - 1, 0])
+
+    def solve(self, source, sink):
+        """Push the maximum flow from source to sink at minimum cost; returns (flow, cost)"""
+        potentials = [0] * len(self.graph)
+        total_flow = total_cost = 0
+
+        while True:
+            distances = self._shortest_paths(source, potentials)
+            if distances[sink] == INFINITY:
+                break
+            for node, distance in enumerate(distances):
+                if distance < INFINITY:
+                    potentials[node] += distance
+
+            pushed = self._blocking_flow(source, sink, potentials)
+            total_flow += pushed
+            total_cost += pushed * (potentials[sink] - potentials[source])
+
+        return total_flow, total_cost
+
+    def _shortest_paths(self, source, potentials):
+        distances = [INFINITY] * len(self.graph)
+        distances[source] = 0
+        heap = [(0, source)]
+        while heap:
+            distance, node = heapq.heappop(heap)
+            if distance > distances[node]:
+                continue
+            node_potential = potentials[node]
+            for target, capacity, cost, _, _ in self.graph[node]:
+                if capacity <= 0:
+                    continue
+                candidate = distance + cost + node_potential - potentials[target]
+                if candidate < distances[target]:
+                    distances[target] = candidate
+                    heapq.heappush(heap, (candidate, target))
+        return distances
+
+    def _admissible(self, node, edge, potentials):
+        return edge[CAP] > 0 and edge[COST] + potentials[node] - potentials[edge[TO]] == 0
+
+    def _blocking_flow(self, source, sink, potentials):
+        """Dinic max flow restricted to zero reduced-cost edges"""
+        total = 0
+        while True:
+            levels = [-1] * len(self.graph)
+            levels[source] = 0
+            queue = deque([source])
+            while queue:
+                node = queue.popleft()
+                for edge in self.graph[node]:
+                    if levels[edge[TO]] < 0 and self._admissible(node, edge, potentials):
+                        levels[edge[TO]] = levels[node] + 1
+                        queue.append(edge[TO])
+            if levels[sink] < 0:
+                return total
+
+            next_edge = [0] * len(self.graph)
+            while True:
+                pushed = self._augment(source, sink, INFINITY, levels, next_edge, potentials)
+                if not pushed:
+                    break
+                total += pushed
+
+    def _augment(self, node, sink, limit, levels, next_edge, potentials):
+        if node == sink:
+            return limit
+        edges = self.graph[node]
+        while next_edge[node] < len(edges):
+            edge = edges[next_edge[node]]
+            if levels[edge[TO]] == levels[node] + 1 and self._admissible(node, edge, potentials):
+                pushed = self._augment(edge[TO], sink, min(limit, edge[CAP]), levels, next_edge, potentials)
+                if pushed:
+                    edge[CAP] -= pushed
+                    self.graph[edge[TO]][edge[REV]][CAP] += pushed
+                    return pushed
+            next_edge[node] += 1
+        return 0
+
+    def paths(self, source, sink):
+        """Decompose the solved flow into (node path, amount) pairs"""
+        remaining = [[edge[ORIGINAL] - edge[CAP] if edge[ORIGINAL] > 0 else 0 for edge in edges]
+                     for edges in self.graph]
+        # An edge whose flow is used up never regains any, so each node's scan
+        # resumes where the previous path left it
+        next_edge = [0] * len(self.graph)
+        result = []
+        while True:
+            path, edge_path = [source], []
+            node = source
+            while node != sink:
+                flows = remaining[node]
+                index = next_edge[node]
+                while index < len(flows) and flows[index] <= 0:
+                    index += 1
+                next_edge[node] = index
+                if index == len(flows):
+                    return result
+                edge_path.append((node, index))
+                node = self.graph[node][index][TO]
+                path.append(node)
+            amount = min(remaining[u][i] for u, i in edge_path)
+            for u, i in edge_path:
+                remaining[u][i] -= amount
+            result.append((path, amount))
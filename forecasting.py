@@ -0,0 +1,86 @@
+﻿"""
+Demand forecasting for the Myanmar Blood Supply Chain System
+
+Fits additive level + weekly seasonal exponential smoothing to daily time
+series and projects stock forward day by day. Every step works on 2-D
+arrays with one row per (location, blood type, product) series, so the
+Python-level loops run over days and candidate parameters, never over
+series: thousands of series cost about as much as one.
+"""
+import numpy as np
+
+SEASON = 7
+# Level smoothing candidates; each series keeps the one with the lowest
+# one-step-ahead squared error over its history
+DEFAULT_ALPHAS = (0.05, 0.1, 0.2, 0.3, 0.5)
+DEFAULT_GAMMA = 0.1
+
+
+def fit_smoothing(history, alphas=DEFAULT_ALPHAS, gamma=DEFAULT_GAMMA, season=SEASON):
+    """Fit every row of history (series x days); returns (level, seasonal, alpha) per series
+
+    The initial level is the mean of the first season and the initial
+    seasonal offsets are the per-weekday means of the whole weeks minus the
+    overall mean. All candidate alphas are run side by side as a leading
+    array axis.
+    """
+    history = np.asarray(history, dtype=float)
+    series, days = history.shape
+    candidates = np.asarray(alphas, dtype=float)[:, None]
+
+    weeks = days // season
+    if weeks:
+        whole = history[:, :weeks * season].reshape(series, weeks, season)
+        level0 = whole[:, 0, :].mean(axis=1)
+        seasonal0 = whole.mean(axis=1) - whole.mean(axis=(1, 2))[:, None]
+    else:
+        level0 = history.mean(axis=1) if days else np.zeros(series)
+        seasonal0 = np.zeros((series, season))
+
+    level = np.repeat(level0[None, :], len(alphas), axis=0)
+    seasonal = np.repeat(seasonal0[None, :, :], len(alphas), axis=0)
+    squared_error = np.zeros((len(alphas), series))
+    for day in range(days):
+        position = day % season
+        observed = history[:, day]
+        error = observed - (level + seasonal[:, :, position])
+        squared_error += error * error
+        level = level + candidates * error
+        seasonal[:, :, position] += gamma * (observed - level - seasonal[:, :, position])
+
+    best = squared_error.argmin(axis=0)
+    rows = np.arange(series)
+    return level[best, rows], seasonal[best, rows], candidates[best, 0]
+
+
+def forecast(level, seasonal, start, horizon):
+    """Non-negative forecasts for days start .. start + horizon - 1 (series x horizon)"""
+    positions = (start + np.arange(horizon)) % seasonal.shape[1]
+    return np.maximum(level[:, None] + seasonal[:, positions], 0)
+
+
+def project_stock(stock, expiring, demand):
+    """Stock left, and units lost to expiry, by the end of each day (series x horizon)
+
+    expiring[s, d] is how many of today's units reach their expiry date on
+    day d. Demand is met first-expired-first-out, so a unit is lost to
+    expiry only if demand has not reached it by then. The units gone by day
+    d are the cumulative demand plus the largest shortfall of cumulative
+    demand behind cumulative expiries up to d; a negative result is demand
+    that could not be met.
+    """
+    cumulative_demand = np.cumsum(demand, axis=1)
+    behind = np.cumsum(expiring, axis=1) - cumulative_demand
+    lost = np.maximum(np.maximum.accumulate(behind, axis=1), 0)
+    return np.asarray(stock, dtype=float)[:, None] - cumulative_demand - lost, lost
+
+
+def first_shortage(projected, unmet=1.0):
+    """Index of the first day by which unmet demand reaches unmet units, -1 where it never does
+
+    Forecasts are fractional; requiring a whole unit of unmet demand keeps
+    series with a trickle of demand and no stock from all reading as short
+    today.
+    """
+    short = projected <= -unmet
+    return np.where(short.any(axis=1), short.argmax(axis=1), -1)
@@ -0,0 +1,157 @@
+﻿"""
+Request metrics for the Myanmar Blood Supply Chain System
+
+A small in-process registry of counters and histograms rendered in the
+Prometheus text exposition format. Each worker process keeps its own
+registry; when a metrics directory is configured every process also writes
+periodic snapshots there, and a scrape served by any worker merges the
+snapshots of all of them.
+"""
+import glob
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class MetricsRegistry:
+    """Counters and histograms keyed by label values"""
+
+    def __init__(self, directory=None, flush_interval=5):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.definitions = {}
+        self.series = {}
+        self.flusher_pid = None
+
+    def counter(self, name, help_text, labels=()):
+        self.definitions[name] = ('counter', help_text, tuple(labels), None)
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.definitions[name] = ('histogram', help_text, tuple(labels), tuple(buckets))
+
+    def inc(self, name, label_values=(), amount=1):
+        key = (name, tuple(label_values))
+        with self.lock:
+            self.series[key] = self.series.get(key, 0) + amount
+
+    def observe(self, name, label_values, value):
+        buckets = self.definitions[name][3]
+        # per-bucket (not cumulative) counts, +Inf last, then sum and count;
+        # buckets are made cumulative when rendered
+        index = bisect_left(buckets, value)
+        key = (name, tuple(label_values))
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [0] * (len(buckets) + 3)
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return [[name, list(labels), value if isinstance(value, (int, float)) else list(value)]
+                    for (name, labels), value in self.series.items()]
+
+    # Multi-process support
+    def snapshot_path(self, pid=None):
+        return os.path.join(self.directory, f'metrics_{pid or os.getpid()}.json')
+
+    def flush(self):
+        """Write this process's snapshot for the other workers to merge"""
+        if not self.directory:
+            return
+        path = self.snapshot_path()
+        temp_path = f'{path}.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(temp_path, path)
+
+    def clear_snapshots(self):
+        """Remove snapshots left by an earlier server run"""
+        for path in glob.glob(os.path.join(self.directory, 'metrics_*.json*')):
+            os.remove(path)
+
+    def start_flusher(self):
+        """Flush on a daemon thread; safe to call per request, starts once per process"""
+        if not self.directory or self.flusher_pid == os.getpid():
+            return
+        self.flusher_pid = os.getpid()
+        os.makedirs(self.directory, exist_ok=True)
+
+        def run():
+            while True:
+                time.sleep(self.flush_interval)
+                try:
+                    self.flush()
+                except OSError:
+                    pass
+
+        threading.Thread(target=run, name='metrics-flusher', daemon=True).start()
+
+    def collect(self):
+        """Series merged across every process that has written a snapshot"""
+        if not self.directory:
+            return self.snapshot()
+
+        self.flush()
+        merged = {}
+        for path in glob.glob(os.path.join(self.directory, 'metrics_*.json')):
+            try:
+                with open(path) as f:
+                    rows = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for name, labels, value in rows:
+                key = (name, tuple(labels))
+                if key not in merged:
+                    merged[key] = value
+                elif isinstance(value, list):
+                    merged[key] = [a + b for a, b in zip(merged[key], value)]
+                else:
+                    merged[key] += value
+        return [[name, list(labels), value] for (name, labels), value in merged.items()]
+
+    # Prometheus text format
+    def render(self):
+        by_name = {}
+        for name, labels, value in self.collect():
+            by_name.setdefault(name, []).append((labels, value))
+
+        lines = []
+        for name, (kind, help_text, label_names, buckets) in self.definitions.items():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in sorted(by_name.get(name, []), key=lambda row: row[0]):
+                pairs = [f'{key}="{escape_label(val)}"' for key, val in zip(label_names, labels)]
+                if kind == 'counter':
+                    lines.append(f'{name}{format_labels(pairs)} {format_value(value)}')
+                    continue
+                cumulative = 0
+                bounds = [format_value(bound) for bound in buckets] + ['+Inf']
+                for bound, count in zip(bounds, value):
+                    cumulative += count
+                    bucket_labels = format_labels(pairs + [f'le="{bound}"'])
+                    lines.append(f'{name}_bucket{bucket_labels} {cumulative}')
+                lines.append(f'{name}_sum{format_labels(pairs)} {format_value(value[-2])}')
+                lines.append(f'{name}_count{format_labels(pairs)} {value[-1]}')
+        return '\n'.join(lines) + '\n'
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def format_labels(pairs):
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def format_value(value):
+    if isinstance(value, float):
+        return repr(round(value, 6))
+    return str(value)
@@ -1,26 +1,173 @@
 ﻿#!/usr/bin/env python3
 """
 Launcher script for Myanmar Blood Supply Chain System
+
+Development (default): Flask's reloading debug server.
+Production (--production or SERVER_MODE=production): a pre-fork server.
+The app is imported and init_db runs once in the master, which then forks
+WEB_WORKERS processes (default: one per core) sharing one listening socket,
+each serving requests from a pool of WEB_THREADS threads. SIGTERM or Ctrl+C
+stops accepting, lets in-flight requests finish for up to GRACEFUL_TIMEOUT
+seconds, then exits. Workers that die are replaced.
 """
 import os
+import signal
+import socket
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
 
 # Add the current directory to Python path
 sys.path.insert(0, os.path.dirname(__file__))
 
-from app import app, init_db
+from app import app, db, init_db, metrics, start_expiry_scanner
+
+class RequestHandler(WSGIRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Idle keep-alive connections give their pool thread back after this
+    timeout = int(os.environ.get('KEEPALIVE_TIMEOUT', 5))
+
+class PooledWSGIServer(BaseWSGIServer):
+    """WSGI server handing accepted connections to a fixed thread pool"""
+    multithread = True
+
+    def __init__(self, app, threads, fd):
+        super().__init__('0.0.0.0', 0, app, handler=RequestHandler, fd=fd)
+        self.pool = ThreadPoolExecutor(threads, thread_name_prefix='wsgi')
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self.process_request_thread, request, client_address)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+def run_worker(listener, threads, run_scanner):
+    """Serve on the inherited socket until SIGTERM, then drain and exit"""
+    # Connections opened before the fork belong to the master
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+    server = PooledWSGIServer(app, threads, listener.fileno())
+
+    def drain(signum, frame):
+        if not app.config['DRAINING']:
+            app.config['DRAINING'] = True
+            threading.Thread(target=server.shutdown).start()
+
+    signal.signal(signal.SIGTERM, drain)
+    signal.signal(signal.SIGINT, drain)
+
+    if run_scanner:
+        start_expiry_scanner(app.config['EXPIRY_SCAN_INTERVAL'])
+
+    server.serve_forever()
+    server.pool.shutdown(wait=True)
+
+def serve_production(port, workers, threads, graceful_timeout):
+    listener = socket.create_server(('0.0.0.0', port), backlog=1024)
+    # Workers share metrics snapshots so any of them can answer /metrics
+    if app.config['METRICS_ENABLED']:
+        metrics.directory = app.config['METRICS_DIR'] or os.path.join(app.instance_path, 'metrics')
+        os.makedirs(metrics.directory, exist_ok=True)
+        metrics.clear_snapshots()
+    # Scanner runs in worker slot 0 only, so alerts are raised once
+    scan_interval = app.config['EXPIRY_SCAN_INTERVAL']
+    children = {}
+    stopping = False
+
+    def spawn(slot):
+        pid = os.fork()
+        if pid == 0:
+            status = 0
+            try:
+                run_worker(listener, threads, slot == 0 and scan_interval > 0)
+            except BaseException:
+                status = 1
+            finally:
+                os._exit(status)
+        children[pid] = slot
+
+    def stop(signum, frame):
+        nonlocal stopping
+        if stopping:
+            return
+        stopping = True
+        print(f"🛑 Draining {len(children)} workers (up to {graceful_timeout}s)...")
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        signal.alarm(graceful_timeout)
+
+    def kill_remaining(signum, frame):
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+    for slot in range(workers):
+        spawn(slot)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGALRM, kill_remaining)
+
+    print(f"✅ System ready! {workers} workers x {threads} threads")
+    print(f"📍 Access at: http://localhost:{port}")
+    if scan_interval:
+        print(f"🔔 Expiry scanner running every {scan_interval}s in worker 0")
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        slot = children.pop(pid, None)
+        if slot is not None and not stopping:
+            print(f"⚠️ Worker {pid} exited with status {status}, restarting")
+            spawn(slot)
+
+    listener.close()
+    print("👋 Server stopped")
 
 if __name__ == '__main__':
     print("🚀 Starting Myanmar Blood Supply Chain Management System...")
     with app.app_context():
         init_db()
-    
+
     port = int(os.environ.get('PORT', 5000))
     debug = os.environ.get('FLASK_DEBUG', 'False').lower() == 'true'
-    
+    production = ('--production' in sys.argv[1:] or
+                  os.environ.get('SERVER_MODE', 'development') == 'production')
+
+    if production and hasattr(os, 'fork'):
+        with app.app_context():
+            db.engine.dispose()
+        serve_production(
+            port,
+            workers=int(os.environ.get('WEB_WORKERS', os.cpu_count() or 1)),
+            threads=int(os.environ.get('WEB_THREADS', 8)),
+            graceful_timeout=int(os.environ.get('GRACEFUL_TIMEOUT', 30))
+        )
+        sys.exit(0)
+
     print(f"✅ System ready!")
     print(f"📍 Access at: http://localhost:{port}")
     print(f"🐛 Debug mode: {debug}")
+
+    scan_interval = app.config['EXPIRY_SCAN_INTERVAL']
+    if scan_interval and (not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true'):
+        start_expiry_scanner(scan_interval)
+        print(f"🔔 Expiry scanner running every {scan_interval}s")
     print("Press Ctrl+C to stop the server")
-    
+
     app.run(debug=debug, host='0.0.0.0', port=port)
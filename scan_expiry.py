@@ -0,0 +1,40 @@
+﻿#!/usr/bin/env python3
+"""
+Expiry alert scanner for Myanmar Blood Supply Chain System
+
+Raises ExpiryAlert rows for blood units that have crossed their product's
+alert thresholds, logs units that have expired since the last scan to
+the inventory event log and archives units in a terminal state. Runs once
+by default; pass --interval to keep scanning.
+"""
+import argparse
+import os
+import sys
+import time
+
+# Add the current directory to Python path
+sys.path.insert(0, os.path.dirname(__file__))
+
+from app import app, archive_terminal_units, init_db, record_expired_units, run_event_consumers, scan_expiring_units
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate expiry alerts for units crossing their thresholds')
+    parser.add_argument('--interval', type=int, default=0,
+                        help='seconds between scans; 0 scans once and exits')
+    args = parser.parse_args()
+
+    init_db()
+
+    while True:
+        started = time.time()
+        with app.app_context():
+            created = scan_expiring_units()
+            expired = record_expired_units()
+            run_event_consumers()
+            archived = archive_terminal_units()
+        print(f"🔔 Created {created} expiry alerts, recorded {expired} expired units and archived "
+              f"{archived} units in {time.time() - started:.2f}s")
+
+        if not args.interval:
+            break
+        time.sleep(args.interval)